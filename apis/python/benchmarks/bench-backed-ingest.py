@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+# ================================================================
+# Benchmarks `tiledbsc.io.from_h5ad` with `backed=True`, which streams X from the file in chunks,
+# against the default, which reads the whole AnnData into memory first.
+# ================================================================
+
+import argparse
+import os
+import shutil
+import tempfile
+
+import anndata as ad
+import numpy as np
+import pandas as pd
+import scipy.sparse
+
+import tiledbsc
+import tiledbsc.io
+
+from benchutil import measure, report
+
+
+def make_h5ad(path: str, nobs: int, nvar: int, density: float, seed: int) -> None:
+    """
+    Writes a synthetic h5ad file with a CSR X, and obs/var having only an index.
+    """
+    rng = np.random.default_rng(seed)
+    X = scipy.sparse.random(
+        nobs, nvar, density=density, format="csr", dtype=np.float32, random_state=rng
+    )
+    obs = pd.DataFrame(index=[f"cell{i:09d}" for i in range(nobs)])
+    var = pd.DataFrame(index=[f"gene{j:06d}" for j in range(nvar)])
+    ad.AnnData(X=X, obs=obs, var=var, dtype=X.dtype).write_h5ad(path)
+
+
+def ingest(h5ad_path: str, soma_path: str, backed: bool, goal_chunk_nnz: int) -> None:
+    shutil.rmtree(soma_path, ignore_errors=True)
+    soma_options = tiledbsc.SOMAOptions(goal_chunk_nnz=goal_chunk_nnz)
+    soma = tiledbsc.SOMA(soma_path, soma_options=soma_options, verbose=False)
+    tiledbsc.io.from_h5ad(soma, h5ad_path, backed=backed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nobs", type=int, default=200_000)
+    parser.add_argument("--nvar", type=int, default=2_000)
+    parser.add_argument("--density", type=float, default=0.05)
+    parser.add_argument("--goal-chunk-nnz", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        h5ad_path = os.path.join(tmpdir, "input.h5ad")
+        make_h5ad(h5ad_path, args.nobs, args.nvar, args.density, args.seed)
+        print(
+            f"nobs={args.nobs} nvar={args.nvar} density={args.density} "
+            f"file={os.path.getsize(h5ad_path) / 2**20:.1f}MiB goal_chunk_nnz={args.goal_chunk_nnz}"
+        )
+
+        soma_path = os.path.join(tmpdir, "soma")
+        _, seconds, peak = measure(
+            ingest, h5ad_path, soma_path, True, args.goal_chunk_nnz
+        )
+        report("from_h5ad(backed=True)", seconds, peak)
+        _, seconds, peak = measure(
+            ingest, h5ad_path, soma_path, False, args.goal_chunk_nnz
+        )
+        report("from_h5ad(backed=False)", seconds, peak)
+
+
+if __name__ == "__main__":
+    main()
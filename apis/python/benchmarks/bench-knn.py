@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+# ================================================================
+# Benchmarks the approximate nearest-neighbor index over obsm embeddings: build time, then query
+# latency and recall@k against exact search, for several nprobe values with and without exact
+# re-ranking -- alongside exact search by reading the whole embedding, as was needed before.
+# ================================================================
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import tiledbsc
+
+from benchutil import measure, report
+
+
+def make_embedding(nobs: int, ncol: int, nclusters: int, seed: int) -> np.ndarray:
+    """
+    Makes a synthetic embedding with clustered rows, somewhat like a PCA of cells of several types.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(scale=5.0, size=(nclusters, ncol))
+    labels = rng.integers(0, nclusters, size=nobs)
+    return (centers[labels] + rng.normal(size=(nobs, ncol))).astype(np.float32)
+
+
+def exact_knn(matrix: np.ndarray, vectors: np.ndarray, k: int) -> np.ndarray:
+    """
+    Returns the row numbers of the exact `k` nearest rows of `matrix` to each of `vectors`.
+    """
+    retval = []
+    for vector in vectors:
+        distances = ((matrix - vector) ** 2).sum(axis=1)
+        best = np.argpartition(distances, k - 1)[:k]
+        retval.append(best[np.argsort(distances[best])])
+    return np.asarray(retval)
+
+
+def full_read_knn(annotation_matrix, vectors: np.ndarray, k: int) -> np.ndarray:
+    """
+    Exact search by reading the whole embedding, as without an index.
+    """
+    df = annotation_matrix.df()
+    nearest = exact_knn(df.to_numpy(dtype=np.float32), vectors, k)
+    return df.index.to_numpy()[nearest]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nobs", type=int, default=200_000)
+    parser.add_argument("--ncol", type=int, default=50)
+    parser.add_argument("--nclusters", type=int, default=30)
+    parser.add_argument("--nquery", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--layout",
+        default="sparse",
+        help="SOMAOptions.annotation_matrix_layout: sparse or dense",
+    )
+    args = parser.parse_args()
+
+    matrix = make_embedding(args.nobs, args.ncol, args.nclusters, args.seed)
+    obs_ids = np.asarray([f"cell{i:09d}" for i in range(args.nobs)], dtype=object)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = matrix[rng.choice(args.nobs, args.nquery, replace=False)]
+    queries = queries + rng.normal(scale=0.1, size=queries.shape).astype(np.float32)
+    truth = obs_ids[exact_knn(matrix, queries, args.k)]
+    print(
+        f"nobs={args.nobs} ncol={args.ncol} nquery={args.nquery} k={args.k} nlist={args.nlist} layout={args.layout}"
+    )
+
+    with tempfile.TemporaryDirectory() as soma_path:
+        soma = tiledbsc.SOMA(
+            soma_path,
+            soma_options=tiledbsc.SOMAOptions(annotation_matrix_layout=args.layout),
+            verbose=False,
+        )
+        soma._create()
+        soma.obs.from_dataframe(
+            pd.DataFrame({"n": np.arange(args.nobs)}, index=obs_ids), extent=256
+        )
+        soma.obsm.from_matrices_and_dim_values({"X_pca": matrix}, obs_ids)
+        X_pca = soma.obsm["X_pca"]
+
+        t1 = time.time()
+        soma.obsm.build_knn_index("X_pca", nlist=args.nlist)
+        report("build_knn_index", time.time() - t1, 0)
+
+        _, seconds, peak = measure(full_read_knn, X_pca, queries[:1], args.k)
+        report("full read + exact, per query", seconds, peak)
+
+        for rerank in [False, True]:
+            for nprobe in [1, 4, 16]:
+                (ids, _), seconds, peak = measure(
+                    X_pca.knn, queries, args.k, nprobe=nprobe, rerank=rerank
+                )
+                recall = np.mean(
+                    [len(set(a) & set(b)) / args.k for a, b in zip(ids, truth)]
+                )
+                report(
+                    f"knn nprobe={nprobe} rerank={rerank}, per query",
+                    seconds / args.nquery,
+                    peak,
+                )
+                print(f"{'':40s} recall@{args.k} {recall:.3f}")
+
+                # One at a time, as for interactive lookups.
+                t1 = time.time()
+                for query in queries[:10]:
+                    X_pca.knn(query, args.k, nprobe=nprobe, rerank=rerank)
+                report("  single-vector calls", (time.time() - t1) / 10, 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+# ================================================================
+# Benchmarks the "filter obs, then slice X by the matching obs_ids" query: the pure-Python pipeline
+# of `AnnotationDataFrame.attribute_filter` and `AssayMatrix.dim_select`, against
+# `AssayMatrix.row_filter_select` running natively as a libtiledbsc `IJQuery`. Requires the
+# `pytiledbsc` module, which is built along with libtiledbsc.
+# ================================================================
+
+import argparse
+import os
+import sys
+import tempfile
+
+import anndata as ad
+import numpy as np
+import pandas as pd
+import scipy.sparse
+
+import tiledbsc
+import tiledbsc.io
+import tiledbsc.util_tiledb
+
+from benchutil import measure, report
+
+
+def make_soma(path: str, nobs: int, nvar: int, density: float, seed: int) -> None:
+    """
+    Writes a synthetic SOMA with a CSR X and a few obs columns to filter on.
+    """
+    rng = np.random.default_rng(seed)
+    X = scipy.sparse.random(
+        nobs, nvar, density=density, format="csr", dtype=np.float32, random_state=rng
+    )
+    obs = pd.DataFrame(
+        {
+            "cell_type": rng.choice(["B", "T", "NK", "mono", "DC"], size=nobs),
+            "n_counts": rng.integers(0, 10_000, size=nobs).astype(np.int64),
+        },
+        index=[f"cell{i:09d}" for i in range(nobs)],
+    )
+    var = pd.DataFrame(index=[f"gene{j:06d}" for j in range(nvar)])
+    soma = tiledbsc.SOMA(path, verbose=False)
+    tiledbsc.io.from_anndata(soma, ad.AnnData(X=X, obs=obs, var=var, dtype=X.dtype))
+
+
+def python_pipeline(X: tiledbsc.AssayMatrix, query_string: str) -> pd.DataFrame:
+    """
+    The pure-Python pipeline, as `row_filter_select` runs it without libtiledbsc.
+    """
+    obs_df = X.row_dataframe.attribute_filter(query_string, [])
+    return X.dim_select(list(obs_df.index), None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nobs", type=int, default=100_000)
+    parser.add_argument("--nvar", type=int, default=2_000)
+    parser.add_argument("--density", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--query", default='cell_type == "NK" and n_counts > 5000', help="obs condition"
+    )
+    args = parser.parse_args()
+
+    if tiledbsc.util_tiledb.pytiledbsc is None:
+        print("The pytiledbsc module is not installed; build libtiledbsc first.")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        soma_path = os.path.join(tmpdir, "soma")
+        make_soma(soma_path, args.nobs, args.nvar, args.density, args.seed)
+        print(f"nobs={args.nobs} nvar={args.nvar} density={args.density}")
+        print(f"query: {args.query}")
+
+        X = tiledbsc.SOMA(soma_path, verbose=False).X["data"]
+        expected, seconds, peak = measure(python_pipeline, X, args.query)
+        report("attribute_filter + dim_select", seconds, peak)
+
+        native_soma = tiledbsc.SOMA(
+            soma_path,
+            soma_options=tiledbsc.SOMAOptions(read_via_libtiledbsc=True),
+            verbose=False,
+        )
+        X = native_soma.X["data"]
+        actual, seconds, peak = measure(X.row_filter_select, args.query)
+        report("row_filter_select (IJQuery)", seconds, peak)
+
+        print(f"nnz={len(actual)}")
+        assert len(actual) == len(expected)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+# ================================================================
+# Benchmarks readback of wide obs dataframes with many string columns: the bulk UTF-8 decode in
+# `tiledbsc.util._decode_utf8`, to object or Arrow-backed string columns, against the
+# per-element `bytes.decode` it replaced -- both on its own, and as part of `obs.df()`.
+# ================================================================
+
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import tiledbsc
+import tiledbsc.util
+
+from benchutil import measure, report
+
+
+def legacy_decode(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    The previous implementation, retained here for comparison.
+    """
+    df = df.copy()
+    for k in df:
+        dfk = df[k]
+        if len(dfk) > 0 and type(dfk[0]) == bytes:
+            df[k] = dfk.map(lambda e: e.decode())
+    return df
+
+
+def bulk_decode(df: pd.DataFrame, string_dtype: str) -> pd.DataFrame:
+    """
+    The current implementation, as `AnnotationDataFrame` readback runs it.
+    """
+    df = df.copy()
+    for k in df:
+        dfk = df[k]
+        if len(dfk) > 0 and type(dfk.iloc[0]) == bytes:
+            df[k] = tiledbsc.util._decode_utf8(dfk.to_numpy(), string_dtype)
+    return df
+
+
+def make_obs(
+    nobs: int, nstr: int, nnum: int, cardinality: int, seed: int
+) -> pd.DataFrame:
+    """
+    Makes a synthetic obs dataframe with `nstr` string columns, some values non-ASCII, and `nnum`
+    numeric ones.
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = np.asarray(
+        [f"value_{i}" if i % 10 else f"välue_{i}" for i in range(cardinality)],
+        dtype=object,
+    )
+    columns = {}
+    for j in range(nstr):
+        columns[f"str_{j}"] = vocabulary[rng.integers(0, cardinality, size=nobs)]
+    for j in range(nnum):
+        columns[f"num_{j}"] = rng.random(nobs)
+    return pd.DataFrame(columns, index=[f"cell{i:09d}" for i in range(nobs)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nobs", type=int, default=200_000)
+    parser.add_argument("--nstr", type=int, default=30, help="number of string columns")
+    parser.add_argument("--nnum", type=int, default=5, help="number of numeric columns")
+    parser.add_argument(
+        "--cardinality",
+        type=int,
+        default=1000,
+        help="distinct values per string column",
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--skip-legacy",
+        help="Don't run the previous implementation, e.g. when it would take too long",
+        action="store_true",
+    )
+    args = parser.parse_args()
+
+    obs = make_obs(args.nobs, args.nstr, args.nnum, args.cardinality, args.seed)
+    print(f"nobs={args.nobs} nstr={args.nstr} nnum={args.nnum}")
+
+    # The decode on its own, from bytes columns as TileDB-Py reads them back.
+    encoded = obs.copy()
+    for k in encoded:
+        if encoded[k].dtype == object:
+            encoded[k] = encoded[k].map(str.encode)
+    for string_dtype in ["object", "string[pyarrow]"]:
+        decoded, seconds, peak = measure(bulk_decode, encoded, string_dtype)
+        report(f"_decode_utf8 to {string_dtype}", seconds, peak)
+    if not args.skip_legacy:
+        legacy_decoded, seconds, peak = measure(legacy_decode, encoded)
+        report("legacy per-element decode", seconds, peak)
+        assert legacy_decoded.equals(bulk_decode(encoded, "object"))
+
+    # End to end.
+    with tempfile.TemporaryDirectory() as soma_path:
+        tiledbsc.SOMA(soma_path, verbose=False).obs.from_dataframe(obs, extent=256)
+        for string_dtype in ["object", "string[pyarrow]"]:
+            soma = tiledbsc.SOMA(
+                soma_path,
+                soma_options=tiledbsc.SOMAOptions(annotation_string_dtype=string_dtype),
+                verbose=False,
+            )
+            df, seconds, peak = measure(soma.obs.df)
+            report(f"obs.df() to {string_dtype}", seconds, peak)
+            assert df.shape == obs.shape
+
+
+if __name__ == "__main__":
+    main()
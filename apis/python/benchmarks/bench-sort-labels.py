@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+# ================================================================
+# Benchmarks `tiledbsc.util._get_sort_and_permutation`, which sorts obs/var labels ahead of chunked
+# X ingest, against the tuple-and-lambda implementation it replaced.
+# ================================================================
+
+import argparse
+
+import numpy as np
+
+import tiledbsc.util
+
+from benchutil import measure, report
+
+
+def legacy_get_sort_and_permutation(lst: list):
+    """
+    The previous implementation, retained here for comparison.
+    """
+    lst_and_indices = [(e, i) for i, e in enumerate(lst)]
+    lst_and_indices.sort(key=lambda pair: pair[0])
+    lst_sorted = [e for e, i in lst_and_indices]
+    permutation = [i for e, i in lst_and_indices]
+    return (lst_sorted, permutation)
+
+
+def make_labels(n: int, seed: int) -> np.ndarray:
+    """
+    Makes 10x-style barcode labels like 'ACGTACGTACGTACGT-1', in random order, as the object-dtype
+    array which `anndata.obs_names.to_numpy()` would give.
+    """
+    rng = np.random.default_rng(seed)
+    bases = np.asarray(list("ACGT"))
+    codes = rng.integers(0, 4, size=(n, 16))
+    barcodes = bases[codes].view("<U16").ravel()
+    labels = np.char.add(barcodes, "-1")
+    return labels.astype(object)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-n",
+        type=int,
+        nargs="+",
+        default=[1_000_000, 10_000_000],
+        help="Label counts to benchmark",
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--skip-legacy",
+        help="Don't run the previous implementation, e.g. when it would not fit in memory",
+        action="store_true",
+    )
+    args = parser.parse_args()
+
+    for n in args.n:
+        labels = make_labels(n, args.seed)
+        print(f"n={n}")
+
+        (sorted_labels, permutation), seconds, peak = measure(
+            tiledbsc.util._get_sort_and_permutation, labels
+        )
+        report("_get_sort_and_permutation", seconds, peak)
+
+        if not args.skip_legacy:
+            (legacy_sorted, legacy_permutation), seconds, peak = measure(
+                legacy_get_sort_and_permutation, list(labels)
+            )
+            report("legacy tuple/lambda implementation", seconds, peak)
+            assert list(sorted_labels) == legacy_sorted
+            assert list(permutation) == legacy_permutation
+
+
+if __name__ == "__main__":
+    main()
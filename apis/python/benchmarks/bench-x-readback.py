@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+# ================================================================
+# Benchmarks `tiledbsc.util.X_and_ids_to_sparse_matrix`, which converts the string-indexed
+# (obs_id, var_id, value) dataframe read back from TileDB into a CSR/CSC matrix, against the
+# dict-and-list-comprehension implementation it replaced.
+# ================================================================
+
+import argparse
+
+import numpy as np
+import pandas as pd
+import scipy.sparse
+
+import tiledbsc.util
+
+from benchutil import measure, report
+
+
+def legacy_X_and_ids_to_sparse_matrix(
+    Xdf, row_dim_name, col_dim_name, attr_name, row_labels, col_labels
+):
+    """
+    The previous implementation, retained here for comparison.
+    """
+    row_labels_to_indices = dict(zip(row_labels, [i for i, e in enumerate(row_labels)]))
+    col_labels_to_indices = dict(zip(col_labels, [i for i, e in enumerate(col_labels)]))
+    Xdf = Xdf.reset_index()
+    obs_indices = [row_labels_to_indices[row_label] for row_label in Xdf[row_dim_name]]
+    var_indices = [col_labels_to_indices[col_label] for col_label in Xdf[col_dim_name]]
+    xcol = list(Xdf[attr_name])
+    ocol = list(obs_indices)
+    vcol = list(var_indices)
+    return scipy.sparse.csr_matrix(
+        (xcol, (ocol, vcol)), shape=(len(row_labels), len(col_labels))
+    )
+
+
+def make_Xdf(nobs: int, nvar: int, density: float, seed: int) -> tuple:
+    """
+    Makes a dataframe shaped like `AssayMatrix.df()` output, along with its obs and var labels.
+    """
+    rng = np.random.default_rng(seed)
+    obs_labels = np.asarray(["cell_%09d" % i for i in range(nobs)], dtype=object)
+    var_labels = np.asarray(["gene_%06d" % j for j in range(nvar)], dtype=object)
+    mat = scipy.sparse.random(
+        nobs, nvar, density=density, format="coo", dtype=np.float32, random_state=rng
+    )
+    Xdf = pd.DataFrame(
+        {
+            "obs_id": obs_labels[mat.row],
+            "var_id": var_labels[mat.col],
+            "value": mat.data,
+        }
+    )
+    Xdf.set_index(["obs_id", "var_id"], inplace=True)
+    return (Xdf, list(obs_labels), list(var_labels))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nobs", type=int, default=100_000)
+    parser.add_argument("--nvar", type=int, default=2_000)
+    parser.add_argument("--density", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--skip-legacy",
+        help="Don't run the previous implementation, e.g. when it would not fit in memory",
+        action="store_true",
+    )
+    args = parser.parse_args()
+
+    Xdf, obs_labels, var_labels = make_Xdf(
+        args.nobs, args.nvar, args.density, args.seed
+    )
+    print(f"nobs={args.nobs} nvar={args.nvar} nnz={len(Xdf)}")
+
+    csr, seconds, peak = measure(
+        tiledbsc.util.X_and_ids_to_sparse_matrix,
+        Xdf,
+        "obs_id",
+        "var_id",
+        "value",
+        obs_labels,
+        var_labels,
+        "csr",
+    )
+    report("X_and_ids_to_sparse_matrix", seconds, peak)
+
+    if not args.skip_legacy:
+        legacy_csr, seconds, peak = measure(
+            legacy_X_and_ids_to_sparse_matrix,
+            Xdf,
+            "obs_id",
+            "var_id",
+            "value",
+            obs_labels,
+            var_labels,
+        )
+        report("legacy dict/list implementation", seconds, peak)
+        assert (csr != legacy_csr).nnz == 0
+
+
+if __name__ == "__main__":
+    main()
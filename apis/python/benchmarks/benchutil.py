@@ -0,0 +1,43 @@
+# ================================================================
+# Shared helpers for the benchmark scripts in this directory.
+# ================================================================
+
+import time
+import tracemalloc
+
+
+def measure(func, *args, **kwargs):
+    """
+    Calls `func` twice: once timed, and once with `tracemalloc` running (which slows down
+    allocation-heavy code too much to time it at the same time). Returns a tuple of the return
+    value, elapsed wall-clock seconds, and peak memory allocated during the call (NumPy
+    allocations included). The function must not modify its arguments.
+    """
+    t1 = time.time()
+    retval = func(*args, **kwargs)
+    t2 = time.time()
+
+    tracemalloc.start()
+    func(*args, **kwargs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return (retval, t2 - t1, peak)
+
+
+def format_bytes(nbytes: int) -> str:
+    """
+    Formats a byte count as a compact, human-readable string.
+    """
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if nbytes < 1024:
+            return "%.1f %s" % (nbytes, unit)
+        nbytes /= 1024
+    return "%.1f TiB" % nbytes
+
+
+def report(label: str, seconds: float, peak: int) -> None:
+    """
+    Prints one line of benchmark results.
+    """
+    print("%-40s %10.3f seconds  peak %s" % (label, seconds, format_bytes(peak)))
@@ -135,16 +135,9 @@ def show_obs_id_counts(soco: t.SOMACollection) -> None:
 
 # ----------------------------------------------------------------
 def show_var_id_counts(soco: t.SOMACollection) -> None:
-    counts = {}
-    for soma in soco:
-        for oid in soma.var.ids():
-            if oid in counts:
-                counts[oid] += 1
-            else:
-                counts[oid] = 1
-    df = pandas.DataFrame.from_dict(
-        {"var_id": counts.keys(), "counts": counts.values()}
-    )
+    # This is a lookup in the collection-level value index, rather than a read of every SOMA's var.
+    counts = soco.var_value_index.lookup("var_id")["value"].value_counts(sort=False)
+    df = pandas.DataFrame.from_dict({"var_id": counts.index, "counts": counts.values})
     # print(df.head())
     print(df)
 
@@ -169,59 +162,33 @@ def show_var_column_unique_values(soco: t.SOMACollection, col_name: str) -> None
 
 # ----------------------------------------------------------------
 def show_obs_value_counts(soco: t.SOMACollection, obs_labels: List[str]) -> None:
-
+    # Counts of SOMAs having each value, from the collection-level value index.
     for obs_label in obs_labels:
-        counts = {}
-
-        for soma in soco:
-            print("...", soma.name)
-            # print("\n".join(sorted(soma.obs.attr_names())))
-            obs = soma.obs.df()
-
-            if not obs_label in obs:
-                continue
-
-            obs_label_values = sorted(list(set(obs[obs_label])))
-            for obs_label_value in obs_label_values:
-                if obs_label_value in counts:
-                    counts[obs_label_value] += 1
-                else:
-                    counts[obs_label_value] = 1
+        counts = soco.obs_value_index.lookup(obs_label)["value"].value_counts(
+            ascending=True
+        )
 
         print(
             "----------------------------------------------------------------",
             obs_label,
         )
-        for k, v in dict(sorted(counts.items(), key=lambda item: item[1])).items():
+        for k, v in counts.items():
             print(k, v)
 
 
 # ----------------------------------------------------------------
 def show_var_value_counts(soco: t.SOMACollection, var_labels: List[str]) -> None:
-
+    # Counts of SOMAs having each value, from the collection-level value index.
     for var_label in var_labels:
-        counts = {}
-
-        for soma in soco:
-            print("...", soma.name)
-            # print("\n".join(sorted(soma.var.attr_names())))
-            var = soma.var.df()
-
-            if not var_label in var:
-                continue
-
-            var_label_values = sorted(list(set(var[var_label])))
-            for var_label_value in var_label_values:
-                if var_label_value in counts:
-                    counts[var_label_value] += 1
-                else:
-                    counts[var_label_value] = 1
+        counts = soco.var_value_index.lookup(var_label)["value"].value_counts(
+            ascending=True
+        )
 
         print(
             "----------------------------------------------------------------",
             var_label,
         )
-        for k, v in dict(sorted(counts.items(), key=lambda item: item[1])).items():
+        for k, v in counts.items():
             print(k, v)
 
 
@@ -232,28 +199,19 @@ def show_somas_having(
     var_labels_to_values: Dict[str, List],
 ) -> None:
 
+    # These are lookups in the collection-level value indices, rather than reads of every SOMA's
+    # obs and var.
+    found = []
+    for obs_label, values in obs_labels_to_values.items():
+        found.append(("obs", soco.obs_value_index.lookup(obs_label, values)))
+    for var_label, values in var_labels_to_values.items():
+        found.append(("var", soco.var_value_index.lookup(var_label, values)))
+
     for soma in soco:
         print(soma.uri)
-
-        obs = soma.obs.df()
-        for obs_label in obs_labels_to_values:
-            if not obs_label in obs:
-                print("out1")
-                continue
-            soma_obs_label_values = sorted(list(set(obs[obs_label])))
-            for sought_obs_label_value in obs_labels_to_values[obs_label]:
-                if sought_obs_label_value in soma_obs_label_values:
-                    print("  found obs", sought_obs_label_value)
-
-        var = soma.var.df()
-        for var_label in var_labels_to_values:
-            if not var_label in var:
-                print("out2")
-                continue
-            soma_var_label_values = sorted(list(set(var[var_label])))
-            for sought_var_label_value in var_labels_to_values[var_label]:
-                if sought_var_label_value in soma_var_label_values:
-                    print("  found var", sought_var_label_value)
+        for which, df in found:
+            for value in df[df["soma_name"] == soma.name]["value"]:
+                print(f"  found {which}", value)
 
 
 # ================================================================
@@ -7,6 +7,8 @@ from .tiledb_array import TileDBArray
 from .tiledb_group import TileDBGroup
 from .assay_matrix import AssayMatrix
 from .annotation_matrix import AnnotationMatrix
+from .annotation_value_index import AnnotationValueIndex
+from .annotation_matrix_knn_index import AnnotationMatrixKNNIndex
 
 from .annotation_matrix_group import AnnotationMatrixGroup
 from .annotation_pairwise_matrix_group import AnnotationPairwiseMatrixGroup
@@ -14,6 +16,7 @@ from .assay_matrix_group import AssayMatrixGroup
 from .raw_group import RawGroup
 from .uns_group import UnsGroup
 from .uns_array import UnsArray
+from .handle_cache import HandleCache
 
 from .util_ann import describe_ann_file
 from .util_tiledb import show_single_cell_group
@@ -1,4 +1,5 @@
 import tiledb
+import tiledbsc.util_tiledb
 from .tiledb_array import TileDBArray
 from .tiledb_group import TileDBGroup
 from .soma_options import SOMAOptions
@@ -6,8 +7,9 @@ import tiledbsc.util as util
 
 import pandas as pd
 import numpy as np
+import json
 
-from typing import Optional, Tuple, List
+from typing import Optional, Tuple, List, Dict, Any
 
 
 class AnnotationDataFrame(TileDBArray):
@@ -32,39 +34,51 @@ class AnnotationDataFrame(TileDBArray):
         self.dim_name = name + "_id"
 
     # ----------------------------------------------------------------
-    def shape(self):
+    def shape(self, verify: bool = False):
         """
         Returns a tuple with the number of rows and number of columns of the `AnnotationDataFrame`.
         The row-count is the number of obs_ids (for `obs`) or the number of var_ids (for `var`).
         The column-count is the number of columns/attributes in the dataframe.
+
+        The row-count is read from array metadata, which is written at ingest time. Arrays written
+        before that was done fall back to computing it from the data. If `verify` is true, the
+        row-count is recomputed from the data, and an exception is raised if the metadata disagrees.
         """
+        num_rows_key = tiledbsc.util_tiledb.SOMA_NUM_ROWS_METADATA_KEY
         with self._open("r") as A:
-            # These TileDB arrays are string-dimensioned sparse arrays so there is no '.shape'.
-            # Instead we compute it ourselves.  See also:
-            # * https://github.com/single-cell-data/TileDB-SingleCell/issues/10
-            # * https://github.com/TileDB-Inc/TileDB-Py/pull/1055
-            #
-            # Also note that this row-count for obs/var is used by the .shape() methods
-            # for X, raw.X, obsp, and varp -- see the AssayMatrix.shape method.
-            if self.uri.startswith("tiledb://"):
-                num_rows = len(
-                    A.query(attrs=[], dims=[self.dim_name])[:][self.dim_name].tolist()
-                )
-            else:
-                # This is quicker than the query -- we can use it safely off TileDB Cloud,
-                # and if there's just one fragment written.
-                fragment_info = tiledb.array_fragments(self.uri, ctx=self._ctx)
-                if len(fragment_info) == 1:
-                    num_rows = sum(fragment_info.cell_num)
-                else:
-                    num_rows = len(
-                        A.query(attrs=[], dims=[self.dim_name])[:][
-                            self.dim_name
-                        ].tolist()
+            num_rows = A.meta.get(num_rows_key)
+            if num_rows is None or verify:
+                scanned_num_rows = self._get_num_rows_by_scan(A)
+                if num_rows is not None and num_rows != scanned_num_rows:
+                    raise Exception(
+                        f"{self.uri}: row-count metadata {num_rows} does not match row-count {scanned_num_rows}"
                     )
+                num_rows = scanned_num_rows
             num_cols = A.schema.nattr
+            if A.schema.has_attr(tiledbsc.util_tiledb.SOMA_JOINID_ATTR_NAME):
+                num_cols -= 1
             return (num_rows, num_cols)
 
+    # ----------------------------------------------------------------
+    def _get_num_rows_by_scan(self, A) -> int:
+        """
+        Computes the row-count for `shape` from the data, given the array opened for read.
+        """
+        # These TileDB arrays are string-dimensioned sparse arrays so there is no '.shape'.
+        # Instead we compute it ourselves.  See also:
+        # * https://github.com/single-cell-data/TileDB-SingleCell/issues/10
+        # * https://github.com/TileDB-Inc/TileDB-Py/pull/1055
+        #
+        # Also note that this row-count for obs/var is used by the .shape() methods
+        # for X, raw.X, obsp, and varp -- see the AssayMatrix.shape method.
+        if not self.uri.startswith("tiledb://"):
+            # This is quicker than the query -- we can use it safely off TileDB Cloud,
+            # and if there's just one fragment written.
+            fragment_info = tiledb.array_fragments(self.uri, ctx=self._ctx)
+            if len(fragment_info) == 1:
+                return sum(fragment_info.cell_num)
+        return len(A.query(attrs=[], dims=[self.dim_name])[:][self.dim_name])
+
     # ----------------------------------------------------------------
     def ids(self) -> List[str]:
         """
@@ -73,8 +87,68 @@ class AnnotationDataFrame(TileDBArray):
         with self._open("r") as A:
             # TileDB string dims are ASCII not UTF-8. Decode them so they readback
             # not like `b"AKR1C3"` but rather like `"AKR1C3"`.
-            retval = A.query(attrs=[], dims=[self.dim_name])[:][self.dim_name].tolist()
-            return [e.decode() for e in retval]
+            retval = A.query(attrs=[], dims=[self.dim_name])[:][self.dim_name]
+            return util._decode_utf8(retval).tolist()
+
+    # ----------------------------------------------------------------
+    def has_joinids(self) -> bool:
+        """
+        Tells whether the dataframe carries the obs/var joinids used as `X`, `obsp`, and `varp`
+        coordinates in the `SOMAOptions(X_dim_layout="joinid")` storage layout, and as `obsm` and
+        `varm` row coordinates in the `SOMAOptions(annotation_matrix_layout="dense")` one.
+        """
+        return self.has_attr_name(tiledbsc.util_tiledb.SOMA_JOINID_ATTR_NAME)
+
+    # ----------------------------------------------------------------
+    def ids_and_joinids(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the `obs_ids` (for `obs`) or the `var_ids` (for `var`), along with their joinids, as
+        a pair of NumPy arrays in TileDB's sorted order of the IDs. See `has_joinids`.
+        """
+        joinid_attr_name = tiledbsc.util_tiledb.SOMA_JOINID_ATTR_NAME
+        with self._open("r") as A:
+            result = A.query(attrs=[joinid_attr_name], dims=[self.dim_name])[:]
+        # TileDB string dims are ASCII not UTF-8. Decode them so they readback
+        # not like `b"AKR1C3"` but rather like `"AKR1C3"`.
+        ids = util._decode_utf8(result[self.dim_name])
+        return (ids, result[joinid_attr_name])
+
+    # ----------------------------------------------------------------
+    def ids_to_joinids(self, ids) -> np.ndarray:
+        """
+        Maps `obs_ids` (for `obs`) or `var_ids` (for `var`) to their joinids. See `has_joinids`.
+        Raises an exception if any of the IDs are not present.
+
+        A few IDs -- as for embedding lookups in the dense `obsm` layout -- are looked up with a
+        point read; more than `SOMAOptions.joinid_point_read_max_ids`, with a read of all of them.
+        """
+        if len(ids) > self._soma_options.joinid_point_read_max_ids:
+            all_ids, all_joinids = self.ids_and_joinids()
+            return all_joinids[self._get_positions_of_ids(ids, all_ids)]
+
+        ids = np.asarray(ids, dtype=object)
+        if len(ids) == 0:
+            return np.zeros(0, dtype=np.int64)
+        joinid_attr_name = tiledbsc.util_tiledb.SOMA_JOINID_ATTR_NAME
+        with self._open("r") as A:
+            result = A.query(
+                attrs=[joinid_attr_name], dims=[self.dim_name]
+            ).multi_index[list(pd.unique(ids))]
+        found_ids = util._decode_utf8(result[self.dim_name])
+        return result[joinid_attr_name][self._get_positions_of_ids(ids, found_ids)]
+
+    def _get_positions_of_ids(self, ids, found_ids) -> np.ndarray:
+        """
+        Helper for `ids_to_joinids`: maps each of `ids` to its position within `found_ids`, raising
+        if any of them is unknown.
+        """
+        positions = pd.Index(found_ids).get_indexer(ids)
+        if len(positions) > 0 and positions.min() < 0:
+            unknown_ids = pd.unique(np.asarray(ids, dtype=object)[positions < 0])
+            raise Exception(
+                f"{self.uri}: unknown {self.dim_name} values, e.g. {list(unknown_ids[:5])}"
+            )
+        return positions
 
     # ----------------------------------------------------------------
     def keys(self) -> List[str]:
@@ -82,15 +156,36 @@ class AnnotationDataFrame(TileDBArray):
         Returns the column names for the `obs` or `var` dataframe.  For obs and varp, `.keys()` is a
         keystroke-saver for the more general array-schema accessor `attr_names`.
         """
-        return self.attr_names()
+        joinid_attr_name = tiledbsc.util_tiledb.SOMA_JOINID_ATTR_NAME
+        return [
+            attr_name
+            for attr_name in self.attr_names()
+            if attr_name != joinid_attr_name
+        ]
 
     # ----------------------------------------------------------------
-    def dim_select(self, ids):
+    def dim_select(self, ids, attrs: Optional[List[str]] = None):
         """
         Selects a slice out of the dataframe with specified `obs_ids` (for `obs`) or `var_ids` (for `var`).
         If `ids` is `None`, the entire dataframe is returned.
+
+        If `attrs` is given, only those columns are returned -- and only those are read, the
+        projection being pushed down into the TileDB query.
         """
-        if ids is None:
+        if self._uses_arrow_reader():
+            points = {} if ids is None else {self.dim_name: ids}
+            if attrs is None:
+                attrs = self.attr_names()
+            table = self._read_arrow_table([self.dim_name] + attrs, points)
+            df = util._arrow_table_to_dataframe(
+                table, self._soma_options.annotation_string_dtype
+            )
+            df.set_index(self.dim_name, inplace=True)
+        elif attrs is not None:
+            with self._open("r") as A:
+                query = A.query(attrs=attrs, dims=[self.dim_name])
+                df = (query.df[:] if ids is None else query.df[ids])[attrs]
+        elif ids is None:
             with self._open("r") as A:
                 df = A.df[:]
         else:
@@ -110,12 +205,13 @@ class AnnotationDataFrame(TileDBArray):
         return self._ascii_to_unicode_dataframe_readback(df)
 
     # ----------------------------------------------------------------
-    def df(self, ids=None) -> pd.DataFrame:
+    def df(self, ids=None, attrs: Optional[List[str]] = None) -> pd.DataFrame:
         """
         Keystroke-saving alias for `.dim_select()`. If `ids` are provided, they're used
-        to subselect; if not, the entire dataframe is returned.
+        to subselect; if not, the entire dataframe is returned. If `attrs` are provided, only
+        those columns are read.
         """
-        return self.dim_select(ids)
+        return self.dim_select(ids, attrs)
 
     # ----------------------------------------------------------------
     # TODO: this is a v1 for prototype/demo timeframe -- needs expanding.
@@ -123,29 +219,140 @@ class AnnotationDataFrame(TileDBArray):
         """
         Selects from obs/var using a TileDB-Py `QueryCondition` string such as
         `cell_type == "blood"`. Returns None if the slice is empty.
+        Only the columns in `col_names_to_keep` are read -- all of them, if it is `None`.
         This is a v1 implementation for the prototype/demo timeframe.
         """
+        slice_df = self._filter_select(query_string, col_names_to_keep)
+        nobs = len(slice_df)
+        if nobs == 0:
+            return None
+        else:
+            return slice_df
+
+    # ----------------------------------------------------------------
+    def _filter_select(
+        self, query_string: Optional[str], attrs: Optional[List[str]]
+    ) -> pd.DataFrame:
+        """
+        Reads the rows satisfying the `QueryCondition` string -- all rows, if it is `None` -- and
+        only the named attributes -- all of them, if `attrs` is `None`. Both are pushed down into
+        the TileDB query, so that non-matching rows and unwanted columns are never read back.
+        """
+        if attrs is None:
+            attrs = self.attr_names()
+        kwargs = {}
+        if query_string is not None:
+            query_string = self._plan_query_string(query_string)
+            if query_string is None:
+                return self._empty_dataframe(attrs)
+            kwargs = tiledbsc.util_tiledb._query_condition_kwargs(query_string)
         with self._open() as A:
-            qc = tiledb.QueryCondition(query_string)
-            slice_query = A.query(attr_cond=qc)
-            slice_df = slice_query.df[:][col_names_to_keep]
-            nobs = len(slice_df)
-            if nobs == 0:
+            slice_query = A.query(attrs=attrs, dims=[self.dim_name], **kwargs)
+            slice_df = slice_query.df[:][attrs]
+        # This is the 'decode on read' part of our logic; in dim_select we have the 'encode on write' part.
+        # Context: https://github.com/single-cell-data/TileDB-SingleCell/issues/99.
+        return self._ascii_to_unicode_dataframe_readback(slice_df)
+
+    # ----------------------------------------------------------------
+    def _plan_query_string(self, query_string: str) -> Optional[str]:
+        """
+        Uses the column stats to return `None` if no row can satisfy the `QueryCondition` string,
+        so that it needn't be run at all. Otherwise returns the condition to run: if it is a
+        conjunction of comparisons, with the most selective ones first, and in any case with
+        comparisons of categorical columns made against their codes.
+        """
+        triples = tiledbsc.util_tiledb._query_string_to_triples(query_string)
+        if triples is not None:
+            stats = self.column_stats()
+            if tiledbsc.util_tiledb._triples_are_unsatisfiable(triples, stats):
                 return None
-            else:
-                # This is the 'decode on read' part of our logic; in dim_select we have the 'encode on write' part.
-                # Context: https://github.com/single-cell-data/TileDB-SingleCell/issues/99.
-                return self._ascii_to_unicode_dataframe_readback(slice_df)
+            if len(triples) > 1:
+                triples = tiledbsc.util_tiledb._order_triples_by_selectivity(
+                    triples, stats
+                )
+                query_string = tiledbsc.util_tiledb._triples_to_query_string(triples)
+        return self._encode_query_string(query_string)
+
+    # ----------------------------------------------------------------
+    def _encode_query_string(self, query_string: str) -> str:
+        """
+        Rewrites comparisons of dictionary-encoded categorical columns in the `QueryCondition`
+        string, such as `cell_type == "T cell"`, into comparisons of their stored codes.
+        """
+        columns_to_categories = self.categories()
+        if len(columns_to_categories) == 0:
+            return query_string
+        return tiledbsc.util_tiledb._encode_categorical_query_string(
+            query_string, columns_to_categories
+        )
+
+    # ----------------------------------------------------------------
+    def _empty_dataframe(self, attrs: List[str]) -> pd.DataFrame:
+        """
+        Returns a zero-row dataframe shaped like what `_filter_select` reads.
+        """
+        attr_names_to_types = self.attr_names_to_types()
+        columns = {}
+        for attr_name in attrs:
+            dtype = attr_names_to_types[attr_name]
+            if dtype.kind in ("S", "U"):
+                dtype = object
+            columns[attr_name] = np.zeros(0, dtype=dtype)
+        index = pd.Index([], dtype=object, name=self.dim_name)
+        return self._ascii_to_unicode_dataframe_readback(
+            pd.DataFrame(columns, index=index)
+        )
+
+    # ----------------------------------------------------------------
+    def column_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns the per-column statistics recorded when the dataframe was written, as a dict from
+        column name to a dict of `null_count`, `approx_distinct_count`, and -- where applicable --
+        `min`, `max`, and `distinct_values`. These are read from array metadata, without reading
+        the data. Returns an empty dict for arrays written before these stats were kept.
+        """
+        value = self.metadata().get(tiledbsc.util_tiledb.SOMA_COLUMN_STATS_METADATA_KEY)
+        if value is None:
+            return {}
+        return json.loads(value)
+
+    # ----------------------------------------------------------------
+    def categories(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns the dictionary-encoded columns -- see `from_dataframe` -- as a dict from column name
+        to a dict of `categories`, a list of strings indexed by code, and `ordered`. These are read
+        from array metadata. Returns an empty dict if there are none.
+        """
+        value = self.metadata().get(tiledbsc.util_tiledb.SOMA_CATEGORIES_METADATA_KEY)
+        if value is None:
+            return {}
+        return json.loads(value)
 
     # ----------------------------------------------------------------
     def _ascii_to_unicode_dataframe_readback(self, df):
         """
-        Implements the 'decode on read' partof our logic as noted in `dim_select()`.
+        Implements the 'decode on read' partof our logic as noted in `dim_select()`, using
+        `util._decode_utf8` to decode each column in bulk. Also drops the joinid column, if any,
+        which is storage-level detail, and makes dictionary-encoded columns categorical again.
         """
+        joinid_attr_name = tiledbsc.util_tiledb.SOMA_JOINID_ATTR_NAME
+        if joinid_attr_name in df.columns:
+            df = df.drop(columns=[joinid_attr_name])
+        columns_to_categories = self.categories()
+        string_dtype = self._soma_options.annotation_string_dtype
         for k in df:
             dfk = df[k]
-            if len(dfk) > 0 and type(dfk[0]) == bytes:
-                df[k] = dfk.map(lambda e: e.decode())
+            entry = columns_to_categories.get(k)
+            if entry is not None:
+                # The codes are used as they are: there is nothing to decode per row.
+                df[k] = pd.Categorical.from_codes(
+                    dfk.to_numpy(),
+                    categories=entry["categories"],
+                    ordered=entry["ordered"],
+                )
+                continue
+            if len(dfk) > 0 and type(dfk.iloc[0]) == bytes:
+                df[k] = util._decode_utf8(dfk.to_numpy(), string_dtype)
         return df
 
     # ----------------------------------------------------------------
@@ -197,6 +404,29 @@ class AnnotationDataFrame(TileDBArray):
             mode = "append"
             if self._verbose:
                 print(f"{self._indent}Re-using existing array {self.uri}")
+            with_joinids = self.has_joinids()
+        else:
+            # Both of these store coordinates by joinid.
+            with_joinids = (
+                self._soma_options.X_dim_layout == "joinid"
+                or self._soma_options.annotation_matrix_layout == "dense"
+            )
+
+        # The column stats describe the user's columns, not the joinids or category codes.
+        user_dataframe = dataframe
+
+        dataframe, columns_to_categories = self._encode_categoricals(
+            dataframe, mode == "append"
+        )
+
+        if with_joinids:
+            dataframe = dataframe.assign(
+                **{
+                    tiledbsc.util_tiledb.SOMA_JOINID_ATTR_NAME: self._get_joinids_for_write(
+                        dataframe.index
+                    )
+                }
+            )
 
         # ISSUE:
         # TileDB attributes can be stored as Unicode but they are not yet queryable via the TileDB
@@ -248,6 +478,126 @@ class AnnotationDataFrame(TileDBArray):
         )
 
         self._set_soma_object_type_metadata()
+        self._update_num_rows_metadata(
+            len(dataframe.index.unique()) if mode == "ingest" else None
+        )
+        self._update_column_stats_metadata(
+            tiledbsc.util_tiledb._get_column_stats(
+                user_dataframe, self._soma_options.column_stats_max_distinct_values
+            ),
+            mode == "ingest",
+        )
+        if len(columns_to_categories) > 0:
+            self.set_metadata(
+                tiledbsc.util_tiledb.SOMA_CATEGORIES_METADATA_KEY,
+                json.dumps(columns_to_categories),
+            )
 
         if self._verbose:
             print(util.format_elapsed(s, f"{self._indent}FINISH WRITING {self.uri}"))
+
+    # ----------------------------------------------------------------
+    def _encode_categoricals(
+        self, dataframe: pd.DataFrame, is_append: bool
+    ) -> Tuple[pd.DataFrame, Dict[str, Dict[str, Any]]]:
+        """
+        Dictionary-encodes categorical columns of strings for `from_dataframe`: each is stored as
+        int32 codes, -1 for null, with its categories kept in array metadata, so that a value
+        repeated across millions of rows is stored, and compared in queries, as a small integer.
+        Returns the dataframe to write, along with the categories of all encoded columns.
+
+        On append, categories not already stored are added after those that are, so that stored
+        codes keep their meaning. Plain string columns appended to encoded ones are encoded too.
+        Categorical columns are converted to strings instead if they are appended to plain string
+        columns, or with `SOMAOptions(dictionary_encode_categoricals=False)`.
+        """
+        columns_to_categories = self.categories() if is_append else {}
+        existing_attr_names = set(self.attr_names()) if is_append else set()
+        encode_new_columns = self._soma_options.dictionary_encode_categoricals
+
+        columns = {}
+        for column_name in dataframe.keys():
+            dfc = dataframe[column_name]
+            entry = columns_to_categories.get(column_name)
+            if entry is None:
+                if not util._is_string_categorical(dfc):
+                    continue
+                if column_name in existing_attr_names or not encode_new_columns:
+                    columns[column_name] = dfc.astype(str)
+                    continue
+                entry = {"categories": [], "ordered": bool(dfc.cat.ordered)}
+
+            if pd.api.types.is_categorical_dtype(dfc.dtype):
+                values = dfc.cat.categories
+            else:
+                values = dfc.dropna().unique()
+            known = set(entry["categories"])
+            categories = entry["categories"] + [
+                str(value) for value in values if str(value) not in known
+            ]
+            codes = pd.Categorical(dfc, categories=categories).codes
+            columns[column_name] = codes.astype(np.int32)
+            columns_to_categories[column_name] = {
+                "categories": categories,
+                "ordered": entry["ordered"],
+            }
+
+        if len(columns) > 0:
+            dataframe = dataframe.assign(**columns)
+        return (dataframe, columns_to_categories)
+
+    # ----------------------------------------------------------------
+    def _update_num_rows_metadata(self, num_rows: Optional[int]) -> None:
+        """
+        Records the row-count read by `shape`. If `num_rows` is `None` -- after an append, which may
+        have overwritten existing rows as well as added new ones -- it is computed from the data.
+        """
+        if num_rows is None:
+            with self._open("r") as A:
+                num_rows = self._get_num_rows_by_scan(A)
+        self.set_metadata(tiledbsc.util_tiledb.SOMA_NUM_ROWS_METADATA_KEY, num_rows)
+
+    # ----------------------------------------------------------------
+    def _update_column_stats_metadata(
+        self, stats: Dict[str, Dict[str, Any]], is_new_array: bool
+    ) -> None:
+        """
+        Records the column stats read by `column_stats`, merging them with those already stored
+        after an append. Stats are not kept for arrays written before they were: after an append
+        to one of those, they would describe only the appended rows.
+        """
+        if not is_new_array:
+            old_stats = self.column_stats()
+            if len(old_stats) == 0:
+                return
+            stats = tiledbsc.util_tiledb._merge_column_stats(
+                old_stats, stats, self._soma_options.column_stats_max_distinct_values
+            )
+        self.set_metadata(
+            tiledbsc.util_tiledb.SOMA_COLUMN_STATS_METADATA_KEY, json.dumps(stats)
+        )
+
+    # ----------------------------------------------------------------
+    def _get_joinids_for_write(self, ids) -> np.ndarray:
+        """
+        Returns joinids for the given `obs_ids`/`var_ids` which are about to be written. IDs
+        already in storage keep the joinids they have -- `X`, `obsp`, and `varp` are written in
+        terms of them -- while new IDs are numbered densely from one past the largest existing
+        joinid.
+        """
+        joinids = np.zeros(len(ids), dtype=np.int64)
+        is_new = np.ones(len(ids), dtype=bool)
+        next_joinid = 0
+
+        if self.exists():
+            existing_ids, existing_joinids = self.ids_and_joinids()
+            if len(existing_ids) > 0:
+                positions = pd.Index(existing_ids).get_indexer(ids)
+                is_new = positions < 0
+                joinids[~is_new] = existing_joinids[positions[~is_new]]
+                next_joinid = int(existing_joinids.max()) + 1
+
+        joinids[is_new] = np.arange(
+            next_joinid, next_joinid + np.count_nonzero(is_new), dtype=np.int64
+        )
+        return joinids
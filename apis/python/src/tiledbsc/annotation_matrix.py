@@ -2,19 +2,36 @@ import tiledb
 from .tiledb_array import TileDBArray
 from .tiledb_group import TileDBGroup
 from .soma_options import SOMAOptions
+from .annotation_dataframe import AnnotationDataFrame
+from .annotation_matrix_knn_index import AnnotationMatrixKNNIndex
 import tiledbsc.util as util
+import tiledbsc.util_tiledb
 
+import scipy
+import numpy as np
 import pandas as pd
 
-from typing import Optional, List
+from typing import Optional, List, Callable, Dict, Tuple
+import math
 
 
 class AnnotationMatrix(TileDBArray):
     """
     Nominally for obsm and varm group elements within a soma.
+
+    These are stored in one of two layouts -- see `SOMAOptions.annotation_matrix_layout`:
+
+    * Sparse: a 1D sparse array over `obs_id` (for `obsm`) or `var_id` (for `varm`), with one
+      attribute per column.
+    * Dense: a 2D dense array over the obs/var joinids and column number, with one attribute. Reads
+      come back from TileDB as one contiguous `numpy.ndarray`; reads of a few rows are subarray
+      reads.
     """
 
     dim_name: str  # e.g. 'obs_id' or 'var_id' -- the name of the one string dimension
+    dataframe: Optional[
+        AnnotationDataFrame
+    ]  # Nominally soma.obs or soma.var, for their joinids
 
     # ----------------------------------------------------------------
     def __init__(
@@ -22,13 +39,34 @@ class AnnotationMatrix(TileDBArray):
         uri: str,
         name: str,
         dim_name: str,
+        dataframe: Optional[AnnotationDataFrame] = None,
         parent: Optional[TileDBGroup] = None,
     ):
         """
-        See the TileDBObject constructor.
+        See the TileDBObject constructor. The `dataframe` -- `obs` for `obsm` elements, `var` for
+        `varm` elements -- maps IDs to joinids for the dense layout.
         """
         super().__init__(uri=uri, name=name, parent=parent)
         self.dim_name = dim_name
+        self.dataframe = dataframe
+
+    # ----------------------------------------------------------------
+    def uses_dense_layout(self) -> bool:
+        """
+        Tells whether the array is stored in the dense layout rather than the sparse one. See
+        `SOMAOptions.annotation_matrix_layout`.
+        """
+        return not self.tiledb_array_schema().sparse
+
+    # ----------------------------------------------------------------
+    def num_columns(self) -> int:
+        """
+        Returns the number of columns, as `shape` does, but from the schema alone.
+        """
+        schema = self.tiledb_array_schema()
+        if schema.sparse:
+            return schema.nattr
+        return int(schema.domain.dim(1).domain[1]) + 1
 
     # ----------------------------------------------------------------
     def shape(self):
@@ -69,6 +107,16 @@ class AnnotationMatrix(TileDBArray):
         Selects a slice out of the array with specified `obs_ids` (for `obsm` elements) or
         `var_ids` (for `varm` elements).  If `ids` is `None`, the entire array is returned.
         """
+        if self.uses_dense_layout():
+            ids, joinids = self._get_ids_and_joinids(ids)
+            matrix = self._read_dense_rows(joinids)
+            col_names = [
+                self.name + "_" + str(j) for j in range(1, matrix.shape[1] + 1)
+            ]
+            return pd.DataFrame(
+                matrix, index=pd.Index(ids, name=self.dim_name), columns=col_names
+            )
+
         if ids is None:
             with self._open() as A:
                 df = A.df[:]
@@ -86,6 +134,140 @@ class AnnotationMatrix(TileDBArray):
         """
         return self.dim_select(ids)
 
+    # ----------------------------------------------------------------
+    def to_numpy(self, ids=None) -> np.ndarray:
+        """
+        Returns the rows for the specified `obs_ids` (for `obsm` elements) or `var_ids` (for `varm`
+        elements), in that order, as a 2D `numpy.ndarray`. If `ids` is `None`, all rows are returned,
+        in the same order as `.dim_select()`.
+
+        For the dense layout this is the array as TileDB reads it, with no dataframe made in between;
+        it is reordered, with one copy, only if the IDs' joinids are not in increasing order.
+        """
+        if self.uses_dense_layout():
+            ids, joinids = self._get_ids_and_joinids(ids)
+            return self._read_dense_rows(joinids)
+        if ids is None:
+            return self.dim_select(None).to_numpy()
+        ids = np.asarray(ids, dtype=object)
+        return self.dim_select(list(pd.unique(ids))).loc[ids].to_numpy()
+
+    # ----------------------------------------------------------------
+    def knn_index(self) -> AnnotationMatrixKNNIndex:
+        """
+        Returns the approximate nearest-neighbor index for the matrix. This is built by
+        `AnnotationMatrixGroup.build_knn_index`: it may not exist yet.
+        """
+        suffix = tiledbsc.util_tiledb.KNN_INDEX_NAME_SUFFIX
+        return AnnotationMatrixKNNIndex(
+            uri=self.uri + suffix, name=self.name + suffix, parent=self
+        )
+
+    # ----------------------------------------------------------------
+    def knn(
+        self,
+        vectors,
+        k: int = 10,
+        nprobe: int = 8,
+        rerank: bool = False,
+        rerank_factor: int = 4,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the approximate `k` nearest rows to each of `vectors`, using the index built by
+        `soma.obsm.build_knn_index(...)`. Returns two arrays with a row per vector, nearest first:
+        the `obs_ids` (for `obsm` elements) or `var_ids` (for `varm` elements) of the rows found, and
+        their Euclidean distances. Where fewer than `k` are found, the remainder are `None` with
+        distance `inf`. For the rows most like a given row, pass that row, e.g. from `.to_numpy()`.
+
+        :param vectors: A vector with an element per column, or a 2D array of them. For a single
+        vector, the results are 1D.
+        :param nprobe: Number of index lists to scan per vector. More finds more of the true nearest
+        rows, at the cost of reading more.
+        :param rerank: If true, the `k * rerank_factor` best candidates for each vector are re-ranked
+        by exact distance, from their rows as stored in this matrix rather than in the index.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        is_single = vectors.ndim == 1
+        if is_single:
+            vectors = vectors[np.newaxis, :]
+
+        index = self.knn_index()
+        if not rerank:
+            (ids, distances) = index.search(vectors, k, nprobe)
+        else:
+            (candidate_ids, _) = index.search(vectors, k * rerank_factor, nprobe)
+            unique_ids = pd.unique(candidate_ids[candidate_ids != None])
+            exact = self.to_numpy(unique_ids).astype(np.float32)
+            ids = np.full((len(vectors), k), None, dtype=object)
+            distances = np.full((len(vectors), k), np.inf, dtype=np.float32)
+            for i, vector in enumerate(vectors):
+                row_ids = candidate_ids[i][candidate_ids[i] != None]
+                rows = exact[pd.Index(unique_ids).get_indexer(row_ids)]
+                row_distances = np.sqrt(((rows - vector) ** 2).sum(axis=1))
+                order = np.argsort(row_distances, kind="stable")[:k]
+                ids[i, : len(order)] = row_ids[order]
+                distances[i, : len(order)] = row_distances[order]
+
+        if is_single:
+            return (ids[0], distances[0])
+        return (ids, distances)
+
+    # ----------------------------------------------------------------
+    def _get_ids_and_joinids(self, ids):
+        """
+        Helper for dense-layout reads: returns the IDs to read -- all of them, in sorted order, if
+        `ids` is `None` -- and their joinids, as NumPy arrays.
+        """
+        if ids is None:
+            return self._get_dataframe().ids_and_joinids()
+        ids = np.asarray(ids, dtype=object)
+        return (ids, self._get_dataframe().ids_to_joinids(ids))
+
+    # ----------------------------------------------------------------
+    def _get_dataframe(self) -> AnnotationDataFrame:
+        """
+        Returns the obs/var dataframe whose joinids the dense layout is keyed by, or raises an
+        exception if there is none.
+        """
+        if self.dataframe is None or not self.dataframe.has_joinids():
+            raise Exception(
+                f"{self.uri}: the dense layout needs joinids, which are written to obs/var with SOMAOptions(annotation_matrix_layout='dense')"
+            )
+        return self.dataframe
+
+    # ----------------------------------------------------------------
+    def _read_dense_rows(self, joinids: np.ndarray) -> np.ndarray:
+        """
+        Reads the rows at the given joinids, in that order, from a dense-layout array. Runs of
+        consecutive joinids are read as single subarrays.
+        """
+        is_sorted = bool(np.all(joinids[1:] >= joinids[:-1]))
+        if is_sorted:
+            sorted_joinids = joinids
+        else:
+            permutation = np.argsort(joinids, kind="stable")
+            sorted_joinids = joinids[permutation]
+        runs = util._get_consecutive_runs(sorted_joinids)
+
+        with self._open() as A:
+            ncol = A.schema.domain.dim(1).domain[1] + 1
+            if len(runs) == 0:
+                return np.empty((0, ncol), dtype=A.schema.attr(0).dtype)
+            ranges = [
+                slice(int(sorted_joinids[lo]), int(sorted_joinids[hi - 1]))
+                for lo, hi in runs
+            ]
+            if len(ranges) == 1:
+                rows = A[ranges[0].start : ranges[0].stop + 1][self.name]
+            else:
+                rows = A.multi_index[ranges, :][self.name]
+
+        if is_sorted:
+            return rows
+        retval = np.empty_like(rows)
+        retval[permutation] = rows
+        return retval
+
     # ----------------------------------------------------------------
     def shape(self):
         """
@@ -98,6 +280,13 @@ class AnnotationMatrix(TileDBArray):
             # Instead we compute it ourselves.  See also:
             # * https://github.com/single-cell-data/TileDB-SingleCell/issues/10
             # * https://github.com/TileDB-Inc/TileDB-Py/pull/1055
+            if not A.schema.sparse:
+                nonempty_domain = A.nonempty_domain()
+                num_cols = A.schema.domain.dim(1).domain[1] + 1
+                if nonempty_domain is None:
+                    return (0, num_cols)
+                (lo, hi) = nonempty_domain[0]
+                return (int(hi - lo + 1), num_cols)
             num_rows = len(A[:][self.dim_name].tolist())
             num_cols = A.schema.nattr
             return (num_rows, num_cols)
@@ -109,13 +298,25 @@ class AnnotationMatrix(TileDBArray):
 
         :param matrix: anndata.obsm['foo'], anndata.varm['foo'], or anndata.raw.varm['foo'].
         :param dim_values: anndata.obs_names, anndata.var_names, or anndata.raw.var_names.
+
+        Dataframes, with their per-column names and types, are always stored in the sparse layout.
         """
 
         if self._verbose:
             s = util.get_start_stamp()
             print(f"{self._indent}START  WRITING {self.uri}")
 
-        if isinstance(matrix, pd.DataFrame):
+        if self.exists():
+            uses_dense_layout = self.uses_dense_layout()
+        else:
+            uses_dense_layout = (
+                self._soma_options.annotation_matrix_layout == "dense"
+                and not isinstance(matrix, pd.DataFrame)
+            )
+
+        if uses_dense_layout:
+            self._from_matrix_dense(matrix, dim_values)
+        elif isinstance(matrix, pd.DataFrame):
             self._from_pandas_dataframe(matrix, dim_values)
         else:
             self._numpy_ndarray_or_scipy_sparse_csr_matrix(matrix, dim_values)
@@ -154,8 +355,101 @@ class AnnotationMatrix(TileDBArray):
         else:
             self._create_empty_array(list(df.dtypes), attr_names)
 
-        with tiledb.open(self.uri, mode="w", ctx=self._ctx) as A:
-            A[dim_values] = df.to_dict(orient="list")
+        # One NumPy array per column: chunks of rows are taken from these directly, without
+        # boxing each value into a Python object as `df.to_dict(orient="list")` would.
+        columns = [df.iloc[:, j].to_numpy() for j in range(nattr)]
+        self._ingest_columns_rows_chunked(
+            lambda rows: {
+                attr_name: columns[j][rows] for j, attr_name in enumerate(attr_names)
+            },
+            dim_values,
+            nattr,
+        )
+
+    # ----------------------------------------------------------------
+    def _from_matrix_dense(self, matrix, dim_values):
+        """
+        Writes an ndarray or (csr|csc)matrix in the dense layout, a chunk of rows at a time, by the
+        joinids of `dim_values` in the obs/var dataframe, which must already have been written.
+        """
+        if scipy.sparse.issparse(matrix):
+            matrix = matrix.tocsr()
+        else:
+            matrix = np.asarray(matrix)
+        (nrow, ncol) = matrix.shape
+
+        if self.exists():
+            if self._verbose:
+                print(f"{self._indent}Re-using existing array {self.uri}")
+        else:
+            self._create_empty_dense_array(matrix.dtype, ncol)
+
+        joinids = self._get_dataframe().ids_to_joinids(
+            np.asarray(dim_values, dtype=object)
+        )
+        permutation = np.argsort(joinids, kind="stable")
+        sorted_joinids = joinids[permutation]
+
+        chunk_size = int(math.ceil(self._soma_options.goal_chunk_nnz / max(ncol, 1)))
+        with self._open("w") as A:
+            for i in range(0, nrow, chunk_size):
+                i2 = min(i + chunk_size, nrow)
+                chunk = matrix[permutation[i:i2]]
+                if scipy.sparse.issparse(chunk):
+                    chunk = chunk.toarray()
+                chunk_joinids = sorted_joinids[i:i2]
+                # One subarray write per run of consecutive joinids -- for a fresh ingest, that is
+                # the whole chunk.
+                for lo, hi in util._get_consecutive_runs(chunk_joinids):
+                    joinid = int(chunk_joinids[lo])
+                    A[joinid : joinid + hi - lo, 0:ncol] = chunk[lo:hi]
+
+    # ----------------------------------------------------------------
+    def _create_empty_dense_array(self, matrix_dtype, ncol: int):
+        """
+        Create a TileDB 2D dense array over joinid and column number, with a single attribute.
+        """
+        row_extent = (
+            self._soma_options.obs_extent
+            if self.dim_name == "obs_id"
+            else self._soma_options.var_extent
+        )
+        dom = tiledb.Domain(
+            tiledb.Dim(
+                name=self.dim_name,
+                # Leave room at the top of the domain for the last tile's extent.
+                domain=(0, np.iinfo(np.int64).max - row_extent),
+                tile=row_extent,
+                dtype=np.int64,
+            ),
+            tiledb.Dim(
+                name=tiledbsc.util_tiledb.ANNOTATION_MATRIX_COLUMN_DIM_NAME,
+                domain=(0, ncol - 1),
+                tile=ncol,
+                dtype=np.int64,
+            ),
+            ctx=self._ctx,
+        )
+
+        att = tiledb.Attr(
+            self.name,
+            dtype=matrix_dtype,
+            filters=[tiledb.ZstdFilter()],
+            ctx=self._ctx,
+        )
+
+        # Row-major, so that each row -- one cell's embedding, for obsm -- is contiguous on disk
+        # as well as in the arrays read back.
+        sch = tiledb.ArraySchema(
+            domain=dom,
+            attrs=(att,),
+            sparse=False,
+            cell_order="row-major",
+            tile_order="row-major",
+            ctx=self._ctx,
+        )
+
+        tiledb.Array.create(self.uri, sch, ctx=self._ctx)
 
     # ----------------------------------------------------------------
     def _create_empty_array(self, matrix_dtypes, attr_names):
@@ -212,16 +506,66 @@ class AnnotationMatrix(TileDBArray):
     # ----------------------------------------------------------------
     def _ingest_data(self, matrix, dim_values, col_names):
         """
-        Convert ndarray/(csr|csc)matrix to a dataframe and ingest into TileDB.
+        Ingest an ndarray or (csr|csc)matrix into TileDB, column by column. Sparse matrices are
+        densified only a chunk of rows at a time.
 
-        :param matrix: Matrix-like object coercible to a pandas dataframe.
+        :param matrix: `numpy.ndarray` or `scipy.sparse` matrix.
         :param dim_values: barcode/gene IDs from anndata.obs_names or anndata.var_names
         :param col_names: List of column names.
         """
 
         assert len(col_names) == matrix.shape[1]
 
-        df = pd.DataFrame(matrix, columns=col_names)
+        if scipy.sparse.issparse(matrix):
+            # Row-slicing is cheap for CSR; no-op if the matrix is CSR already.
+            matrix = matrix.tocsr()
+
+            def get_chunk_columns(rows):
+                chunk = matrix[rows].toarray(order="F")
+                return {col_name: chunk[:, j] for j, col_name in enumerate(col_names)}
 
-        with tiledb.open(self.uri, mode="w", ctx=self._ctx) as A:
-            A[dim_values] = df.to_dict(orient="list")
+        else:
+            matrix = np.asarray(matrix)
+
+            def get_chunk_columns(rows):
+                # Each is a contiguous copy of the chunk's rows of that column.
+                return {
+                    col_name: matrix[rows, j] for j, col_name in enumerate(col_names)
+                }
+
+        self._ingest_columns_rows_chunked(get_chunk_columns, dim_values, len(col_names))
+
+    # ----------------------------------------------------------------
+    def _ingest_columns_rows_chunked(
+        self,
+        get_chunk_columns: Callable[[np.ndarray], Dict[str, np.ndarray]],
+        dim_values,
+        ncol: int,
+    ) -> None:
+        """
+        Writes the matrix to TileDB a chunk of rows at a time, one fragment per chunk, with the
+        rows sorted by dim value as for `X`, so that fragments don't overlap. Chunks are sized
+        so that each has about `goal_chunk_nnz` cells.
+
+        :param get_chunk_columns: Given the row indices for a chunk, returns a dict from column
+        name to NumPy array of that column's values for those rows.
+        :param dim_values: barcode/gene IDs from anndata.obs_names or anndata.var_names
+        :param ncol: Number of columns.
+        """
+        sorted_dim_values, permutation = util._get_sort_and_permutation(dim_values)
+        nrow = len(sorted_dim_values)
+
+        chunk_size = int(math.ceil(self._soma_options.goal_chunk_nnz / max(ncol, 1)))
+        chunk_bounds = [
+            (i, min(i + chunk_size, nrow)) for i in range(0, nrow, chunk_size)
+        ]
+        nchunk = len(chunk_bounds)
+
+        with self._open("w") as A:
+            for chunk_index, (i, i2) in enumerate(chunk_bounds):
+                if self._verbose and nchunk > 1:
+                    print(
+                        "%sSTART  chunk %d of %d, rows %d..%d of %d"
+                        % (self._indent, chunk_index + 1, nchunk, i, i2 - 1, nrow)
+                    )
+                A[sorted_dim_values[i:i2]] = get_chunk_columns(permutation[i:i2])
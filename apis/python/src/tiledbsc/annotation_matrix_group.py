@@ -2,8 +2,12 @@ import tiledb
 from .soma_options import SOMAOptions
 from .tiledb_group import TileDBGroup
 from .annotation_matrix import AnnotationMatrix
+from .annotation_matrix_knn_index import AnnotationMatrixKNNIndex
+from .annotation_dataframe import AnnotationDataFrame
 import tiledbsc.util as util
+import tiledbsc.util_tiledb
 
+import numpy as np
 import pandas as pd
 import scipy
 
@@ -19,28 +23,45 @@ class AnnotationMatrixGroup(TileDBGroup):
     """
 
     dim_name: str
+    dataframe: Optional[AnnotationDataFrame]
 
     # ----------------------------------------------------------------
     def __init__(
         self,
         uri: str,
         name: str,  # 'obsm' or 'varm'
+        dataframe: Optional[
+            AnnotationDataFrame
+        ] = None,  # Nominally soma.obs or soma.var
         parent: Optional[TileDBGroup] = None,
     ):
         """
-        See the TileDBObject constructor.
+        See the TileDBObject constructor. See `AnnotationMatrix` for the `dataframe`.
         """
         assert name in ["obsm", "varm"]
         super().__init__(uri=uri, name=name, parent=parent)
         self.dim_name = "obs_id" if name == "obsm" else "var_id"
+        self.dataframe = dataframe
 
     # ----------------------------------------------------------------
     def keys(self):
         """
         For `obsm` and `varm`, `.keys()` is a keystroke-saver for the more general group-member
-        accessor `._get_member_names()`.
+        accessor `._get_member_names()`. Nearest-neighbor indices are not listed.
         """
-        return self._get_member_names()
+        return list(self._get_matrix_names_to_uris().keys())
+
+    # ----------------------------------------------------------------
+    def _get_matrix_names_to_uris(self) -> Dict[str, str]:
+        """
+        Like `._get_member_names_to_uris()`, leaving out the members which are nearest-neighbor
+        indices rather than matrices.
+        """
+        return {
+            name: uri
+            for name, uri in self._get_member_names_to_uris().items()
+            if not _is_knn_index_name(name)
+        }
 
     # ----------------------------------------------------------------
     def __iter__(self) -> List[AnnotationMatrix]:
@@ -48,9 +69,13 @@ class AnnotationMatrixGroup(TileDBGroup):
         Implements `for matrix in soma.obsm: ...` and `for matrix in soma.varm: ...`
         """
         retval = []
-        for name, uri in self._get_member_names_to_uris().items():
+        for name, uri in self._get_matrix_names_to_uris().items():
             matrix = AnnotationMatrix(
-                uri=uri, name=name, dim_name=self.dim_name, parent=self
+                uri=uri,
+                name=name,
+                dim_name=self.dim_name,
+                dataframe=self.dataframe,
+                parent=self,
             )
             retval.append(matrix)
         return iter(retval)
@@ -62,7 +87,7 @@ class AnnotationMatrixGroup(TileDBGroup):
         This way you can do `soma.obsm.X_tsne` as an alias for `soma.obsm['X_tsne']`.
         """
         with self._open() as G:
-            if not name in G:
+            if not name in G or _is_knn_index_name(name):
                 raise AttributeError(
                     f"'{self.__class__.__name__}' object has no attribute '{name}'"
                 )
@@ -82,17 +107,76 @@ class AnnotationMatrixGroup(TileDBGroup):
         self._create()
 
         for matrix_name in annotation_matrices.keys():
-            anndata_matrix = annotation_matrices[matrix_name]
-            matrix_uri = os.path.join(self.uri, matrix_name)
-            annotation_matrix = AnnotationMatrix(
-                uri=matrix_uri,
-                name=matrix_name,
-                dim_name=self.dim_name,
-                parent=self,
+            annotation_matrix = self._write_matrix(
+                matrix_name, annotation_matrices[matrix_name], dim_values
             )
-            annotation_matrix.from_matrix_and_dim_values(anndata_matrix, dim_values)
             self._add_object(annotation_matrix)
 
+    # ----------------------------------------------------------------
+    def _write_matrix(
+        self, matrix_name: str, anndata_matrix, dim_values
+    ) -> AnnotationMatrix:
+        """
+        Writes one member array of the group, without adding it to the group: see
+        `from_matrices_and_dim_values`. The group must already exist.
+        """
+        annotation_matrix = AnnotationMatrix(
+            uri=os.path.join(self.uri, matrix_name),
+            name=matrix_name,
+            dim_name=self.dim_name,
+            dataframe=self.dataframe,
+            parent=self,
+        )
+        annotation_matrix.from_matrix_and_dim_values(anndata_matrix, dim_values)
+        return annotation_matrix
+
+    # ----------------------------------------------------------------
+    def build_knn_index(
+        self,
+        name: str,
+        nlist: Optional[int] = None,
+        niter: int = 20,
+        quantize: bool = True,
+        seed: int = 0,
+    ) -> AnnotationMatrixKNNIndex:
+        """
+        Builds an approximate nearest-neighbor index over the rows of the named member -- e.g.
+        `soma.obsm.build_knn_index("X_pca")` -- replacing any index it already has. The index is then
+        used by `soma.obsm["X_pca"].knn(...)`. See `AnnotationMatrixKNNIndex` for the parameters.
+        """
+        matrix = self[name]
+        if matrix is None:
+            raise Exception(f"{self.uri} has no member named {name}")
+        index = matrix.knn_index()
+        if index.exists():
+            self._remove_object(index)
+            tiledb.remove(index.uri, ctx=self._ctx)
+
+        df = matrix.dim_select(None)
+        index.build(
+            df.index.to_numpy(dtype=object),
+            df.to_numpy(dtype=np.float32),
+            nlist=nlist,
+            niter=niter,
+            quantize=quantize,
+            seed=seed,
+        )
+        self._add_object(index)
+        return index
+
+    # ----------------------------------------------------------------
+    def _add_to_knn_index(self, name: str, ids) -> None:
+        """
+        Adds the rows with the given IDs, just appended to the named member, to its
+        nearest-neighbor index, if it has one.
+        """
+        index = self[name].knn_index()
+        if index.exists():
+            index.add(
+                np.asarray(ids, dtype=object),
+                self[name].to_numpy(ids).astype(np.float32),
+            )
+
     # ----------------------------------------------------------------
     def to_dict_of_csr(self) -> Dict[str, scipy.sparse.csr_matrix]:
         """
@@ -114,15 +198,30 @@ class AnnotationMatrixGroup(TileDBGroup):
         with self._open() as G:
             matrices_in_group = {}
             for element in G:
+                if _is_knn_index_name(element.name):
+                    continue
                 if self._verbose:
                     s2 = util.get_start_stamp()
                     print(f"{self._indent}START  read {element.uri}")
 
-                with tiledb.open(element.uri, ctx=self._ctx) as A:
-                    df = pd.DataFrame(A[:])
-                    df.set_index(self.dim_name, inplace=True)
-                    matrix_name = os.path.basename(element.uri)  # e.g. 'X_pca'
-                    matrices_in_group[matrix_name] = df.to_numpy()
+                matrix_name = os.path.basename(element.uri)  # e.g. 'X_pca'
+                with tiledb.open(
+                    element.uri, ctx=self._ctx, timestamp=self._handle_cache.timestamp
+                ) as A:
+                    uses_dense_layout = not A.schema.sparse
+                    if not uses_dense_layout:
+                        df = pd.DataFrame(A[:])
+                        df.set_index(self.dim_name, inplace=True)
+                        matrices_in_group[matrix_name] = df.to_numpy()
+                if uses_dense_layout:
+                    # Read straight into an ndarray, with rows in the same order as above.
+                    matrices_in_group[matrix_name] = AnnotationMatrix(
+                        uri=element.uri,
+                        name=matrix_name,
+                        dim_name=self.dim_name,
+                        dataframe=self.dataframe,
+                        parent=self,
+                    ).to_numpy()
 
                 if self._verbose:
                     print(
@@ -159,7 +258,7 @@ class AnnotationMatrixGroup(TileDBGroup):
         """
 
         with self._open("r") as G:
-            if not name in G:
+            if not name in G or _is_knn_index_name(name):
                 return None
             obj = G[name]  # This returns a tiledb.object.Object.
             if obj.type == tiledb.tiledb.Group:
@@ -171,7 +270,11 @@ class AnnotationMatrixGroup(TileDBGroup):
                     f"Internal error: found group element neither subgroup nor array: type is {str(obj.type)}"
                 )
             return AnnotationMatrix(
-                uri=obj.uri, name=name, dim_name=self.dim_name, parent=self
+                uri=obj.uri,
+                name=name,
+                dim_name=self.dim_name,
+                dataframe=self.dataframe,
+                parent=self,
             )
 
     def __contains__(self, name):
@@ -179,4 +282,12 @@ class AnnotationMatrixGroup(TileDBGroup):
         Implements the `in` operator, e.g. `"namegoeshere" in soma.obsm/soma.varm`.
         """
         with self._open("r") as G:
-            return name in G
+            return name in G and not _is_knn_index_name(name)
+
+
+# ----------------------------------------------------------------
+def _is_knn_index_name(name: str) -> bool:
+    """
+    Tells whether an obsm/varm member name is that of a nearest-neighbor index rather than a matrix.
+    """
+    return name.endswith(tiledbsc.util_tiledb.KNN_INDEX_NAME_SUFFIX)
@@ -0,0 +1,461 @@
+import tiledb
+import tiledbsc.util as util
+from .tiledb_array import TileDBArray
+from .tiledb_group import TileDBGroup
+
+import numpy as np
+import scipy.sparse
+
+from typing import Any, Dict, Optional, List, Tuple
+import json
+import math
+import os
+
+
+class AnnotationMatrixKNNIndex(TileDBGroup):
+    """
+    Approximate nearest-neighbor index over the rows of an `AnnotationMatrix` -- nominally an
+    embedding such as `soma.obsm["X_pca"]` -- so that "which cells are most like this one" needn't
+    read the whole matrix. Build it with `soma.obsm.build_knn_index("X_pca")`; query it with
+    `soma.obsm["X_pca"].knn(vectors, k)`.
+
+    This is an IVF (inverted-file) index: the rows are clustered by k-means into `nlist` lists, and a
+    query scans only the rows in the `nprobe` lists whose centroids are nearest to it. Distances are
+    Euclidean.
+
+    It is stored as a group beside the matrix within `obsm`/`varm`, named for the matrix with the
+    suffix `__knn_index`, with three arrays:
+
+    * `centroids`: dense, list number by column.
+    * `vectors`: dense, position by column, holding the rows grouped list by list. By default these
+      are quantized to `uint8`, column by column, so distances computed from them are approximate:
+      `knn(..., rerank=True)` re-ranks the best candidates using their exact rows, read from the
+      matrix.
+    * `ids`: dense, by position, holding the `obs_id` (for `obsm`) or `var_id` (for `varm`) of each.
+
+    The offsets of the lists within `vectors` and `ids`, the quantization parameters, and the
+    parameters the index was built with, are kept in the group metadata.
+
+    Rows appended to the matrix later are added with `add`, without re-clustering: each goes in the
+    list of its nearest centroid, in a segment of `vectors` and `ids` after those already written,
+    with its own list offsets.
+    """
+
+    centroids: TileDBArray
+    vectors: TileDBArray
+    ids: TileDBArray
+
+    # ----------------------------------------------------------------
+    def __init__(
+        self,
+        uri: str,
+        name: str,
+        parent: Optional[TileDBGroup] = None,
+    ):
+        """
+        See the TileDBObject constructor.
+        """
+        super().__init__(uri=uri, name=name, parent=parent)
+        self.centroids = TileDBArray(
+            uri=os.path.join(self.uri, "centroids"), name="centroids", parent=self
+        )
+        self.vectors = TileDBArray(
+            uri=os.path.join(self.uri, "vectors"), name="vectors", parent=self
+        )
+        self.ids = TileDBArray(
+            uri=os.path.join(self.uri, "ids"), name="ids", parent=self
+        )
+
+    # ----------------------------------------------------------------
+    def build(
+        self,
+        ids: np.ndarray,
+        matrix: np.ndarray,
+        nlist: Optional[int] = None,
+        niter: int = 20,
+        quantize: bool = True,
+        seed: int = 0,
+    ) -> None:
+        """
+        Builds the index over the rows of `matrix`, which have the given `ids`. The group must not
+        exist yet.
+
+        :param nlist: Number of lists to cluster the rows into: by default, the square root of the
+        number of rows.
+        :param niter: Number of k-means iterations.
+        :param quantize: If true, the rows are stored within the index as `uint8`, a quarter of the
+        size of `float32`. Each column is mapped linearly from its minimum..maximum to 0..255.
+        :param seed: Seed for the k-means initialization and training sample.
+        """
+        (nrow, ncol) = matrix.shape
+        if nrow == 0:
+            raise Exception(f"{self.uri}: cannot index an empty matrix")
+        # As given, so that a rebuild over more rows picks its own default.
+        build_parameters = {
+            "nlist": nlist,
+            "niter": niter,
+            "quantize": quantize,
+            "seed": seed,
+        }
+        if nlist is None:
+            nlist = int(round(math.sqrt(nrow)))
+        nlist = max(1, min(nlist, nrow))
+        matrix = np.asarray(matrix, dtype=np.float32)
+
+        if self._verbose:
+            s = util.get_start_stamp()
+            print(f"{self._indent}START  building {self.uri} with {nlist} lists")
+
+        rng = np.random.default_rng(seed)
+        centroids = _train_kmeans(matrix, nlist, niter, rng)
+        assignments = _get_nearest_centroids(matrix, centroids)
+
+        # The rows are stored list by list, so that each list is read as a single range.
+        permutation = np.argsort(assignments, kind="stable")
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assignments, minlength=nlist))
+
+        vectors = matrix[permutation]
+        if quantize:
+            lo = vectors.min(axis=0)
+            scale = (vectors.max(axis=0) - lo) / 255
+            scale[scale == 0] = 1
+            vectors = _quantize(vectors, lo, scale)
+
+        self._create()
+        self._create_empty_arrays(nrow, ncol, nlist, vectors.dtype)
+        with self.centroids._open("w") as A:
+            A[0:nlist, 0:ncol] = centroids
+        with self.vectors._open("w") as A:
+            A[0:nrow, 0:ncol] = vectors
+        with self.ids._open("w") as A:
+            A[0:nrow] = np.asarray(ids, dtype=object)[permutation]
+        with self._open("w") as G:
+            G.meta["offsets"] = json.dumps(offsets.tolist())
+            G.meta["build_parameters"] = json.dumps(build_parameters)
+            if quantize:
+                G.meta["quantization"] = json.dumps(
+                    {"lo": lo.tolist(), "scale": scale.tolist()}
+                )
+        self._add_objects([self.centroids, self.vectors, self.ids])
+
+        if self._verbose:
+            print(util.format_elapsed(s, f"{self._indent}FINISH building {self.uri}"))
+
+    # ----------------------------------------------------------------
+    def add(self, ids: np.ndarray, matrix: np.ndarray) -> None:
+        """
+        Adds rows, with the given `ids`, to the index: nominally rows just appended to the matrix.
+        Each goes in the list of its nearest centroid, quantized as the rows the index was built
+        with were. Only the centroids are read, and nothing stored is rewritten. The clustering isn't
+        redone, though: after many additions, or additions unlike the rows the index was built with,
+        rebuild it with `build_knn_index`, e.g. with `build_parameters()`, for the best recall.
+        """
+        matrix = np.asarray(matrix, dtype=np.float32)
+        nrow = len(matrix)
+        if nrow == 0:
+            return
+        ncol = matrix.shape[1]
+
+        if self._verbose:
+            s = util.get_start_stamp()
+            print(f"{self._indent}START  adding {nrow} rows to {self.uri}")
+
+        with self._open() as G:
+            offsets = self._get_offsets(G)
+            appended_offsets = json.loads(G.meta.get("appended_offsets") or "[]")
+            quantization = G.meta.get("quantization")
+        with self.centroids._open() as A:
+            centroids = A[:]["centroid"]
+        nlist = len(centroids)
+
+        # As in `build`, within a segment following those already written.
+        assignments = _get_nearest_centroids(matrix, centroids)
+        permutation = np.argsort(assignments, kind="stable")
+        start = int(offsets[-1, -1])
+        segment_offsets = np.full(nlist + 1, start, dtype=np.int64)
+        segment_offsets[1:] += np.cumsum(np.bincount(assignments, minlength=nlist))
+
+        vectors = matrix[permutation]
+        if quantization is not None:
+            quantization = json.loads(quantization)
+            vectors = _quantize(
+                vectors,
+                np.asarray(quantization["lo"], dtype=np.float32),
+                np.asarray(quantization["scale"], dtype=np.float32),
+            )
+
+        with self.vectors._open("w") as A:
+            A[start : start + nrow, 0:ncol] = vectors
+        with self.ids._open("w") as A:
+            A[start : start + nrow] = np.asarray(ids, dtype=object)[permutation]
+        with self._open("w") as G:
+            G.meta["appended_offsets"] = json.dumps(
+                appended_offsets + [segment_offsets.tolist()]
+            )
+
+        if self._verbose:
+            print(
+                util.format_elapsed(
+                    s, f"{self._indent}FINISH adding {nrow} rows to {self.uri}"
+                )
+            )
+
+    # ----------------------------------------------------------------
+    def _get_offsets(self, G) -> np.ndarray:
+        """
+        Returns the list offsets of each segment of the index, given the open group: a row for the
+        rows it was built with, then one for those of each `add`.
+        """
+        offsets = [json.loads(G.meta["offsets"])]
+        offsets += json.loads(G.meta.get("appended_offsets") or "[]")
+        return np.asarray(offsets, dtype=np.int64)
+
+    # ----------------------------------------------------------------
+    def build_parameters(self) -> Dict[str, Any]:
+        """
+        Returns the keyword arguments the index was built with, as for rebuilding it after rows are
+        added to it.
+        """
+        with self._open() as G:
+            return json.loads(G.meta["build_parameters"])
+
+    # ----------------------------------------------------------------
+    def search(
+        self, vectors: np.ndarray, k: int, nprobe: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the IDs of the approximate `k` nearest rows to each of `vectors`, and their
+        distances as computed from the stored rows, as two arrays with a row per vector, nearest
+        first. Where fewer than `k` rows are found in the `nprobe` lists scanned, the remainder are
+        `None` with distance `inf`.
+        """
+        if not self.exists():
+            raise Exception(
+                f"{self.uri} does not exist: use build_knn_index to create it"
+            )
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._open() as G:
+            offsets = self._get_offsets(G)
+            quantization = G.meta.get("quantization")
+        with self.centroids._open() as A:
+            centroids = A[:]["centroid"]
+        nlist = len(centroids)
+        nprobe = min(nprobe, nlist)
+
+        # The lists each vector probes, then all of those, read at once.
+        probes = _get_nearest_centroids(vectors, centroids, nprobe).reshape(
+            len(vectors), nprobe
+        )
+        list_vectors, list_ids, list_positions = self._read_lists(
+            np.unique(probes), offsets
+        )
+        if quantization is None:
+            list_vectors = list_vectors.astype(np.float32, copy=False)
+        else:
+            quantization = json.loads(quantization)
+            lo = np.asarray(quantization["lo"], dtype=np.float32)
+            scale = np.asarray(quantization["scale"], dtype=np.float32)
+            list_vectors = lo + list_vectors.astype(np.float32) * scale
+
+        nvec = len(vectors)
+        result_ids = np.full((nvec, k), None, dtype=object)
+        result_distances = np.full((nvec, k), np.inf, dtype=np.float32)
+        for i in range(nvec):
+            positions = [list_positions[l] for l in probes[i] if l in list_positions]
+            if len(positions) == 0:
+                continue
+            positions = np.concatenate(positions)
+            candidates = list_vectors[positions]
+            distances = ((candidates - vectors[i]) ** 2).sum(axis=1)
+            best = _argsort_smallest(distances, k)
+            result_ids[i, : len(best)] = list_ids[positions[best]]
+            result_distances[i, : len(best)] = np.sqrt(distances[best])
+        return (result_ids, result_distances)
+
+    # ----------------------------------------------------------------
+    def _read_lists(self, list_numbers: List[int], offsets: np.ndarray):
+        """
+        Reads the stored rows and IDs of the given lists, from every segment of the index. Returns
+        them along with a dict from list number to the positions of the list's rows within them.
+        """
+        # The position ranges to read, in storage order, each with the list it is of.
+        pieces = sorted(
+            (int(segment[l]), int(segment[l + 1]), l)
+            for segment in offsets
+            for l in list_numbers
+            if segment[l + 1] > segment[l]
+        )
+        list_positions: Dict[int, List[np.ndarray]] = {}
+        ranges = []
+        nread = 0
+        for lo, hi, l in pieces:
+            list_positions.setdefault(l, []).append(np.arange(nread, nread + hi - lo))
+            nread += hi - lo
+            # Adjacent lists are read as one range.
+            if len(ranges) > 0 and ranges[-1][1] + 1 == lo:
+                ranges[-1] = (ranges[-1][0], hi - 1)
+            else:
+                ranges.append((lo, hi - 1))
+        if len(ranges) == 0:
+            return (np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=object), {})
+
+        slices = [slice(lo, hi) for lo, hi in ranges]
+        with self.vectors._open() as A:
+            list_vectors = A.multi_index[slices, :]["vector"]
+        with self.ids._open() as A:
+            list_ids = util._decode_utf8(A.multi_index[slices]["id"])
+        return (
+            list_vectors,
+            list_ids,
+            {l: np.concatenate(positions) for l, positions in list_positions.items()},
+        )
+
+    # ----------------------------------------------------------------
+    def _create_empty_arrays(self, nrow: int, ncol: int, nlist: int, vector_dtype):
+        """
+        Creates the TileDB arrays for the index.
+        """
+        row_extent = min(nrow, 4096)
+        # Positions go past the rows there are now, for those added later.
+        max_position = np.iinfo(np.int64).max - row_extent
+
+        def column_dim():
+            return tiledb.Dim(
+                name="column", domain=(0, ncol - 1), tile=ncol, dtype=np.int64
+            )
+
+        for array, dims, attr in [
+            (
+                self.centroids,
+                [
+                    tiledb.Dim(
+                        name="list", domain=(0, nlist - 1), tile=nlist, dtype=np.int64
+                    ),
+                    column_dim(),
+                ],
+                tiledb.Attr("centroid", dtype=np.float32, ctx=self._ctx),
+            ),
+            (
+                self.vectors,
+                [
+                    tiledb.Dim(
+                        name="position",
+                        domain=(0, max_position),
+                        tile=row_extent,
+                        dtype=np.int64,
+                    ),
+                    column_dim(),
+                ],
+                tiledb.Attr(
+                    "vector",
+                    dtype=vector_dtype,
+                    filters=[tiledb.ZstdFilter()],
+                    ctx=self._ctx,
+                ),
+            ),
+            (
+                self.ids,
+                [
+                    tiledb.Dim(
+                        name="position",
+                        domain=(0, max_position),
+                        tile=row_extent,
+                        dtype=np.int64,
+                    )
+                ],
+                tiledb.Attr(
+                    "id",
+                    dtype="ascii",
+                    var=True,
+                    filters=[tiledb.ZstdFilter()],
+                    ctx=self._ctx,
+                ),
+            ),
+        ]:
+            sch = tiledb.ArraySchema(
+                domain=tiledb.Domain(*dims, ctx=self._ctx),
+                attrs=(attr,),
+                sparse=False,
+                cell_order="row-major",
+                tile_order="row-major",
+                ctx=self._ctx,
+            )
+            tiledb.Array.create(array.uri, sch, ctx=self._ctx)
+            array._set_soma_object_type_metadata()
+
+
+# ----------------------------------------------------------------
+def _get_nearest_centroids(
+    vectors: np.ndarray, centroids: np.ndarray, n: int = 1
+) -> np.ndarray:
+    """
+    Returns the index of the nearest of `centroids` to each of `vectors` -- or, if `n` is more than
+    one, a row of the `n` nearest, nearest first. This is done in batches of vectors, to bound the
+    size of the distance matrix.
+    """
+    nvec = len(vectors)
+    centroid_norms = (centroids.astype(np.float32) ** 2).sum(axis=1)
+    retval = np.zeros((nvec, n), dtype=np.int64)
+    batch_size = max(1, (1 << 22) // max(1, len(centroids)))
+    for i in range(0, nvec, batch_size):
+        i2 = min(i + batch_size, nvec)
+        # Squared distances, less the squared norm of each vector, which doesn't affect the order.
+        distances = centroid_norms - 2 * (vectors[i:i2] @ centroids.T)
+        if n == 1:
+            retval[i:i2, 0] = distances.argmin(axis=1)
+        else:
+            for j, row in enumerate(distances):
+                retval[i + j] = _argsort_smallest(row, n)
+    return retval[:, 0] if n == 1 else retval
+
+
+# ----------------------------------------------------------------
+def _quantize(vectors: np.ndarray, lo: np.ndarray, scale: np.ndarray) -> np.ndarray:
+    """
+    Maps each column of `vectors` linearly from `lo` to `lo + 255 * scale` onto `uint8`. Values
+    outside that range, as in rows added after the index was built, are clipped.
+    """
+    return np.rint((vectors - lo) / scale).clip(0, 255).astype(np.uint8)
+
+
+# ----------------------------------------------------------------
+def _argsort_smallest(values: np.ndarray, n: int) -> np.ndarray:
+    """
+    Returns the indices of the `n` smallest of `values`, smallest first, without sorting all of
+    them.
+    """
+    if n < len(values):
+        indices = np.argpartition(values, n - 1)[:n]
+    else:
+        indices = np.arange(len(values))
+    return indices[np.argsort(values[indices], kind="stable")]
+
+
+# ----------------------------------------------------------------
+def _train_kmeans(
+    matrix: np.ndarray, nlist: int, niter: int, rng: np.random.Generator
+) -> np.ndarray:
+    """
+    Returns `nlist` k-means centroids for the rows of `matrix`, by Lloyd's algorithm on a sample of
+    up to 256 rows per list. Centroids whose clusters empty out are restarted at a random row.
+    """
+    nrow = len(matrix)
+    nsample = min(nrow, 256 * nlist)
+    sample = matrix[np.sort(rng.choice(nrow, nsample, replace=False))]
+    centroids = sample[rng.choice(nsample, nlist, replace=False)].copy()
+    for _ in range(niter):
+        assignments = _get_nearest_centroids(sample, centroids)
+        # The per-cluster sums of rows, as a sparse one-hot product.
+        one_hot = scipy.sparse.csr_matrix(
+            (np.ones(nsample, dtype=np.float32), (assignments, np.arange(nsample))),
+            shape=(nlist, nsample),
+        )
+        counts = np.bincount(assignments, minlength=nlist)
+        nonempty = counts > 0
+        sums = one_hot @ sample
+        centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+        nempty = nlist - np.count_nonzero(nonempty)
+        if nempty > 0:
+            centroids[~nonempty] = sample[rng.choice(nsample, nempty, replace=False)]
+    return centroids
@@ -101,24 +101,35 @@ class AnnotationPairwiseMatrixGroup(TileDBGroup):
         # Must be done first, to create the parent directory
         self._create()
         for matrix_name in annotation_pairwise_matrices.keys():
-            anndata_matrix = annotation_pairwise_matrices[matrix_name]
-            matrix_uri = os.path.join(self.uri, matrix_name)
-            annotation_pairwise_matrix = AssayMatrix(
-                uri=matrix_uri,
-                name=matrix_name,
-                row_dim_name=self.row_dim_name,
-                col_dim_name=self.col_dim_name,
-                row_dataframe=self.row_dataframe,
-                col_dataframe=self.col_dataframe,
-                parent=self,
-            )
-            annotation_pairwise_matrix.from_matrix_and_dim_values(
-                anndata_matrix,
-                dim_values,
-                dim_values,
+            annotation_pairwise_matrix = self._write_matrix(
+                matrix_name, annotation_pairwise_matrices[matrix_name], dim_values
             )
             self._add_object(annotation_pairwise_matrix)
 
+    # ----------------------------------------------------------------
+    def _write_matrix(
+        self, matrix_name: str, anndata_matrix, dim_values
+    ) -> AssayMatrix:
+        """
+        Writes one member array of the group, without adding it to the group: see
+        `from_matrices_and_dim_values`. The group must already exist.
+        """
+        annotation_pairwise_matrix = AssayMatrix(
+            uri=os.path.join(self.uri, matrix_name),
+            name=matrix_name,
+            row_dim_name=self.row_dim_name,
+            col_dim_name=self.col_dim_name,
+            row_dataframe=self.row_dataframe,
+            col_dataframe=self.col_dataframe,
+            parent=self,
+        )
+        annotation_pairwise_matrix.from_matrix_and_dim_values(
+            anndata_matrix,
+            dim_values,
+            dim_values,
+        )
+        return annotation_pairwise_matrix
+
     # ----------------------------------------------------------------
     def to_dict_of_csr(
         self, obs_df_index, var_df_index
@@ -130,7 +141,7 @@ class AnnotationPairwiseMatrixGroup(TileDBGroup):
 
         grp = None
         try:  # Not all groups have all four of obsm, obsp, varm, and varp.
-            grp = tiledb.Group(self.uri, mode="r", ctx=self._ctx)
+            grp = self._open("r")
         except:
             pass
         if grp == None:
@@ -0,0 +1,172 @@
+import tiledb
+import tiledbsc.util_tiledb
+from .tiledb_array import TileDBArray
+from .tiledb_group import TileDBGroup
+from .annotation_dataframe import AnnotationDataFrame
+
+import numpy as np
+import pandas as pd
+
+from typing import Optional, List
+
+
+class AnnotationValueIndex(TileDBArray):
+    """
+    Collection-level inverted index over the `obs` or `var` dataframes of the SOMAs in a
+    `SOMACollection`: for each string-valued column, and each value in it, which SOMAs have that
+    value, and in how many rows. For `var` the `var_id`s are indexed as well, under the column name
+    `var_id`. This lets questions like "which SOMAs have cell_type B cell" or "which SOMAs have gene
+    MT-CO3" be answered by a lookup rather than by reading every SOMA's dataframe.
+
+    This is stored as a sparse array with dimensions `column` and `value`, and attributes
+    `soma_name` and `count`, within the collection's group. It is kept up to date by
+    `SOMACollection.add` and `SOMACollection.remove`.
+    """
+
+    which: str
+
+    # ----------------------------------------------------------------
+    def __init__(
+        self,
+        uri: str,
+        name: str,
+        parent: Optional[TileDBGroup] = None,
+    ):
+        """
+        See the TileDBObject constructor.
+        """
+        assert name in ["obs_value_index", "var_value_index"]
+        super().__init__(uri=uri, name=name, parent=parent)
+        self.which = name[:3]
+
+    # ----------------------------------------------------------------
+    def lookup(self, column: str, values: Optional[List] = None) -> pd.DataFrame:
+        """
+        Returns a dataframe with columns `value`, `soma_name`, and `count`, having a row for each
+        SOMA having each of the `values` in the given column -- or each value, if `values` is
+        `None`. The count is the number of rows in the SOMA's `obs` or `var` having that value.
+        """
+        if not self.exists():
+            raise Exception(
+                f"{self.uri} does not exist: use SOMACollection.rebuild_value_indices() to create it"
+            )
+        with self._open() as A:
+            if values is None:
+                df = A.df[column, :]
+            else:
+                df = A.df[column, [str(value) for value in values]]
+        df = df.drop(columns=["column"])
+        for k in ["value", "soma_name"]:
+            df[k] = df[k].map(lambda e: e.decode() if isinstance(e, bytes) else e)
+        return df.sort_values(["value", "soma_name"]).reset_index(drop=True)
+
+    # ----------------------------------------------------------------
+    def add_soma(self, soma_name: str, dataframe: AnnotationDataFrame) -> None:
+        """
+        Indexes the SOMA's `obs` or `var`, replacing any entries already present for the SOMA
+        name.
+        """
+        if not self.exists():
+            self._create_empty_array()
+        else:
+            self.remove_soma(soma_name)
+        if not dataframe.exists():
+            return
+
+        # Dictionary-encoded columns are read back as categoricals of strings.
+        encoded_attr_names = dataframe.categories()
+        string_attr_names = [
+            attr_name
+            for attr_name, dtype in dataframe.attr_names_to_types().items()
+            if dtype.kind in ("S", "U") or attr_name in encoded_attr_names
+        ]
+        if self.which == "obs" and len(string_attr_names) == 0:
+            return
+        df = dataframe._filter_select(None, string_attr_names)
+
+        columns = []
+        values = []
+        counts = []
+        if self.which == "var":
+            columns.append(np.full(len(df), dataframe.dim_name, dtype=object))
+            values.append(np.asarray(df.index, dtype=object))
+            counts.append(np.ones(len(df), dtype=np.int64))
+        for attr_name in string_attr_names:
+            value_counts = df[attr_name].value_counts()
+            # Categoricals count their unused categories too.
+            value_counts = value_counts[value_counts > 0]
+            columns.append(np.full(len(value_counts), attr_name, dtype=object))
+            values.append(np.asarray(value_counts.index, dtype=object))
+            counts.append(value_counts.to_numpy(dtype=np.int64))
+
+        columns = np.concatenate(columns)
+        if len(columns) == 0:
+            return
+        with self._open("w") as A:
+            A[columns, np.concatenate(values)] = {
+                "soma_name": np.full(len(columns), soma_name, dtype=object),
+                "count": np.concatenate(counts),
+            }
+
+    # ----------------------------------------------------------------
+    def remove_soma(self, soma_name: str) -> None:
+        """
+        Drops the entries for the SOMA name, if any.
+        """
+        if not self.exists():
+            return
+        kwargs = tiledbsc.util_tiledb._query_condition_kwargs(
+            f"soma_name == {soma_name!r}"
+        )
+        with self._open("d") as A:
+            A.query(**kwargs).submit()
+
+    # ----------------------------------------------------------------
+    def _create_empty_array(self) -> None:
+        """
+        Creates the TileDB storage for the index.
+        """
+        level = self._soma_options.string_dim_zstd_level
+        dom = tiledb.Domain(
+            tiledb.Dim(
+                name="column",
+                domain=(None, None),
+                dtype="ascii",
+                filters=[tiledb.RleFilter()],
+            ),
+            tiledb.Dim(
+                name="value",
+                domain=(None, None),
+                dtype="ascii",
+                filters=[tiledb.ZstdFilter(level=level)],
+            ),
+            ctx=self._ctx,
+        )
+        att_soma_name = tiledb.Attr(
+            "soma_name",
+            dtype="ascii",
+            var=True,
+            filters=[tiledb.ZstdFilter(level=level)],
+            ctx=self._ctx,
+        )
+        att_count = tiledb.Attr(
+            "count",
+            dtype=np.int64,
+            filters=[tiledb.ZstdFilter()],
+            ctx=self._ctx,
+        )
+        # Duplicates since each (column, value) is stored once per SOMA having it.
+        sch = tiledb.ArraySchema(
+            domain=dom,
+            attrs=(att_soma_name, att_count),
+            sparse=True,
+            allows_duplicates=True,
+            offsets_filters=[
+                tiledb.DoubleDeltaFilter(),
+                tiledb.BitWidthReductionFilter(),
+                tiledb.ZstdFilter(),
+            ],
+            ctx=self._ctx,
+        )
+        tiledb.Array.create(self.uri, sch, ctx=self._ctx)
+        self._set_soma_object_type_metadata()
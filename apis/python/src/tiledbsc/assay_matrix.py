@@ -5,19 +5,21 @@ from .tiledb_group import TileDBGroup
 from .tiledb_object import TileDBObject
 from .annotation_dataframe import AnnotationDataFrame
 import tiledbsc.util as util
+import tiledbsc.util_tiledb
 
 import scipy
 import numpy as np
 import pandas as pd
 
-from typing import Optional
+from typing import Optional, Iterator, Tuple
 import time
 import math
 
 
 class AssayMatrix(TileDBArray):
     """
-    Wraps a TileDB sparse array with two string dimensions.
+    Wraps a TileDB sparse array with two string dimensions -- or, with
+    `SOMAOptions(X_dim_layout="joinid")`, two int64 dimensions keyed by obs/var joinids.
     Used for `X`, `raw.X`, `obsp` elements, and `varp` elements.
     """
 
@@ -64,20 +66,57 @@ class AssayMatrix(TileDBArray):
         self.col_dataframe = col_dataframe
 
     # ----------------------------------------------------------------
-    def shape(self):
+    def shape(self, verify: bool = False):
         """
         Returns a tuple with the number of rows and number of columns of the `AssayMatrix`.
         In TileDB storage, these are string-indexed sparse arrays for which no `.shape()` exists,
         but, we draw from the appropriate `obs`, `var`, `raw/var`, etc. as appropriate for a given matrix.
 
-        Note: currently implemented via data scan -- will be optimized for TileDB core 2.10.
+        These are metadata reads; see `AnnotationDataFrame.shape` for the meaning of `verify`.
         """
-        with self._open() as A:
-            # These TileDB arrays are string-dimensioned sparse arrays so there is no '.shape'.
-            # Instead we compute it ourselves.  See also:
-            num_rows = self.row_dataframe.shape()[0]
-            num_cols = self.col_dataframe.shape()[0]
-            return (num_rows, num_cols)
+        num_rows = self.row_dataframe.shape(verify)[0]
+        num_cols = self.col_dataframe.shape(verify)[0]
+        return (num_rows, num_cols)
+
+    # ----------------------------------------------------------------
+    def nnz(self, verify: bool = False) -> int:
+        """
+        Returns the number of cells stored in the matrix.
+
+        This is read from array metadata, which is written at ingest time. Arrays written before
+        that was done fall back to counting the cells. If `verify` is true, the cells are counted,
+        and an exception is raised if the metadata disagrees.
+        """
+        with self._open("r") as A:
+            nnz = A.meta.get(tiledbsc.util_tiledb.SOMA_NNZ_METADATA_KEY)
+        if nnz is None or verify:
+            scanned_nnz = self._get_nnz_by_scan()
+            if nnz is not None and nnz != scanned_nnz:
+                raise Exception(
+                    f"{self.uri}: nnz metadata {nnz} does not match nnz {scanned_nnz}"
+                )
+            nnz = scanned_nnz
+        return nnz
+
+    # ----------------------------------------------------------------
+    def _get_nnz_by_scan(self) -> int:
+        """
+        Counts the cells stored in the matrix, reading only the row coordinates, in pieces.
+        """
+        # The cell count is exact for a single fragment, as for obs/var in AnnotationDataFrame.
+        if not self.uri.startswith("tiledb://"):
+            fragment_info = tiledb.array_fragments(self.uri, ctx=self._ctx)
+            if len(fragment_info) == 1:
+                return sum(fragment_info.cell_num)
+        if self._uses_arrow_reader():
+            tables = self._iter_arrow_tables([self.row_dim_name], {})
+            return sum(table.num_rows for table in tables)
+        nnz = 0
+        with self._open_for_read(self._get_batched_read_ctx()) as A:
+            query = A.query(attrs=[], dims=[self.row_dim_name], return_incomplete=True)
+            for piece in query.df[:, :]:
+                nnz += len(piece)
+        return nnz
 
     # ----------------------------------------------------------------
     def dim_select(self, obs_ids, var_ids) -> pd.DataFrame:
@@ -86,7 +125,23 @@ class AssayMatrix(TileDBArray):
         Either or both of the ID lists may be `None`, meaning, do not subselect along
         that dimension. If both ID lists are `None`, the entire matrix is returned.
         """
-        with tiledb.open(self.uri, ctx=self._ctx) as A:
+        if self._uses_joinid_dims():
+            return self._dim_select_joinids(obs_ids, var_ids)
+
+        if self._uses_arrow_reader():
+            points = {}
+            if obs_ids is not None:
+                points[self.row_dim_name] = obs_ids
+            if var_ids is not None:
+                points[self.col_dim_name] = var_ids
+            table = self._read_arrow_table(
+                [self.row_dim_name, self.col_dim_name, self.attr_name], points
+            )
+            df = table.to_pandas()
+            df.set_index([self.row_dim_name, self.col_dim_name], inplace=True)
+            return df
+
+        with self._open() as A:
             if obs_ids is None:
                 if var_ids is None:
                     df = A.df[:, :]
@@ -100,6 +155,137 @@ class AssayMatrix(TileDBArray):
         df.set_index([self.row_dim_name, self.col_dim_name], inplace=True)
         return df
 
+    # ----------------------------------------------------------------
+    def _dim_select_joinids(self, obs_ids, var_ids) -> pd.DataFrame:
+        """
+        Implements `dim_select` for the joinid layout. The stored joinids are mapped back to
+        `obs_id`/`var_id` labels, so the result is the same as for the string layout.
+        """
+        obs_ids, obs_keys, obs_query = self._get_ids_keys_and_query(
+            self.row_dataframe, obs_ids, True
+        )
+        var_ids, var_keys, var_query = self._get_ids_keys_and_query(
+            self.col_dataframe, var_ids, True
+        )
+        with self._open() as A:
+            df = A.df[obs_query, var_query]
+        df[self.row_dim_name] = obs_ids[
+            util._labels_to_indices(df[self.row_dim_name].to_numpy(), obs_keys)
+        ]
+        df[self.col_dim_name] = var_ids[
+            util._labels_to_indices(df[self.col_dim_name].to_numpy(), var_keys)
+        ]
+        df.set_index([self.row_dim_name, self.col_dim_name], inplace=True)
+        return df
+
+    # ----------------------------------------------------------------
+    def row_filter_select(self, query_string: str) -> Optional[pd.DataFrame]:
+        """
+        Selects the rows of the matrix whose row annotations -- `obs`, for `X` -- satisfy a
+        TileDB-Py `QueryCondition` string such as `cell_type == "blood"`. The result is as for
+        `dim_select` with those rows' IDs, or None if no rows match.
+
+        With `SOMAOptions(read_via_libtiledbsc=True)`, conditions which are comparisons joined by
+        `and` run as a single libtiledbsc `IJQuery`: the annotation filter feeds the matrix read
+        directly, with no dataframe or ID list made in Python in between.
+        """
+        triples = None
+        if self._uses_arrow_reader():
+            triples = tiledbsc.util_tiledb._query_string_to_triples(
+                self.row_dataframe._encode_query_string(query_string)
+            )
+        if triples is not None:
+            df = self._row_filter_select_native(triples)
+            return None if len(df) == 0 else df
+
+        row_df = self.row_dataframe.attribute_filter(query_string, [])
+        if row_df is None:
+            return None
+        return self.dim_select(list(row_df.index), None)
+
+    # ----------------------------------------------------------------
+    def _row_filter_select_native(self, triples) -> pd.DataFrame:
+        """
+        Implements `row_filter_select` using libtiledbsc's `IJQuery`.
+        """
+        uses_joinids = self._uses_joinid_dims()
+        if uses_joinids:
+            ref_attr = tiledbsc.util_tiledb.SOMA_JOINID_ATTR_NAME
+        else:
+            ref_attr = self.row_dataframe.dim_name
+        ijq = tiledbsc.util_tiledb.pytiledbsc.IJQuery(
+            self.row_dataframe.uri,
+            self.row_dataframe.dim_name,
+            ref_attr,
+            self.uri,
+            self.row_dim_name,
+            **self._libtiledbsc_kwargs(),
+        )
+        table = ijq.select_from_condition(triples).to_arrow()
+        df = table.select(
+            [self.row_dim_name, self.col_dim_name, self.attr_name]
+        ).to_pandas()
+
+        if uses_joinids:
+            for dataframe, dim_name in [
+                (self.row_dataframe, self.row_dim_name),
+                (self.col_dataframe, self.col_dim_name),
+            ]:
+                ids, keys, _ = self._get_ids_keys_and_query(dataframe, None, True)
+                df[dim_name] = ids[
+                    util._labels_to_indices(df[dim_name].to_numpy(), keys)
+                ]
+
+        df.set_index([self.row_dim_name, self.col_dim_name], inplace=True)
+        return df
+
+    # ----------------------------------------------------------------
+    def _uses_joinid_dims(self) -> bool:
+        """
+        Tells whether the array has int64 dimensions keyed by obs/var joinids, rather than string
+        dimensions keyed by obs/var IDs. See `SOMAOptions.X_dim_layout`.
+        """
+        return self.dim_names_to_types()[self.row_dim_name] == np.int64
+
+    # ----------------------------------------------------------------
+    def _get_ids_keys_and_query(
+        self, dataframe: AnnotationDataFrame, ids, uses_joinids: bool
+    ):
+        """
+        Helper for reads along one dimension, for either storage layout. Returns a tuple of:
+
+        * The IDs to read, as a NumPy array -- all of them if `ids` is `None`. IDs not in `obs`/`var`
+          are read as empty rows or columns, whichever the layout.
+        * The keys those IDs are stored under in this array: the IDs themselves for string
+          dimensions, or their joinids for joinid dimensions.
+        * A TileDB-Py query index for them.
+        """
+        if uses_joinids:
+            all_ids, all_joinids = dataframe.ids_and_joinids()
+            if ids is None:
+                order = np.argsort(all_joinids)
+                return (all_ids[order], all_joinids[order], slice(None))
+            ids = np.asarray(ids, dtype=object)
+            positions = pd.Index(all_ids).get_indexer(ids)
+            keys = all_joinids[positions]
+            # IDs not in obs/var read as empty rows or columns, as for string dimensions. Their keys
+            # are distinct joinids past the largest assigned one, under which nothing is stored.
+            is_unknown = positions < 0
+            if is_unknown.any():
+                next_joinid = int(all_joinids.max()) + 1 if len(all_joinids) > 0 else 0
+                keys[is_unknown] = np.arange(
+                    next_joinid,
+                    next_joinid + np.count_nonzero(is_unknown),
+                    dtype=np.int64,
+                )
+            return (ids, keys, list(keys))
+        else:
+            if ids is None:
+                ids = np.asarray(dataframe.ids(), dtype=object)
+                return (ids, ids, slice(None))
+            ids = np.asarray(ids, dtype=object)
+            return (ids, ids, list(ids))
+
     # ----------------------------------------------------------------
     def df(self, obs_ids=None, var_ids=None) -> pd.DataFrame:
         """
@@ -126,21 +312,120 @@ class AssayMatrix(TileDBArray):
         Helper method for `csr` and `csc`.
         """
         assert which in ("csr", "csc")
-        df = self.dim_select(obs_ids, var_ids)
-        if obs_ids is None:
-            obs_ids = self.row_dataframe.ids()
-        if var_ids is None:
-            var_ids = self.col_dataframe.ids()
+        uses_joinids = self._uses_joinid_dims()
+        obs_ids, obs_keys, obs_query = self._get_ids_keys_and_query(
+            self.row_dataframe, obs_ids, uses_joinids
+        )
+        var_ids, var_keys, var_query = self._get_ids_keys_and_query(
+            self.col_dataframe, var_ids, uses_joinids
+        )
+        with self._open() as A:
+            df = A.query(attrs=[self.attr_name]).df[obs_query, var_query]
+        # For the joinid layout, this is an integer join from stored coordinates to matrix
+        # indices, with no string labels involved.
         return util.X_and_ids_to_sparse_matrix(
             df,
             self.row_dim_name,
             self.col_dim_name,
             self.attr_name,
-            obs_ids,
-            var_ids,
+            obs_keys,
+            var_keys,
             which,
         )
 
+    # ----------------------------------------------------------------
+    def iter_csr(
+        self,
+        batch_obs: Optional[int] = None,
+        obs_ids=None,
+        var_ids=None,
+    ) -> Iterator[Tuple[np.ndarray, scipy.sparse.csr_matrix]]:
+        """
+        Streams the matrix in row-batches, for callers which cannot (or need not) hold all of it in
+        memory at once. Yields `(batch_obs_ids, batch_csr)` pairs: the CSR block has one row per
+        label in `batch_obs_ids`, in that order, and one column per label in `var_ids`.
+
+        :param batch_obs: Number of rows per batch. Defaults to `SOMAOptions.X_read_batch_obs`.
+        :param obs_ids: Row labels to read. If `None`, all rows are read, in storage order (sorted
+        by obs_id, or by joinid for the joinid layout), each batch being queried as a contiguous
+        range.
+        :param var_ids: Column labels to read. If `None`, all columns are read, in storage order.
+
+        Within a batch, TileDB results are taken in pieces via TileDB-Py incomplete-query handling,
+        with buffer size `SOMAOptions.X_read_buffer_bytes`: each piece is converted to integer
+        coordinates as it arrives, so string labels for the entire batch are never held at once.
+        """
+        if batch_obs is None:
+            batch_obs = self._soma_options.X_read_batch_obs
+        assert batch_obs > 0
+
+        uses_joinids = self._uses_joinid_dims()
+        query_obs_as_ranges = obs_ids is None
+        obs_ids, obs_keys, _ = self._get_ids_keys_and_query(
+            self.row_dataframe, obs_ids, uses_joinids
+        )
+        var_ids, var_keys, var_query = self._get_ids_keys_and_query(
+            self.col_dataframe, var_ids, uses_joinids
+        )
+
+        ctx = self._get_batched_read_ctx()
+        with self._open_for_read(ctx) as A:
+            value_dtype = A.schema.attr(self.attr_name).dtype
+            query = A.query(attrs=[self.attr_name], return_incomplete=True)
+
+            for i in range(0, len(obs_ids), batch_obs):
+                batch_obs_ids = obs_ids[i : i + batch_obs]
+                batch_obs_keys = obs_keys[i : i + batch_obs]
+                if query_obs_as_ranges:
+                    # Ranges are doubly inclusive for TileDB-Py multi-index queries.
+                    obs_query = slice(batch_obs_keys[0], batch_obs_keys[-1])
+                else:
+                    obs_query = list(batch_obs_keys)
+
+                rows = []
+                cols = []
+                values = []
+                for piece in query.df[obs_query, var_query]:
+                    rows.append(
+                        util._dim_values_to_indices(
+                            piece, self.row_dim_name, batch_obs_keys
+                        )
+                    )
+                    cols.append(
+                        util._dim_values_to_indices(piece, self.col_dim_name, var_keys)
+                    )
+                    values.append(piece[self.attr_name].to_numpy())
+
+                if len(values) == 0:
+                    rows = [np.zeros(0, dtype=np.int32)]
+                    cols = [np.zeros(0, dtype=np.int32)]
+                    values = [np.zeros(0, dtype=value_dtype)]
+
+                batch_csr = scipy.sparse.coo_matrix(
+                    (
+                        np.concatenate(values),
+                        (np.concatenate(rows), np.concatenate(cols)),
+                    ),
+                    shape=(len(batch_obs_ids), len(var_ids)),
+                ).tocsr()
+                yield (batch_obs_ids, batch_csr)
+
+    # ----------------------------------------------------------------
+    def _get_batched_read_ctx(self) -> Optional[tiledb.Ctx]:
+        """
+        Returns a TileDB context for `iter_csr`: the one we were constructed with, but with
+        `SOMAOptions.X_read_buffer_bytes` applied if that is set.
+        """
+        buffer_bytes = self._soma_options.X_read_buffer_bytes
+        if buffer_bytes is None:
+            return self._ctx
+        if self._ctx is None:
+            config = tiledb.Config()
+        else:
+            config = tiledb.Config(self._ctx.config().dict())
+        config["py.init_buffer_bytes"] = str(buffer_bytes)
+        return tiledb.Ctx(config)
+
     # ----------------------------------------------------------------
     def from_matrix_and_dim_values(self, matrix, row_names, col_names) -> None:
         """
@@ -167,40 +452,101 @@ class AssayMatrix(TileDBArray):
         if isinstance(col_names, list):
             col_names = np.asarray(col_names)
 
-        if self.exists():
+        is_new_array = not self.exists()
+        if not is_new_array:
             if self._verbose:
                 print(f"{self._indent}Re-using existing array {self.uri}")
+            uses_joinids = self._uses_joinid_dims()
         else:
-            self._create_empty_array(matrix_dtype=matrix.dtype)
+            uses_joinids = self._soma_options.X_dim_layout == "joinid"
+            self._create_empty_array(
+                matrix_dtype=matrix.dtype, uses_joinids=uses_joinids
+            )
 
         self._set_soma_object_type_metadata()
 
-        self._ingest_data(matrix, row_names, col_names)
+        if uses_joinids:
+            # Coordinates are the joinids which obs and var -- written before this -- have
+            # assigned to the row and column labels.
+            for dataframe in [self.row_dataframe, self.col_dataframe]:
+                if not dataframe.has_joinids():
+                    raise Exception(
+                        f"{dataframe.uri} has no joinids, which are needed to write {self.uri}"
+                    )
+            row_names = self.row_dataframe.ids_to_joinids(row_names)
+            col_names = self.col_dataframe.ids_to_joinids(col_names)
+
+        num_written = self._ingest_data(matrix, row_names, col_names)
+        self._update_nnz_metadata(num_written, is_new_array)
         if self._verbose:
             print(util.format_elapsed(s, f"{self._indent}FINISH WRITING {self.uri}"))
 
     # ----------------------------------------------------------------
-    def _create_empty_array(self, matrix_dtype: np.dtype) -> None:
-        """
-        Create a TileDB 2D sparse array with string dimensions and a single attribute.
-        """
-
-        level = self._soma_options.string_dim_zstd_level
-        dom = tiledb.Domain(
-            tiledb.Dim(
-                name=self.row_dim_name,
-                domain=(None, None),
-                dtype="ascii",
-                filters=[tiledb.RleFilter()],
-            ),
-            tiledb.Dim(
-                name=self.col_dim_name,
-                domain=(None, None),
-                dtype="ascii",
-                filters=[tiledb.ZstdFilter(level=level)],
-            ),
-            ctx=self._ctx,
-        )
+    def _update_nnz_metadata(self, num_written: int, is_new_array: bool) -> None:
+        """
+        Records the cell count read by `nnz`, after `num_written` cells have been written. The array
+        allows duplicates, so each write adds all its cells to those already stored.
+        """
+        nnz_key = tiledbsc.util_tiledb.SOMA_NNZ_METADATA_KEY
+        if is_new_array:
+            nnz = num_written
+        else:
+            with self._open("r") as A:
+                nnz = A.meta.get(nnz_key)
+            if nnz is None:
+                # Written before this metadata was; count all the cells.
+                nnz = self._get_nnz_by_scan()
+            else:
+                nnz += num_written
+        self.set_metadata(nnz_key, int(nnz))
+
+    # ----------------------------------------------------------------
+    def _create_empty_array(
+        self, matrix_dtype: np.dtype, uses_joinids: bool = False
+    ) -> None:
+        """
+        Create a TileDB 2D sparse array with string dimensions -- or int64 joinid dimensions, if
+        `uses_joinids` -- and a single attribute.
+        """
+
+        if uses_joinids:
+            # Leave room at the top of the domain for the last tile's extent.
+            row_extent = self._soma_options.obs_extent
+            col_extent = self._soma_options.var_extent
+            dom = tiledb.Domain(
+                tiledb.Dim(
+                    name=self.row_dim_name,
+                    domain=(0, np.iinfo(np.int64).max - row_extent),
+                    tile=row_extent,
+                    dtype=np.int64,
+                    filters=[tiledb.DoubleDeltaFilter(), tiledb.ZstdFilter()],
+                ),
+                tiledb.Dim(
+                    name=self.col_dim_name,
+                    domain=(0, np.iinfo(np.int64).max - col_extent),
+                    tile=col_extent,
+                    dtype=np.int64,
+                    filters=[tiledb.ZstdFilter()],
+                ),
+                ctx=self._ctx,
+            )
+        else:
+            level = self._soma_options.string_dim_zstd_level
+            dom = tiledb.Domain(
+                tiledb.Dim(
+                    name=self.row_dim_name,
+                    domain=(None, None),
+                    dtype="ascii",
+                    filters=[tiledb.RleFilter()],
+                ),
+                tiledb.Dim(
+                    name=self.col_dim_name,
+                    domain=(None, None),
+                    dtype="ascii",
+                    filters=[tiledb.ZstdFilter(level=level)],
+                ),
+                ctx=self._ctx,
+            )
 
         att = tiledb.Attr(
             self.attr_name,
@@ -228,7 +574,15 @@ class AssayMatrix(TileDBArray):
         tiledb.Array.create(self.uri, sch, ctx=self._ctx)
 
     # ----------------------------------------------------------------
-    def _ingest_data(self, matrix, row_names, col_names) -> None:
+    def _ingest_data(self, matrix, row_names, col_names) -> int:
+        """
+        Writes the matrix using the ingestor for its type. Returns the number of cells written: the
+        stored entries of sparse matrices, and the nonzeros of dense ones.
+        """
+        if not isinstance(matrix, np.ndarray) and not scipy.sparse.issparse(matrix):
+            # E.g. `X` of an `AnnData` read with `backed="r"`, which stays in the file.
+            return self.ingest_data_backed_chunked(matrix, row_names, col_names)
+
         if self._soma_options.write_X_chunked:
             if isinstance(matrix, scipy.sparse.csr_matrix):
                 self.ingest_data_rows_chunked(matrix, row_names, col_names)
@@ -239,6 +593,11 @@ class AssayMatrix(TileDBArray):
         else:
             self.ingest_data_whole(matrix, row_names, col_names)
 
+        if scipy.sparse.issparse(matrix):
+            return matrix.nnz
+        else:
+            return np.count_nonzero(matrix)
+
     # ----------------------------------------------------------------
     def ingest_data_whole(self, matrix, row_names, col_names) -> None:
         """
@@ -256,7 +615,7 @@ class AssayMatrix(TileDBArray):
         d0 = row_names[mat_coo.row]
         d1 = col_names[mat_coo.col]
 
-        with tiledb.open(self.uri, mode="w", ctx=self._ctx) as A:
+        with self._open("w") as A:
             A[d0, d1] = mat_coo.data
 
     # ----------------------------------------------------------------
@@ -310,47 +669,52 @@ class AssayMatrix(TileDBArray):
         # Key note: only the _obs labels_ are being sorted, and along with them come permutation
         # indices for accessing the CSR matrix via cursor-indirection -- e.g. csr row 28 is accessed as
         # csr row permuation[28] -- the CSR matrix itself isn't sorted in bulk.
-        sorted_row_names, permutation = util._get_sort_and_permutation(list(row_names))
-        # Using numpy we can index this with a list of indices, which a plain Python list doesn't support.
-        sorted_row_names = np.asarray(sorted_row_names)
+        sorted_row_names, permutation = util._get_sort_and_permutation(row_names)
 
         s = util.get_start_stamp()
         if self._verbose:
             print(f"{self._indent}START  __ingest_coo_data_string_dims_rows_chunked")
 
-        eta_tracker = util.ETATracker()
-        with tiledb.open(self.uri, mode="w", ctx=self._ctx) as A:
-            nrow = len(sorted_row_names)
-
-            i = 0
-            while i < nrow:
-                t1 = time.time()
-                # Find a number of CSR rows which will result in a desired nnz for the chunk.
-                chunk_size = util._find_csr_chunk_size(
-                    matrix, permutation, i, self._soma_options.goal_chunk_nnz
-                )
-                i2 = i + chunk_size
+        nrow = len(sorted_row_names)
 
-                # Convert the chunk to a COO matrix.
-                chunk_coo = matrix[permutation[i:i2]].tocoo()
+        # Plan all the chunks up front: each is a number of CSR rows which will result in a
+        # desired nnz for the chunk.
+        chunk_bounds = util._get_csr_chunk_bounds(
+            matrix, permutation, self._soma_options.goal_chunk_nnz
+        )
+        nchunk = len(chunk_bounds)
 
-                # Write the chunk-COO to TileDB.
-                d0 = sorted_row_names[chunk_coo.row + i]
-                d1 = col_names[chunk_coo.col]
+        def prepare_chunk(i, i2):
+            # Convert the chunk to a COO matrix.
+            chunk_coo = matrix[permutation[i:i2]].tocoo()
+            d0 = sorted_row_names[chunk_coo.row + i]
+            d1 = col_names[chunk_coo.col]
+            return (i, i2, chunk_coo, d0, d1)
 
+        eta_tracker = util.ETATracker()
+        with self._open("w") as A:
+            # Chunks are prepared on a thread pool, up to write_X_queue_depth of them ahead of the
+            # one currently being written to TileDB.
+            t1 = time.time()
+            for chunk_index, (i, i2, chunk_coo, d0, d1) in enumerate(
+                util._run_ahead(
+                    prepare_chunk, chunk_bounds, self._soma_options.write_X_queue_depth
+                )
+            ):
                 if len(d0) == 0:
-                    i = i2
                     continue
 
                 # Python ranges are (lo, hi) with lo inclusive and hi exclusive. But saying that
                 # makes us look buggy if we say we're ingesting chunk 0:18 and then 18:32.
                 # Instead, print doubly-inclusive lo..hi like 0..17 and 18..31.
                 if self._verbose:
-                    chunk_percent = 100 * (i2 - 1) / nrow
+                    chunk_percent = 100 * i2 / nrow
                     print(
-                        "%sSTART  chunk rows %d..%d of %d (%.3f%%), obs_ids %s..%s, nnz=%d"
+                        "%sSTART  chunk %d of %d, rows %d..%d of %d (%.3f%%), obs_ids %s..%s, nnz=%d"
                         % (
                             self._indent,
+                            chunk_index + 1,
+                            nchunk,
                             i,
                             i2 - 1,
                             nrow,
@@ -361,7 +725,7 @@ class AssayMatrix(TileDBArray):
                         )
                     )
 
-                # Write a TileDB fragment
+                # Write the chunk-COO to TileDB as a fragment.
                 A[d0, d1] = chunk_coo.data
 
                 if self._verbose:
@@ -373,8 +737,7 @@ class AssayMatrix(TileDBArray):
                         "%sFINISH chunk in %.3f seconds, %7.3f%% done, ETA %s"
                         % (self._indent, chunk_seconds, chunk_percent, eta)
                     )
-
-                i = i2
+                t1 = time.time()
 
         if self._verbose:
             print(
@@ -407,47 +770,52 @@ class AssayMatrix(TileDBArray):
         # Key note: only the _var labels_ are being sorted, and along with them come permutation
         # indices for accessing the CSC matrix via cursor-indirection -- e.g. csc column 28 is
         # accessed as csc column permuation[28] -- the CSC matrix itself isn't sorted in bulk.
-        sorted_col_names, permutation = util._get_sort_and_permutation(list(col_names))
-        # Using numpy we can index this with a list of indices, which a plain Python list doesn't support.
-        sorted_col_names = np.asarray(sorted_col_names)
+        sorted_col_names, permutation = util._get_sort_and_permutation(col_names)
 
         s = util.get_start_stamp()
         if self._verbose:
             print(f"{self._indent}START  __ingest_coo_data_string_dims_cols_chunked")
 
-        eta_tracker = util.ETATracker()
-        with tiledb.open(self.uri, mode="w", ctx=self._ctx) as A:
-            ncol = len(sorted_col_names)
-
-            j = 0
-            while j < ncol:
-                t1 = time.time()
-                # Find a number of CSC columns which will result in a desired nnz for the chunk.
-                chunk_size = util._find_csc_chunk_size(
-                    matrix, permutation, j, self._soma_options.goal_chunk_nnz
-                )
-                j2 = j + chunk_size
+        ncol = len(sorted_col_names)
 
-                # Convert the chunk to a COO matrix.
-                chunk_coo = matrix[:, permutation[j:j2]].tocoo()
+        # Plan all the chunks up front: each is a number of CSC columns which will result in a
+        # desired nnz for the chunk.
+        chunk_bounds = util._get_csc_chunk_bounds(
+            matrix, permutation, self._soma_options.goal_chunk_nnz
+        )
+        nchunk = len(chunk_bounds)
 
-                # Write the chunk-COO to TileDB.
-                d0 = row_names[chunk_coo.row]
-                d1 = sorted_col_names[chunk_coo.col + j]
+        def prepare_chunk(j, j2):
+            # Convert the chunk to a COO matrix.
+            chunk_coo = matrix[:, permutation[j:j2]].tocoo()
+            d0 = row_names[chunk_coo.row]
+            d1 = sorted_col_names[chunk_coo.col + j]
+            return (j, j2, chunk_coo, d0, d1)
 
+        eta_tracker = util.ETATracker()
+        with self._open("w") as A:
+            # Chunks are prepared on a thread pool, up to write_X_queue_depth of them ahead of the
+            # one currently being written to TileDB.
+            t1 = time.time()
+            for chunk_index, (j, j2, chunk_coo, d0, d1) in enumerate(
+                util._run_ahead(
+                    prepare_chunk, chunk_bounds, self._soma_options.write_X_queue_depth
+                )
+            ):
                 if len(d1) == 0:
-                    j = j2
                     continue
 
                 # Python ranges are (lo, hi) with lo inclusive and hi exclusive. But saying that
                 # makes us look buggy if we say we're ingesting chunk 0:18 and then 18:32.
                 # Instead, print doubly-inclusive lo..hi like 0..17 and 18..31.
                 if self._verbose:
-                    chunk_percent = 100 * (j2 - 1) / ncol
+                    chunk_percent = 100 * j2 / ncol
                     print(
-                        "%sSTART  chunk rows %d..%d of %d (%.3f%%), var_ids %s..%s, nnz=%d"
+                        "%sSTART  chunk %d of %d, cols %d..%d of %d (%.3f%%), var_ids %s..%s, nnz=%d"
                         % (
                             self._indent,
+                            chunk_index + 1,
+                            nchunk,
                             j,
                             j2 - 1,
                             ncol,
@@ -458,7 +826,7 @@ class AssayMatrix(TileDBArray):
                         )
                     )
 
-                # Write a TileDB fragment
+                # Write the chunk-COO to TileDB as a fragment.
                 A[d0, d1] = chunk_coo.data
 
                 if self._verbose:
@@ -470,8 +838,7 @@ class AssayMatrix(TileDBArray):
                         "%sFINISH chunk in %.3f seconds, %7.3f%% done, ETA %s"
                         % (self._indent, chunk_seconds, chunk_percent, eta)
                     )
-
-                j = j2
+                t1 = time.time()
 
         if self._verbose:
             print(
@@ -504,9 +871,7 @@ class AssayMatrix(TileDBArray):
         # Key note: only the _obs labels_ are being sorted, and along with them come permutation
         # indices for accessing the dense matrix via cursor-indirection -- e.g. dense row 28 is accessed as
         # dense row permuation[28] -- the dense matrix itself isn't sorted in bulk.
-        sorted_row_names, permutation = util._get_sort_and_permutation(list(row_names))
-        # Using numpy we can index this with a list of indices, which a plain Python list doesn't support.
-        sorted_row_names = np.asarray(sorted_row_names)
+        sorted_row_names, permutation = util._get_sort_and_permutation(row_names)
 
         s = util.get_start_stamp()
         if self._verbose:
@@ -514,41 +879,50 @@ class AssayMatrix(TileDBArray):
                 f"{self._indent}START  __ingest_coo_data_string_dims_dense_rows_chunked"
             )
 
-        eta_tracker = util.ETATracker()
-        with tiledb.open(self.uri, mode="w", ctx=self._ctx) as A:
-            nrow = len(sorted_row_names)
-            ncol = len(col_names)
-
-            i = 0
-            while i < nrow:
-                t1 = time.time()
-                # Find a number of dense rows which will result in a desired nnz for the chunk,
-                # rounding up to the nearest integer. Example: goal_chunk_nnz is 120. ncol is 50;
-                # 120/50 rounds up to 3; take 3 rows per chunk.
-                chunk_size = int(math.ceil(self._soma_options.goal_chunk_nnz / ncol))
-                i2 = i + chunk_size
-
-                # Convert the chunk to a COO matrix.
-                chunk = matrix[permutation[i:i2]]
-                chunk_coo = scipy.sparse.csr_matrix(chunk).tocoo()
-
-                # Write the chunk-COO to TileDB.
-                d0 = sorted_row_names[chunk_coo.row + i]
-                d1 = col_names[chunk_coo.col]
+        nrow = len(sorted_row_names)
+        ncol = len(col_names)
+
+        # Plan all the chunks up front: each is a number of dense rows which will result in a
+        # desired nnz for the chunk, rounding up to the nearest integer. Example: goal_chunk_nnz
+        # is 120. ncol is 50; 120/50 rounds up to 3; take 3 rows per chunk.
+        chunk_size = int(math.ceil(self._soma_options.goal_chunk_nnz / ncol))
+        chunk_bounds = [
+            (i, min(i + chunk_size, nrow)) for i in range(0, nrow, chunk_size)
+        ]
+        nchunk = len(chunk_bounds)
+
+        def prepare_chunk(i, i2):
+            # Convert the chunk to a COO matrix.
+            chunk = matrix[permutation[i:i2]]
+            chunk_coo = scipy.sparse.csr_matrix(chunk).tocoo()
+            d0 = sorted_row_names[chunk_coo.row + i]
+            d1 = col_names[chunk_coo.col]
+            return (i, i2, chunk_coo, d0, d1)
 
+        eta_tracker = util.ETATracker()
+        with self._open("w") as A:
+            # Chunks are prepared on a thread pool, up to write_X_queue_depth of them ahead of the
+            # one currently being written to TileDB.
+            t1 = time.time()
+            for chunk_index, (i, i2, chunk_coo, d0, d1) in enumerate(
+                util._run_ahead(
+                    prepare_chunk, chunk_bounds, self._soma_options.write_X_queue_depth
+                )
+            ):
                 if len(d0) == 0:
-                    i = i2
                     continue
 
                 # Python ranges are (lo, hi) with lo inclusive and hi exclusive. But saying that
                 # makes us look buggy if we say we're ingesting chunk 0:18 and then 18:32.
                 # Instead, print doubly-inclusive lo..hi like 0..17 and 18..31.
                 if self._verbose:
-                    chunk_percent = 100 * (i2 - 1) / nrow
+                    chunk_percent = 100 * i2 / nrow
                     print(
-                        "%sSTART  chunk rows %d..%d of %d (%.3f%%), obs_ids %s..%s, nnz=%d"
+                        "%sSTART  chunk %d of %d, rows %d..%d of %d (%.3f%%), obs_ids %s..%s, nnz=%d"
                         % (
                             self._indent,
+                            chunk_index + 1,
+                            nchunk,
                             i,
                             i2 - 1,
                             nrow,
@@ -559,7 +933,7 @@ class AssayMatrix(TileDBArray):
                         )
                     )
 
-                # Write a TileDB fragment
+                # Write the chunk-COO to TileDB as a fragment.
                 A[d0, d1] = chunk_coo.data
 
                 if self._verbose:
@@ -571,8 +945,7 @@ class AssayMatrix(TileDBArray):
                         "%sFINISH chunk in %.3f seconds, %7.3f%% done, ETA %s"
                         % (self._indent, chunk_seconds, chunk_percent, eta)
                     )
-
-                i = i2
+                t1 = time.time()
 
         if self._verbose:
             print(
@@ -582,6 +955,125 @@ class AssayMatrix(TileDBArray):
                 )
             )
 
+    # This method is similar to the other chunked ingestors, for the same reasons. The difference is
+    # that the matrix is on disk: only one chunk at a time -- plus those queued up by
+    # write_X_queue_depth -- is ever in memory.
+    def ingest_data_backed_chunked(self, matrix, row_names, col_names) -> int:
+        """
+        Ingest a matrix which is not in memory -- nominally `X` or `raw.X` of an `AnnData` read with
+        `backed="r"`, which is an `h5py.Dataset` if dense or an anndata `SparseDataset` if sparse --
+        reading it from the file one chunk at a time. Peak memory is bounded by `goal_chunk_nnz`,
+        not by the size of the matrix. Returns the number of cells written.
+
+        Chunks are contiguous runs of rows -- or of columns, for CSC storage -- in file order.
+        Unlike the in-memory ingestors, this does not sort by label first, as that would mean
+        random access into the file. If the file isn't in label order, fragments will overlap in
+        their label ranges; consolidating the array afterward will fix that.
+
+        :param matrix: on-disk matrix, supporting slices like `matrix[i:i2]` and `matrix[:, j:j2]`.
+        :param row_names: List of row names.
+        :param col_names: List of column names.
+        """
+
+        assert len(row_names) == matrix.shape[0]
+        assert len(col_names) == matrix.shape[1]
+
+        s = util.get_start_stamp()
+        if self._verbose:
+            print(f"{self._indent}START  __ingest_coo_data_string_dims_backed_chunked")
+
+        nrow, ncol = matrix.shape
+        format_str = getattr(matrix, "format_str", None)  # Set for SparseDataset
+        by_cols = format_str == "csc"
+        nslice = ncol if by_cols else nrow
+        slice_kind = "cols" if by_cols else "rows"
+
+        # Plan all the chunks up front. For sparse storage, only the indptr array is read for
+        # this, and it gives us the nnz of each row (column). For dense storage, see
+        # ingest_data_dense_rows_chunked.
+        if format_str in ("csr", "csc"):
+            indptr = matrix.group["indptr"][:]
+            chunk_bounds = util._get_chunk_bounds(
+                np.diff(indptr), self._soma_options.goal_chunk_nnz
+            )
+        else:
+            chunk_size = int(math.ceil(self._soma_options.goal_chunk_nnz / ncol))
+            chunk_bounds = [
+                (i, min(i + chunk_size, nrow)) for i in range(0, nrow, chunk_size)
+            ]
+        nchunk = len(chunk_bounds)
+
+        def prepare_chunk(i, i2):
+            # Read the chunk from the file, and convert it to a COO matrix.
+            if by_cols:
+                chunk_coo = scipy.sparse.coo_matrix(matrix[:, i:i2])
+                d0 = row_names[chunk_coo.row]
+                d1 = col_names[chunk_coo.col + i]
+            else:
+                chunk_coo = scipy.sparse.coo_matrix(matrix[i:i2])
+                d0 = row_names[chunk_coo.row + i]
+                d1 = col_names[chunk_coo.col]
+            return (i, i2, chunk_coo, d0, d1)
+
+        num_written = 0
+        eta_tracker = util.ETATracker()
+        with self._open("w") as A:
+            # Chunks are read and prepared on a thread pool, up to write_X_queue_depth of them
+            # ahead of the one currently being written to TileDB.
+            t1 = time.time()
+            for chunk_index, (i, i2, chunk_coo, d0, d1) in enumerate(
+                util._run_ahead(
+                    prepare_chunk, chunk_bounds, self._soma_options.write_X_queue_depth
+                )
+            ):
+                if len(d0) == 0:
+                    continue
+
+                # Python ranges are (lo, hi) with lo inclusive and hi exclusive. But saying that
+                # makes us look buggy if we say we're ingesting chunk 0:18 and then 18:32.
+                # Instead, print doubly-inclusive lo..hi like 0..17 and 18..31.
+                if self._verbose:
+                    chunk_percent = 100 * i2 / nslice
+                    print(
+                        "%sSTART  chunk %d of %d, %s %d..%d of %d (%.3f%%), nnz=%d"
+                        % (
+                            self._indent,
+                            chunk_index + 1,
+                            nchunk,
+                            slice_kind,
+                            i,
+                            i2 - 1,
+                            nslice,
+                            chunk_percent,
+                            chunk_coo.nnz,
+                        )
+                    )
+
+                # Write the chunk-COO to TileDB as a fragment.
+                A[d0, d1] = chunk_coo.data
+                num_written += chunk_coo.nnz
+
+                if self._verbose:
+                    t2 = time.time()
+                    chunk_seconds = t2 - t1
+                    eta = eta_tracker.ingest_and_predict(chunk_percent, chunk_seconds)
+
+                    print(
+                        "%sFINISH chunk in %.3f seconds, %7.3f%% done, ETA %s"
+                        % (self._indent, chunk_seconds, chunk_percent, eta)
+                    )
+                t1 = time.time()
+
+        if self._verbose:
+            print(
+                util.format_elapsed(
+                    s,
+                    f"{self._indent}FINISH __ingest_coo_data_string_dims_backed_chunked",
+                )
+            )
+
+        return num_written
+
     # ----------------------------------------------------------------
     def to_csr_matrix(self, row_labels, col_labels):
         """
@@ -597,17 +1089,31 @@ class AssayMatrix(TileDBArray):
             s = util.get_start_stamp()
             print(f"{self._indent}START  read {self.uri}")
 
-        df = self.df()
-
-        retval = util.X_and_ids_to_sparse_matrix(
-            df,
-            self.row_dim_name,
-            self.col_dim_name,
-            self.attr_name,
-            row_labels,
-            col_labels,
-            return_as="csr",
+        # Read the matrix in row-batches rather than via one big dataframe of string-labeled
+        # triples, which is far larger than the CSR matrix it becomes.
+        uses_joinids = self._uses_joinid_dims()
+        var_ids, _, _ = self._get_ids_keys_and_query(
+            self.col_dataframe, None, uses_joinids
         )
+        batch_obs_ids_list = []
+        batch_csrs = []
+        for batch_obs_ids, batch_csr in self.iter_csr():
+            batch_obs_ids_list.append(batch_obs_ids)
+            batch_csrs.append(batch_csr)
+
+        if len(batch_csrs) == 0:
+            obs_ids = []
+            dtype = self.attr_names_to_types()[self.attr_name]
+            retval = scipy.sparse.csr_matrix((0, len(var_ids)), dtype=dtype)
+        else:
+            obs_ids = np.concatenate(batch_obs_ids_list)
+            retval = scipy.sparse.vstack(batch_csrs, format="csr")
+
+        # The batches are in storage order; the caller may want a different one.
+        if not np.array_equal(obs_ids, row_labels):
+            retval = retval[util._labels_to_indices(row_labels, obs_ids)]
+        if not np.array_equal(var_ids, col_labels):
+            retval = retval[:, util._labels_to_indices(col_labels, var_ids)]
 
         if self._verbose:
             print(util.format_elapsed(s, f"{self._indent}FINISH read {self.uri}"))
@@ -156,16 +156,26 @@ class AssayMatrixGroup(TileDBGroup):
             if not self.exists():
                 self._create()
 
-            assay_matrix_uri = os.path.join(self.uri, layer_name)
-            assay_matrix = AssayMatrix(
-                uri=assay_matrix_uri,
-                name=layer_name,
-                row_dim_name=self.row_dim_name,
-                col_dim_name=self.col_dim_name,
-                row_dataframe=self.row_dataframe,
-                col_dataframe=self.col_dataframe,
-                parent=self,
-            )
-            assay_matrix.from_matrix_and_dim_values(matrix, row_names, col_names)
+            assay_matrix = self._write_layer(matrix, row_names, col_names, layer_name)
 
             self._add_object(assay_matrix)
+
+    # ----------------------------------------------------------------
+    def _write_layer(
+        self, matrix, row_names: str, col_names: str, layer_name: str
+    ) -> AssayMatrix:
+        """
+        Writes one layer, without adding it to the group: see
+        `add_layer_from_matrix_and_dim_values`. The group must already exist.
+        """
+        assay_matrix = AssayMatrix(
+            uri=os.path.join(self.uri, layer_name),
+            name=layer_name,
+            row_dim_name=self.row_dim_name,
+            col_dim_name=self.col_dim_name,
+            row_dataframe=self.row_dataframe,
+            col_dataframe=self.col_dataframe,
+            parent=self,
+        )
+        assay_matrix.from_matrix_and_dim_values(matrix, row_names, col_names)
+        return assay_matrix
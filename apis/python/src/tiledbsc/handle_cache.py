@@ -0,0 +1,148 @@
+import threading
+import time
+
+from typing import Any, Callable, Dict, Optional
+
+
+class HandleCache:
+    """
+    Opt-in cache of read handles, shared by a top-level `SOMA` or `SOMACollection` and all the
+    objects beneath it. For each URI it keeps one open TileDB array or group handle, along with
+    snapshots of things read about the object -- existence, metadata, member lists -- so that
+    repeated accessor calls don't each reopen the object. This matters most on S3 and TileDB Cloud,
+    where every open is one or more round trips.
+
+    Writes made through this package invalidate the URI written to. Writes made by other processes
+    are seen only after `invalidate`, `reopen`, or expiry of the TTL, if one is set.
+
+    Independently of caching, `timestamp` is used for all read-opens: if it is set, objects are
+    opened as of that TileDB timestamp (milliseconds since the epoch).
+    """
+
+    enabled: bool
+    ttl_seconds: Optional[float]
+    timestamp: Optional[int]
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        ttl_seconds: Optional[float] = None,
+    ):
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self.timestamp = None
+        self._entries: Dict[str, _HandleCacheEntry] = {}
+        # Re-entrant since snapshot computations typically go on to fetch the handle.
+        self._lock = threading.RLock()
+
+    # ----------------------------------------------------------------
+    def handle(self, uri: str, opener: Callable[[], Any]):
+        """
+        Returns the cached read handle for the URI, calling `opener` to open it if there is none.
+        The return value works as `with cache.handle(...) as A:` as well as by itself, and in
+        neither case does it close the shared handle.
+        """
+        with self._lock:
+            entry = self._get_entry(uri)
+            if entry.handle is None:
+                entry.handle = opener()
+            return _CachedHandle(entry.handle)
+
+    # ----------------------------------------------------------------
+    def snapshot(self, uri: str, name: str, compute: Callable[[], Any]):
+        """
+        Returns the value of `compute()` -- from the cache, if `name` has already been computed for
+        the URI. If caching is not enabled, simply returns `compute()`.
+        """
+        if not self.enabled:
+            return compute()
+        with self._lock:
+            entry = self._get_entry(uri)
+            if name not in entry.snapshots:
+                entry.snapshots[name] = compute()
+            return entry.snapshots[name]
+
+    # ----------------------------------------------------------------
+    def invalidate(self, uri: Optional[str] = None) -> None:
+        """
+        Closes the cached handle, and drops the snapshots, for the URI -- or for all URIs if `uri`
+        is `None`.
+        """
+        with self._lock:
+            uris = list(self._entries.keys()) if uri is None else [uri]
+            for u in uris:
+                entry = self._entries.pop(u, None)
+                if entry is not None:
+                    entry.close()
+
+    # ----------------------------------------------------------------
+    def reopen(self, timestamp: Optional[int] = None) -> None:
+        """
+        Invalidates all URIs, and sets the timestamp at which they will be opened from now on:
+        `None` for the latest state.
+        """
+        with self._lock:
+            self.invalidate()
+            self.timestamp = timestamp
+
+    # ----------------------------------------------------------------
+    def _get_entry(self, uri: str) -> "_HandleCacheEntry":
+        """
+        Returns the entry for the URI, replacing it with a new one if it is past its TTL.
+        """
+        entry = self._entries.get(uri)
+        if entry is not None and self.ttl_seconds is not None:
+            if time.time() - entry.created_at > self.ttl_seconds:
+                entry.close()
+                entry = None
+        if entry is None:
+            entry = _HandleCacheEntry()
+            self._entries[uri] = entry
+        return entry
+
+
+class _HandleCacheEntry:
+    """
+    Cached state for a single URI.
+    """
+
+    def __init__(self):
+        self.created_at = time.time()
+        self.handle = None
+        self.snapshots: Dict[str, Any] = {}
+
+    def close(self) -> None:
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+
+
+class _CachedHandle:
+    """
+    Wraps a cached TileDB array or group handle so that callers written as
+    `with self._open() as A: ...` or `A = self._open(); ...; A.close()` don't close it.
+    """
+
+    def __init__(self, handle):
+        self._handle = handle
+
+    def __enter__(self):
+        return self._handle
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._handle, name)
+
+    def __iter__(self):
+        return iter(self._handle)
+
+    def __contains__(self, name):
+        return name in self._handle
+
+    def __getitem__(self, key):
+        return self._handle[key]
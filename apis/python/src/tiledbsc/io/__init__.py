@@ -3,6 +3,8 @@ from .anndata import from_h5ad_update_obs_and_var
 from .anndata import from_10x
 from .anndata import from_anndata
 from .anndata import from_anndata_update_obs_and_var
+from .anndata import append_h5ad
+from .anndata import append_anndata
 from .anndata import to_h5ad
 from .anndata import to_anndata
 from .anndata import to_anndata_from_raw
@@ -2,14 +2,30 @@ import tiledbsc
 import tiledbsc.util
 import tiledb
 import tiledbsc.util_ann
+from tiledbsc.annotation_dataframe import AnnotationDataFrame
+from tiledbsc.annotation_matrix_group import AnnotationMatrixGroup
+from tiledbsc.assay_matrix import AssayMatrix
+from tiledbsc.tiledb_array import TileDBArray
+from tiledbsc.tiledb_group import TileDBGroup
+from tiledbsc.tiledb_object import TileDBObject
 import anndata as ad
+import numpy as np
+import pandas as pd
+
+import functools
+import os
+from typing import Optional, Dict, List, Tuple, Callable
 
 # ----------------------------------------------------------------
-def from_h5ad(soma: tiledbsc.SOMA, input_path: str) -> None:
+def from_h5ad(soma: tiledbsc.SOMA, input_path: str, backed: bool = False) -> None:
     """
     Reads an .h5ad file and writes to a TileDB group structure.
+
+    If `backed` is true, `X` and `raw.X` are not loaded into memory. Instead they're read from the
+    file in chunks of about `SOMAOptions.goal_chunk_nnz` as they're written, so that files larger
+    than RAM can be ingested. The other parts of the file are loaded as usual.
     """
-    _from_h5ad_common(soma, input_path, from_anndata)
+    _from_h5ad_common(soma, input_path, from_anndata, backed=backed)
 
 
 # ----------------------------------------------------------------
@@ -22,7 +38,30 @@ def from_h5ad_update_obs_and_var(soma: tiledbsc.SOMA, input_path: str) -> None:
 
 
 # ----------------------------------------------------------------
-def _from_h5ad_common(soma: tiledbsc.SOMA, input_path: str, handler_func) -> None:
+def append_h5ad(
+    soma: tiledbsc.SOMA,
+    input_path: str,
+    backed: bool = False,
+    var_alignment: str = "union",
+    consolidate: bool = False,
+) -> None:
+    """
+    Reads an .h5ad file and appends its cells to an existing SOMA: see `append_anndata`.
+    """
+    _from_h5ad_common(
+        soma,
+        input_path,
+        functools.partial(
+            append_anndata, var_alignment=var_alignment, consolidate=consolidate
+        ),
+        backed=backed,
+    )
+
+
+# ----------------------------------------------------------------
+def _from_h5ad_common(
+    soma: tiledbsc.SOMA, input_path: str, handler_func, backed: bool = False
+) -> None:
     """
     Common code for things we do when processing a .h5ad file for ingest/update.
     """
@@ -33,7 +72,7 @@ def _from_h5ad_common(soma: tiledbsc.SOMA, input_path: str, handler_func) -> Non
     if soma._verbose:
         s = tiledbsc.util.get_start_stamp()
         print(f"{soma._indent}START  READING {input_path}")
-    anndata = ad.read_h5ad(input_path)
+    anndata = ad.read_h5ad(input_path, backed="r" if backed else None)
     if soma._verbose:
         print(
             tiledbsc.util.format_elapsed(
@@ -41,7 +80,11 @@ def _from_h5ad_common(soma: tiledbsc.SOMA, input_path: str, handler_func) -> Non
             )
         )
 
-    handler_func(soma, anndata)
+    try:
+        handler_func(soma, anndata)
+    finally:
+        if backed:
+            anndata.file.close()
 
     if soma._verbose:
         print(
@@ -86,12 +129,22 @@ def from_10x(soma: tiledbsc.SOMA, input_path: str) -> None:
 def from_anndata(soma: tiledbsc.SOMA, anndata: ad.AnnData) -> None:
     """
     Top-level writer method for creating a TileDB group for a SOMA object.
+
+    The `anndata` may have been read with `backed="r"`, in which case `X` and `raw.X` are written
+    from the file a chunk at a time.
     """
 
     # Without _at least_ an index, there is nothing to indicate the dimension indices.
     if anndata.obs.index.empty or anndata.var.index.empty:
         raise NotImplementedError("Empty AnnData.obs or AnnData.var unsupported.")
 
+    # For backed AnnData, everything but X and raw is in memory. Proceed with that as usual, and
+    # write X and raw from the backed object.
+    backed_anndata = None
+    if anndata.isbacked:
+        backed_anndata = anndata
+        anndata = tiledbsc.util_ann._without_backed_matrices(backed_anndata)
+
     if soma._verbose:
         s = tiledbsc.util.get_start_stamp()
         print(f"{soma._indent}START  DECATEGORICALIZING")
@@ -111,48 +164,171 @@ def from_anndata(soma: tiledbsc.SOMA, anndata: ad.AnnData) -> None:
     soma._create()
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+    # obs and var go first, since the other members are written in terms of their IDs.
     soma.obs.from_dataframe(dataframe=anndata.obs, extent=256)
-    soma._add_object(soma.obs)
-
     soma.var.from_dataframe(dataframe=anndata.var, extent=2048)
-    soma._add_object(soma.var)
 
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-    soma.X.add_layer_from_matrix_and_dim_values(
-        matrix=anndata.X,
-        row_names=anndata.obs.index,
-        col_names=anndata.var.index,
-        layer_name="data",
+    # The other members are independent of one another, so they're written concurrently: see
+    # `SOMAOptions.ingest_max_workers` and `SOMAOptions.ingest_memory_budget_bytes`. Group
+    # membership is committed once they're all written.
+    tasks = _get_member_write_tasks(soma, anndata, backed_anndata)
+    max_workers = soma._soma_options.ingest_max_workers
+    if max_workers is None:
+        max_workers = min(4, os.cpu_count() or 1)
+    results = tiledbsc.util._run_with_memory_budget(
+        tasks, max_workers, soma._soma_options.ingest_memory_budget_bytes
     )
-    soma._add_object(soma.X)
 
-    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-    soma.obsm.from_matrices_and_dim_values(anndata.obsm, anndata.obs_names)
-    soma._add_object(soma.obsm)
+    # One write to each group, rather than one per member.
+    groups_to_members: Dict[str, Tuple[TileDBGroup, List[TileDBObject]]] = {}
+    for group, member in [pair for pairs in results for pair in pairs]:
+        groups_to_members.setdefault(group.uri, (group, []))[1].append(member)
+    soma_members = [
+        soma.obs,
+        soma.var,
+        soma.X,
+        soma.obsm,
+        soma.varm,
+        soma.obsp,
+        soma.varp,
+    ]
+    for group, members in groups_to_members.values():
+        if group is soma:
+            soma_members += members
+        else:
+            group._add_objects(members)
+    soma._add_objects(soma_members)
+
+    if soma._verbose:
+        print(
+            tiledbsc.util.format_elapsed(s, f"{soma._indent}FINISH WRITING {soma.uri}")
+        )
 
-    soma.varm.from_matrices_and_dim_values(anndata.varm, anndata.var_names)
-    soma._add_object(soma.varm)
 
-    soma.obsp.from_matrices_and_dim_values(anndata.obsp, anndata.obs_names)
-    soma._add_object(soma.obsp)
+# ----------------------------------------------------------------
+def _get_member_write_tasks(
+    soma: tiledbsc.SOMA, anndata: ad.AnnData, backed_anndata: Optional[ad.AnnData]
+) -> List[Tuple[int, Callable[[], List[Tuple[TileDBGroup, TileDBObject]]]]]:
+    """
+    Helper for `from_anndata`: returns a task for each of `X`, the `obsm`, `varm`, `obsp`, and
+    `varp` elements, `raw`, and `uns`, as for `tiledbsc.util._run_with_memory_budget`. Each task
+    returns the `(group, member)` pairs it wrote and which remain to be added to their groups. The
+    groups holding the array members are created here, before anything is written.
+    """
+    tasks = []
+    obs_names = anndata.obs.index
+    var_names = anndata.var.index
+    # Backed matrices are written a chunk at a time.
+    backed_nbytes = soma._soma_options.goal_chunk_nnz * 16
+
+    X = anndata.X if backed_anndata is None else backed_anndata.X
+    if X is not None:
+        soma.X._create()
+        tasks.append(
+            (
+                tiledbsc.util._get_nbytes(X)
+                if backed_anndata is None
+                else backed_nbytes,
+                functools.partial(
+                    _write_member,
+                    soma.X,
+                    soma.X._write_layer,
+                    X,
+                    obs_names,
+                    var_names,
+                    "data",
+                ),
+            )
+        )
 
-    soma.varp.from_matrices_and_dim_values(anndata.varp, anndata.var_names)
-    soma._add_object(soma.varp)
+    for group, matrices, dim_values in [
+        (soma.obsm, anndata.obsm, obs_names),
+        (soma.varm, anndata.varm, var_names),
+        (soma.obsp, anndata.obsp, obs_names),
+        (soma.varp, anndata.varp, var_names),
+    ]:
+        group._create()
+        for matrix_name in matrices.keys():
+            matrix = matrices[matrix_name]
+            tasks.append(
+                (
+                    tiledbsc.util._get_nbytes(matrix),
+                    functools.partial(
+                        _write_member,
+                        group,
+                        group._write_matrix,
+                        matrix_name,
+                        matrix,
+                        dim_values,
+                    ),
+                )
+            )
 
-    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
     if anndata.raw != None:
-        soma.raw.from_anndata(anndata)
-        soma._add_object(soma.raw)
+        tasks.append(
+            (
+                tiledbsc.util._get_nbytes(anndata.raw.X),
+                functools.partial(_write_raw, soma, anndata),
+            )
+        )
+    elif backed_anndata is not None and backed_anndata.raw is not None:
+        tasks.append(
+            (
+                backed_nbytes,
+                functools.partial(_write_backed_raw, soma, backed_anndata, obs_names),
+            )
+        )
 
-    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
     if anndata.uns != None:
-        soma.uns.from_anndata_uns(anndata.uns)
-        soma._add_object(soma.uns)
+        tasks.append((0, functools.partial(_write_uns, soma, anndata.uns)))
 
-    if soma._verbose:
-        print(
-            tiledbsc.util.format_elapsed(s, f"{soma._indent}FINISH WRITING {soma.uri}")
-        )
+    return tasks
+
+
+def _write_member(
+    group: TileDBGroup, write_func: Callable[..., TileDBObject], *args
+) -> List[Tuple[TileDBGroup, TileDBObject]]:
+    """
+    Task for `_get_member_write_tasks`: writes one member array of the group.
+    """
+    return [(group, write_func(*args))]
+
+
+def _write_raw(
+    soma: tiledbsc.SOMA, anndata: ad.AnnData
+) -> List[Tuple[TileDBGroup, TileDBObject]]:
+    """
+    Task for `_get_member_write_tasks`: writes `raw`, which adds its own members.
+    """
+    soma.raw.from_anndata(anndata)
+    return [(soma, soma.raw)]
+
+
+def _write_backed_raw(
+    soma: tiledbsc.SOMA, backed_anndata: ad.AnnData, obs_names
+) -> List[Tuple[TileDBGroup, TileDBObject]]:
+    """
+    Task for `_get_member_write_tasks`: writes `raw`, with `raw.X` left on disk.
+    """
+    soma.raw._from_matrix_and_annotations(
+        backed_anndata.raw.X,
+        obs_names,
+        tiledbsc.util_ann._decategoricalize_dataframe(backed_anndata.raw.var),
+        {
+            key: tiledbsc.util._to_tiledb_supported_array_type(value)
+            for key, value in backed_anndata.raw.varm.items()
+        },
+    )
+    return [(soma, soma.raw)]
+
+
+def _write_uns(soma: tiledbsc.SOMA, uns) -> List[Tuple[TileDBGroup, TileDBObject]]:
+    """
+    Task for `_get_member_write_tasks`: writes `uns`, which adds its own members.
+    """
+    soma.uns.from_anndata_uns(uns)
+    return [(soma, soma.uns)]
 
 
 # ----------------------------------------------------------------
@@ -200,6 +376,405 @@ def from_anndata_update_obs_and_var(soma: tiledbsc.SOMA, anndata: ad.AnnData) ->
         )
 
 
+# ----------------------------------------------------------------
+def append_anndata(
+    soma: tiledbsc.SOMA,
+    anndata: ad.AnnData,
+    var_alignment: str = "union",
+    consolidate: bool = False,
+) -> None:
+    """
+    Appends the cells of `anndata` to an existing SOMA, as written by `from_anndata`, without
+    re-ingesting what is already there. Nominally for data arriving in batches: a day's samples
+    at a time, say. The batch's `obs` rows are added to `obs`, and its `X`, `obsm`, `obsp`, and
+    `raw.X` are written as new fragments of the existing arrays. `var` rows new to the SOMA get the
+    batch's `varm` rows, and likewise for `raw`; otherwise `varm`, `varp`, and `uns` are left as they
+    are.
+
+    Everything is checked before anything is written:
+
+    * The `obs_ids` must be new: neither repeated within the batch nor already in the SOMA.
+    * The batch's `obs` must have the same columns as the SOMA's.
+    * The batch must have `X`, and `raw`, if and only if the SOMA does; the same `obsm` elements,
+      with the same numbers of columns; and only `obsp` elements which the SOMA has. If it adds
+      `var` rows, the same goes for its `varm` elements as for `obsm`.
+    * The values of `X`, `raw.X`, and the `obsm`, `varm`, and `obsp` elements must be of types the
+      stored ones can hold without loss of kind: integers where floats are stored, say, but not
+      floats where integers are.
+
+    There is no rollback past that, though. `obs` and `var` are written first, since the other
+    members are written in terms of their IDs; if writing one of the others then fails -- on an I/O
+    error, say -- the append is left partial, with the batch's cells in `obs` but not in every
+    member.
+
+    The batch's rows are added to nearest-neighbor indexes over `obsm` elements, without
+    re-clustering: see `AnnotationMatrixKNNIndex.add`. If the SOMA is in a `SOMACollection`, re-add
+    it there to update the collection's indexes of `obs` and `var` values.
+
+    :param var_alignment: `"union"` to add the batch's `var` rows which are new to the SOMA, with the
+    same columns as the SOMA's; `"strict"` to require the batch's `var_ids` to be those of the SOMA.
+    Either way `X` is written by `var_id`, so the batch's `var` needn't be in the same order. The
+    same applies to `raw.var`.
+    :param consolidate: If true, the arrays appended to are consolidated and vacuumed afterward, so
+    that reads needn't go through a fragment per append.
+
+    The `anndata` may have been read with `backed="r"`, as for `from_anndata`.
+    """
+    if not soma.exists() or not soma.obs.exists():
+        raise Exception(f"{soma.uri} does not exist: use from_anndata to create it")
+    if var_alignment not in ["union", "strict"]:
+        raise Exception(
+            f'var_alignment must be "union" or "strict"; got "{var_alignment}"'
+        )
+    if anndata.obs.index.empty:
+        raise NotImplementedError("Empty AnnData.obs unsupported.")
+
+    backed_anndata = None
+    if anndata.isbacked:
+        backed_anndata = anndata
+        anndata = tiledbsc.util_ann._without_backed_matrices(backed_anndata)
+
+    # Unlike from_anndata, repeated obs_ids are not made unique: see _check_obs_ids_are_new.
+    anndata.var_names_make_unique()
+    anndata = tiledbsc.util_ann._decategoricalize(anndata)
+
+    X = anndata.X if backed_anndata is None else backed_anndata.X
+    raw_X = None
+    raw_var = None
+    raw_varm = None
+    if anndata.raw is not None:
+        raw_X = anndata.raw.X
+        raw_var = anndata.raw.var
+        raw_varm = anndata.raw.varm
+    elif backed_anndata is not None and backed_anndata.raw is not None:
+        raw_X = backed_anndata.raw.X
+        raw_var = tiledbsc.util_ann._decategoricalize_dataframe(backed_anndata.raw.var)
+        raw_varm = {
+            key: tiledbsc.util._to_tiledb_supported_array_type(value)
+            for key, value in backed_anndata.raw.varm.items()
+        }
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+    # Checks, so that a batch which doesn't fit leaves the SOMA as it was.
+    obs_names = anndata.obs.index
+    _check_obs_ids_are_new(soma, obs_names)
+    obs = _conform_dataframe(soma.obs, anndata.obs)
+    new_var = _get_var_to_append(soma.var, anndata.var, var_alignment)
+
+    has_X = soma.X.exists() and "data" in soma.X
+    if (X is not None) != has_X:
+        raise Exception(
+            f"{soma.uri}: the batch must have X if and only if the SOMA has X/data"
+        )
+    if (raw_X is not None) != soma.raw.exists():
+        raise Exception(
+            f"{soma.uri}: the batch must have raw if and only if the SOMA has raw"
+        )
+    new_raw_var = None
+    if raw_X is not None:
+        new_raw_var = _get_var_to_append(soma.raw.var, raw_var, var_alignment)
+
+    obsm_names = _check_annotation_matrices(soma.obsm, anndata.obsm)
+    # varm rows are written only for new var rows, but then for every element.
+    varm = {}
+    if len(new_var) > 0:
+        _check_annotation_matrices(soma.varm, anndata.varm)
+        varm = _get_new_var_rows(anndata.varm, anndata.var.index, new_var)
+    if new_raw_var is not None and len(new_raw_var) > 0:
+        _check_annotation_matrices(soma.raw.varm, raw_varm)
+        raw_varm = _get_new_var_rows(raw_varm, raw_var.index, new_raw_var)
+    else:
+        raw_varm = {}
+    obsp_names = soma.obsp.keys() if soma.obsp.exists() else []
+    for matrix_name in anndata.obsp.keys():
+        if matrix_name not in obsp_names:
+            raise Exception(
+                f"{soma.obsp.uri}: the SOMA has no element {matrix_name} to append to"
+            )
+        _check_assay_matrix(soma.obsp[matrix_name], anndata.obsp[matrix_name])
+    if X is not None:
+        _check_assay_matrix(soma.X["data"], X)
+    if raw_X is not None:
+        _check_assay_matrix(soma.raw.X["data"], raw_X)
+
+    if soma._verbose:
+        s = tiledbsc.util.get_start_stamp()
+        print(f"{soma._indent}START  APPENDING TO {soma.uri}")
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+    # obs and var go first, since the other members are written in terms of their IDs.
+    soma.obs.from_dataframe(dataframe=obs, extent=256)
+    if len(new_var) > 0:
+        soma.var.from_dataframe(dataframe=new_var, extent=2048)
+    if new_raw_var is not None and len(new_raw_var) > 0:
+        soma.raw.var.from_dataframe(dataframe=new_raw_var, extent=2048)
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+    # As in from_anndata, the other members are written concurrently. They are all in their groups
+    # already.
+    backed_nbytes = soma._soma_options.goal_chunk_nnz * 16
+    tasks = []
+    if X is not None:
+        tasks.append(
+            (
+                tiledbsc.util._get_nbytes(X)
+                if backed_anndata is None
+                else backed_nbytes,
+                functools.partial(
+                    _write_member,
+                    soma.X,
+                    soma.X._write_layer,
+                    X,
+                    obs_names,
+                    anndata.var.index,
+                    "data",
+                ),
+            )
+        )
+    for group, matrices, dim_values in [
+        (soma.obsm, anndata.obsm, obs_names),
+        (soma.obsp, anndata.obsp, obs_names),
+        (soma.varm, varm, new_var.index),
+        (soma.raw.varm, raw_varm, None if new_raw_var is None else new_raw_var.index),
+    ]:
+        for matrix_name in matrices.keys():
+            matrix = matrices[matrix_name]
+            tasks.append(
+                (
+                    tiledbsc.util._get_nbytes(matrix),
+                    functools.partial(
+                        _write_member,
+                        group,
+                        group._write_matrix,
+                        matrix_name,
+                        matrix,
+                        dim_values,
+                    ),
+                )
+            )
+    if raw_X is not None:
+        tasks.append(
+            (
+                tiledbsc.util._get_nbytes(raw_X)
+                if backed_anndata is None
+                else backed_nbytes,
+                functools.partial(
+                    _write_member,
+                    soma.raw.X,
+                    soma.raw.X._write_layer,
+                    raw_X,
+                    obs_names,
+                    raw_var.index,
+                    "data",
+                ),
+            )
+        )
+    max_workers = soma._soma_options.ingest_max_workers
+    if max_workers is None:
+        max_workers = min(4, os.cpu_count() or 1)
+    results = tiledbsc.util._run_with_memory_budget(
+        tasks, max_workers, soma._soma_options.ingest_memory_budget_bytes
+    )
+    written = [member for pairs in results for _, member in pairs]
+
+    for matrix_name in obsm_names:
+        soma.obsm._add_to_knn_index(matrix_name, list(obs_names))
+
+    if consolidate:
+        written = [soma.obs, soma.var] + written
+        if raw_X is not None:
+            written.append(soma.raw.var)
+        for member in written:
+            _consolidate_and_vacuum(member)
+        soma.invalidate_cache()
+
+    if soma._verbose:
+        print(
+            tiledbsc.util.format_elapsed(
+                s, f"{soma._indent}FINISH APPENDING TO {soma.uri}"
+            )
+        )
+
+
+def _check_obs_ids_are_new(soma: tiledbsc.SOMA, obs_names) -> None:
+    """
+    Helper for `append_anndata`. A repeated `obs_id` would overwrite a cell's `obs` row, but its
+    `X` entries only where the new cell has them, leaving a mix of the two; so it's an error.
+    """
+    repeated = obs_names[obs_names.duplicated()].unique()
+    if len(repeated) > 0:
+        raise Exception(
+            f"{soma.uri}: the batch repeats obs_ids, e.g. {list(repeated[:5])}"
+        )
+    existing = obs_names[obs_names.isin(soma.obs.ids())]
+    if len(existing) > 0:
+        raise Exception(
+            f"{soma.uri}: the batch has obs_ids already in the SOMA, e.g. {list(existing[:5])}"
+        )
+
+
+def _conform_dataframe(
+    annotation_dataframe: AnnotationDataFrame, dataframe: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Helper for `append_anndata`: returns the batch's `obs`, `var`, or `raw.var`, with the same
+    columns as the stored one, in the same order. Numeric columns are cast to the stored types
+    where that's safe -- e.g. integer counts where the stored ones are floats.
+    """
+    attr_names_to_types = annotation_dataframe.attr_names_to_types()
+    attr_names_to_types.pop(tiledbsc.util_tiledb.SOMA_JOINID_ATTR_NAME, None)
+    missing = [k for k in attr_names_to_types if k not in dataframe.columns]
+    extra = [k for k in dataframe.columns if k not in attr_names_to_types]
+    if len(missing) > 0 or len(extra) > 0:
+        raise Exception(
+            f"{annotation_dataframe.uri}: the batch's columns differ from those stored: missing {missing}, extra {extra}"
+        )
+
+    dataframe = dataframe[list(attr_names_to_types.keys())]
+    columns_to_categories = annotation_dataframe.categories()
+    columns = {}
+    for column_name, dtype in attr_names_to_types.items():
+        dfc_dtype = dataframe[column_name].dtype
+        if column_name in columns_to_categories or not isinstance(dfc_dtype, np.dtype):
+            continue
+        if (
+            dtype.kind in "biuf"
+            and dfc_dtype.kind in "biuf"
+            and dfc_dtype != dtype
+            and np.can_cast(dfc_dtype, dtype, casting="same_kind")
+        ):
+            columns[column_name] = dataframe[column_name].astype(dtype)
+    if len(columns) > 0:
+        dataframe = dataframe.assign(**columns)
+    return dataframe
+
+
+def _check_annotation_matrices(group: AnnotationMatrixGroup, matrices) -> List[str]:
+    """
+    Helper for `append_anndata`: checks that the batch's `obsm` or `varm` elements are those stored,
+    with the same numbers of columns -- of the same names, for the sparse layout -- and types the
+    stored ones can hold. Returns their names.
+    """
+    names = group.keys() if group.exists() else []
+    if sorted(matrices.keys()) != sorted(names):
+        raise Exception(
+            f"{group.uri}: the batch has elements {sorted(matrices.keys())} but the SOMA has {sorted(names)}"
+        )
+    for matrix_name in names:
+        annotation_matrix = group[matrix_name]
+        matrix = matrices[matrix_name]
+        num_columns = annotation_matrix.num_columns()
+        if matrix.shape[1] != num_columns:
+            raise Exception(
+                f"{annotation_matrix.uri}: the batch has {matrix.shape[1]} columns but the SOMA has {num_columns}"
+            )
+
+        # Column names as from_matrix_and_dim_values gives them.
+        if isinstance(matrix, pd.DataFrame):
+            columns_to_dtypes = dict(matrix.dtypes)
+        else:
+            columns_to_dtypes = {
+                f"{matrix_name}_{j}": matrix.dtype for j in range(1, num_columns + 1)
+            }
+        attr_names_to_types = annotation_matrix.attr_names_to_types()
+        if annotation_matrix.uses_dense_layout():
+            # A single attribute, for all the columns.
+            (stored_dtype,) = attr_names_to_types.values()
+            attr_names_to_types = {name: stored_dtype for name in columns_to_dtypes}
+        elif sorted(columns_to_dtypes.keys()) != sorted(attr_names_to_types.keys()):
+            raise Exception(
+                f"{annotation_matrix.uri}: the batch has columns {sorted(columns_to_dtypes.keys())} but the SOMA has {sorted(attr_names_to_types.keys())}"
+            )
+        for column_name, dtype in columns_to_dtypes.items():
+            _check_dtype(annotation_matrix.uri, dtype, attr_names_to_types[column_name])
+    return names
+
+
+def _check_assay_matrix(assay_matrix: AssayMatrix, matrix) -> None:
+    """
+    Helper for `append_anndata`: checks that the values of the batch's `X`, `raw.X`, or `obsp`
+    element are of a type the stored ones can hold.
+    """
+    _check_dtype(
+        assay_matrix.uri,
+        getattr(matrix, "dtype", None),
+        assay_matrix.attr_names_to_types()[assay_matrix.attr_name],
+    )
+
+
+def _check_dtype(uri: str, dtype, stored_dtype) -> None:
+    """
+    Helper for `append_anndata`. TileDB casts what is written to the type of the attribute, without
+    complaint, so that floats written where integers are stored would be truncated: a batch with
+    values which would lose their kind so is an error, as is one with numbers where the stored
+    values are not, or vice versa.
+    """
+    if not isinstance(dtype, np.dtype) or not isinstance(stored_dtype, np.dtype):
+        return
+    is_numeric = dtype.kind in "biuf"
+    if is_numeric != (stored_dtype.kind in "biuf") or (
+        is_numeric and not np.can_cast(dtype, stored_dtype, casting="same_kind")
+    ):
+        raise Exception(
+            f"{uri}: the batch has {dtype} values but the SOMA has {stored_dtype}"
+        )
+
+
+def _get_new_var_rows(varm, var_names: pd.Index, new_var: pd.DataFrame):
+    """
+    Helper for `append_anndata`: returns the rows of the batch's `varm` or `raw.varm` elements for
+    the `var` rows being appended, in the order of `new_var`.
+    """
+    positions = var_names.get_indexer(new_var.index)
+    return {
+        key: value.iloc[positions]
+        if isinstance(value, pd.DataFrame)
+        else value[positions]
+        for key, value in varm.items()
+    }
+
+
+def _get_var_to_append(
+    annotation_dataframe: AnnotationDataFrame,
+    var: pd.DataFrame,
+    var_alignment: str,
+) -> pd.DataFrame:
+    """
+    Helper for `append_anndata`: returns the rows of the batch's `var` or `raw.var` which are new,
+    for `"union"` alignment, after checking them. For `"strict"` alignment there are none: the
+    `var_ids` must be those stored.
+    """
+    existing_ids = pd.Index(annotation_dataframe.ids())
+    is_new = ~var.index.isin(existing_ids)
+    if var_alignment == "strict":
+        if is_new.any() or len(existing_ids) != len(var.index):
+            raise Exception(
+                f"{annotation_dataframe.uri}: with strict var_alignment, the batch's var_ids must be those stored: {np.count_nonzero(is_new)} new, {len(existing_ids) - np.count_nonzero(~is_new)} missing"
+            )
+        return var.iloc[0:0]
+    return _conform_dataframe(annotation_dataframe, var[is_new])
+
+
+def _consolidate_and_vacuum(array: TileDBArray) -> None:
+    """
+    Helper for `append_anndata`: consolidates the array's fragments, and its metadata, which each
+    append adds to.
+    """
+    if array._verbose:
+        s = tiledbsc.util.get_start_stamp()
+        print(f"{array._indent}START  CONSOLIDATING {array.uri}")
+    for mode in ["fragments", "array_meta"]:
+        config = tiledb.Config({"sm.consolidation.mode": mode, "sm.vacuum.mode": mode})
+        tiledb.consolidate(array.uri, config=config, ctx=array._ctx)
+        tiledb.vacuum(array.uri, config=config, ctx=array._ctx)
+    if array._verbose:
+        print(
+            tiledbsc.util.format_elapsed(
+                s, f"{array._indent}FINISH CONSOLIDATING {array.uri}"
+            )
+        )
+
+
 # ----------------------------------------------------------------
 def to_h5ad(soma: tiledbsc.SOMA, h5ad_path: str) -> None:
     """
@@ -231,7 +806,9 @@ def to_h5ad(soma: tiledbsc.SOMA, h5ad_path: str) -> None:
 
 
 # ----------------------------------------------------------------
-def to_anndata(soma: tiledbsc.SOMA) -> ad.AnnData:
+def to_anndata(
+    soma: tiledbsc.SOMA, columns: Optional[Dict[str, List[str]]] = None
+) -> ad.AnnData:
     """
     Converts the soma group to anndata. Choice of matrix formats is following
     what we often see in input .h5ad files:
@@ -240,14 +817,22 @@ def to_anndata(soma: tiledbsc.SOMA) -> ad.AnnData:
     * obsm,varm arrays as numpy.ndarray
     * obsp,varp arrays as scipy.sparse.csr_matrix
     As of 2022-05-05 this is an incomplete prototype.
+
+    :param columns: Maps `"obs"` and/or `"var"` to the annotation columns to read, as for
+    `SOMA.query`. Columns for a dataframe not named here are all read.
     """
 
     if soma._verbose:
         s = tiledbsc.util.get_start_stamp()
         print(f"START  SOMA.to_anndata {soma.uri}")
 
-    obs_df = soma.obs.df()
-    var_df = soma.var.df()
+    if columns is None:
+        columns = {}
+    for key in columns:
+        if key not in ("obs", "var"):
+            raise Exception(f'columns keys must be "obs" or "var"; got "{key}"')
+    obs_df = soma.obs.df(attrs=columns.get("obs"))
+    var_df = soma.var.df(attrs=columns.get("var"))
 
     X_mat = soma.X["data"].to_csr_matrix(obs_df.index, var_df.index)
 
@@ -8,6 +8,7 @@ from .annotation_pairwise_matrix_group import AnnotationPairwiseMatrixGroup
 import tiledbsc.util as util
 
 import anndata as ad
+import pandas as pd
 
 from typing import Optional
 import os
@@ -53,7 +54,9 @@ class RawGroup(TileDBGroup):
             col_dataframe=self.var,
             parent=self.var,
         )
-        self.varm = AnnotationMatrixGroup(uri=varm_uri, name="varm", parent=self)
+        self.varm = AnnotationMatrixGroup(
+            uri=varm_uri, name="varm", dataframe=self.var, parent=self
+        )
         self.varp = AnnotationPairwiseMatrixGroup(
             uri=varp_uri,
             name="varp",
@@ -67,6 +70,16 @@ class RawGroup(TileDBGroup):
         """
         Writes `anndata.raw` to a TileDB group structure.
         """
+        self._from_matrix_and_annotations(
+            anndata.raw.X, anndata.obs.index, anndata.raw.var, anndata.raw.varm
+        )
+
+    # ----------------------------------------------------------------
+    def _from_matrix_and_annotations(self, X, obs_names, var: pd.DataFrame, varm):
+        """
+        Implements `from_anndata`, taking the parts of `anndata.raw` separately. This allows for
+        `X` which has been left on disk -- see `tiledbsc.io.from_h5ad`.
+        """
         if self._verbose:
             s = util.get_start_stamp()
             print(f"{self._indent}START  WRITING {self.uri}")
@@ -74,18 +87,18 @@ class RawGroup(TileDBGroup):
         # Must be done first, to create the parent directory
         self._create()
 
-        self.var.from_dataframe(dataframe=anndata.raw.var, extent=2048)
+        self.var.from_dataframe(dataframe=var, extent=2048)
         self._add_object(self.var)
 
         self.X.add_layer_from_matrix_and_dim_values(
-            matrix=anndata.raw.X,
-            row_names=anndata.obs.index,
-            col_names=anndata.raw.var.index,
+            matrix=X,
+            row_names=obs_names,
+            col_names=var.index,
             layer_name="data",
         )
         self._add_object(self.X)
 
-        self.varm.from_matrices_and_dim_values(anndata.raw.varm, anndata.raw.var_names)
+        self.varm.from_matrices_and_dim_values(varm, var.index)
         self._add_object(self.varm)
 
         if self._verbose:
@@ -1,5 +1,5 @@
 import os
-from typing import Optional, Union, Dict
+from typing import Optional, Union, Dict, List, Iterator
 
 import anndata as ad
 import numpy as np
@@ -105,8 +105,12 @@ class SOMA(TileDBGroup):
             col_dataframe=self.var,
             parent=self,
         )
-        self.obsm = AnnotationMatrixGroup(uri=obsm_uri, name="obsm", parent=self)
-        self.varm = AnnotationMatrixGroup(uri=varm_uri, name="varm", parent=self)
+        self.obsm = AnnotationMatrixGroup(
+            uri=obsm_uri, name="obsm", dataframe=self.obs, parent=self
+        )
+        self.varm = AnnotationMatrixGroup(
+            uri=varm_uri, name="varm", dataframe=self.var, parent=self
+        )
         self.obsp = AnnotationPairwiseMatrixGroup(
             uri=obsp_uri,
             name="obsp",
@@ -174,3 +178,137 @@ class SOMA(TileDBGroup):
         An alias for `soma.var.ids()`.
         """
         return self.var.ids()
+
+    # ----------------------------------------------------------------
+    def append_anndata(
+        self,
+        anndata: ad.AnnData,
+        var_alignment: str = "union",
+        consolidate: bool = False,
+    ) -> None:
+        """
+        Appends the cells of `anndata` to this SOMA, which must already exist. See
+        `tiledbsc.io.append_anndata`.
+        """
+        # Not at the top: tiledbsc.io imports this module.
+        import tiledbsc.io
+
+        tiledbsc.io.append_anndata(
+            self, anndata, var_alignment=var_alignment, consolidate=consolidate
+        )
+
+    # ----------------------------------------------------------------
+    def query(
+        self,
+        obs_filter: Optional[str] = None,
+        var_filter: Optional[str] = None,
+        X_layer: Optional[str] = "data",
+        columns: Optional[Dict[str, List[str]]] = None,
+        return_batches: bool = False,
+        batch_obs: Optional[int] = None,
+    ) -> Union[Optional[ad.AnnData], Iterator[ad.AnnData]]:
+        """
+        Slices the SOMA by `obs` and `var` predicates, reading as little as possible: the filters
+        and column selections are pushed down into the TileDB queries on `obs` and `var`, and `X`
+        is then read for only the matching rows and columns, in row-batches via
+        `AssayMatrix.iter_csr`.
+
+        :param obs_filter: TileDB-Py `QueryCondition` string, such as `cell_type == "blood"`, for
+        the `obs` rows to keep. If `None`, all rows are kept.
+        :param var_filter: Likewise for `var`.
+        :param X_layer: Name of the `X` layer to read, or `None` to read only `obs` and `var`.
+        :param columns: Maps `"obs"` and/or `"var"` to the annotation columns to return. Columns
+        for a dataframe not named here are all returned. Filters may refer to any column,
+        returned or not.
+        :param return_batches: If true, returns an iterator of `AnnData` objects, each having up to
+        `batch_obs` of the matching `obs` rows and all matching `var` columns. Otherwise returns a
+        single `AnnData`, or `None` if no `obs` or no `var` rows match.
+        :param batch_obs: Rows per batch. Defaults to `SOMAOptions.X_read_batch_obs`.
+        """
+        if columns is None:
+            columns = {}
+        for key in columns:
+            if key not in ("obs", "var"):
+                raise Exception(f'columns keys must be "obs" or "var"; got "{key}"')
+        if batch_obs is None:
+            batch_obs = self._soma_options.X_read_batch_obs
+
+        if X_layer is None:
+            X = None
+        else:
+            X = self.X[X_layer]
+            if X is None:
+                raise Exception(f'X layer "{X_layer}" not found in {self.X.uri}')
+
+        if self._verbose:
+            s = util.get_start_stamp()
+            print(f"{self._indent}START  SOMA.query {self.uri}")
+
+        obs_df = self.obs._filter_select(obs_filter, columns.get("obs"))
+        var_df = self.var._filter_select(var_filter, columns.get("var"))
+
+        if self._verbose:
+            print(
+                f"{self._indent}Matched {len(obs_df)} obs rows and {len(var_df)} var rows"
+            )
+
+        batches = self._iter_query_batches(
+            obs_df,
+            var_df,
+            X,
+            batch_obs,
+            obs_ids=None if obs_filter is None else list(obs_df.index),
+            var_ids=None if var_filter is None else list(var_df.index),
+        )
+
+        if return_batches:
+            retval = batches
+        elif len(obs_df) == 0 or len(var_df) == 0:
+            retval = None
+        elif X is None:
+            retval = ad.AnnData(obs=obs_df, var=var_df)
+        else:
+            blocks = list(batches)
+            X_mat = scipy.sparse.vstack([block.X for block in blocks], format="csr")
+            retval = ad.AnnData(
+                X=X_mat,
+                dtype=X_mat.dtype,
+                obs=pd.concat([block.obs for block in blocks]),
+                var=blocks[0].var,
+            )
+
+        if self._verbose:
+            print(util.format_elapsed(s, f"{self._indent}FINISH SOMA.query {self.uri}"))
+
+        return retval
+
+    # ----------------------------------------------------------------
+    def _iter_query_batches(
+        self, obs_df, var_df, X, batch_obs: int, obs_ids, var_ids
+    ) -> Iterator[ad.AnnData]:
+        """
+        Helper for `query`. The ID lists are `None` when their dataframes are unfiltered, so that
+        `X` is read by ranges rather than by points.
+        """
+        if len(obs_df) == 0 or len(var_df) == 0:
+            return
+
+        if X is None:
+            for i in range(0, len(obs_df), batch_obs):
+                yield ad.AnnData(obs=obs_df.iloc[i : i + batch_obs], var=var_df)
+            return
+
+        if var_ids is None:
+            # Align var_df with the matrix columns, which are in storage order.
+            var_ids, _, _ = X._get_ids_keys_and_query(
+                self.var, None, X._uses_joinid_dims()
+            )
+            var_df = var_df.loc[var_ids]
+
+        for batch_obs_ids, batch_csr in X.iter_csr(batch_obs, obs_ids, var_ids):
+            yield ad.AnnData(
+                X=batch_csr,
+                dtype=batch_csr.dtype,
+                obs=obs_df.loc[batch_obs_ids],
+                var=var_df,
+            )
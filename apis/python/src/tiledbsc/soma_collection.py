@@ -1,17 +1,33 @@
-from typing import Optional, List
+from typing import Optional, List, Dict, Any, Callable
 
+import concurrent.futures
+import functools
+import multiprocessing
+import os
+
+import anndata as ad
+import pandas as pd
+import pyarrow as pa
 import tiledb
 
+from tiledbsc import util
 from .soma_options import SOMAOptions
 from .soma import SOMA
 from .tiledb_group import TileDBGroup
+from .annotation_value_index import AnnotationValueIndex
 
 
 class SOMACollection(TileDBGroup):
     """
     Implements a collection of `SOMA` objects.
+
+    Alongside its SOMAs, the collection's group holds `obs_value_index` and `var_value_index`
+    (`AnnotationValueIndex`), which record which SOMAs have which `obs`/`var` values.
     """
 
+    obs_value_index: AnnotationValueIndex
+    var_value_index: AnnotationValueIndex
+
     # ----------------------------------------------------------------
     def __init__(
         self,
@@ -44,19 +60,94 @@ class SOMACollection(TileDBGroup):
             soma_options=soma_options,
         )
 
+        self.obs_value_index = AnnotationValueIndex(
+            uri=os.path.join(self.uri, "obs_value_index"),
+            name="obs_value_index",
+            parent=self,
+        )
+        self.var_value_index = AnnotationValueIndex(
+            uri=os.path.join(self.uri, "var_value_index"),
+            name="var_value_index",
+            parent=self,
+        )
+
     # ----------------------------------------------------------------
     def add(self, soma: SOMA) -> None:
         """
-        Adds a `SOMA` to the `SOMACollection`.
+        Adds a `SOMA` to the `SOMACollection`, and indexes its `obs` and `var` values.
         """
+        if soma.name in _VALUE_INDEX_NAMES:
+            raise Exception(f'SOMA name "{soma.name}" is reserved by SOMACollection')
         self._add_object(soma)
+        self._add_to_value_indices(soma)
 
     # ----------------------------------------------------------------
     def remove(self, soma: SOMA) -> None:
         """
-        Removes a `SOMA` from the `SOMACollection`.
+        Removes a `SOMA` from the `SOMACollection`, and its values from the indices.
         """
         self._remove_object(soma)
+        self.obs_value_index.remove_soma(soma.name)
+        self.var_value_index.remove_soma(soma.name)
+
+    # ----------------------------------------------------------------
+    def rebuild_value_indices(self) -> None:
+        """
+        Re-indexes the `obs` and `var` values of all the SOMAs in the collection: e.g. for
+        collections populated before the indices existed.
+        """
+        for soma in self:
+            self._add_to_value_indices(soma)
+
+    # ----------------------------------------------------------------
+    def _add_to_value_indices(self, soma: SOMA) -> None:
+        """
+        Helper method for `add` and `rebuild_value_indices`.
+        """
+        for index, dataframe in [
+            (self.obs_value_index, soma.obs),
+            (self.var_value_index, soma.var),
+        ]:
+            is_new_index = not index.exists()
+            index.add_soma(soma.name, dataframe)
+            if is_new_index:
+                self._add_object(index)
+
+    # ----------------------------------------------------------------
+    def somas_having(
+        self,
+        obs_labels_to_values: Optional[Dict[str, List]] = None,
+        var_labels_to_values: Optional[Dict[str, List]] = None,
+    ) -> List[str]:
+        """
+        Returns the names of the SOMAs which, for each `obs` column named in
+        `obs_labels_to_values`, have at least one of the values listed for it -- and likewise for
+        `var`. For example, `soco.somas_having({"cell_type": ["B cell", "T cell"]}, {"var_id":
+        ["MT-CO3"]})`. This is answered from the value indices, without reading any SOMA's
+        `obs` or `var`.
+        """
+        names = set(self._get_member_names())
+        for index, labels_to_values in [
+            (self.obs_value_index, obs_labels_to_values),
+            (self.var_value_index, var_labels_to_values),
+        ]:
+            if labels_to_values is None:
+                continue
+            for label, values in labels_to_values.items():
+                names &= set(index.lookup(label, values)["soma_name"])
+        return [name for name in self._get_member_names() if name in names]
+
+    # ----------------------------------------------------------------
+    def _get_member_names_to_uris(self) -> Dict[str, str]:
+        """
+        As for `TileDBGroup`, but leaving out the value indices, so that the members are just the
+        SOMAs.
+        """
+        return {
+            name: uri
+            for name, uri in super()._get_member_names_to_uris().items()
+            if name not in _VALUE_INDEX_NAMES
+        }
 
     # ----------------------------------------------------------------
     def __iter__(self) -> List[SOMA]:
@@ -74,6 +165,8 @@ class SOMACollection(TileDBGroup):
         """
         Implements `name in soco`
         """
+        if name in _VALUE_INDEX_NAMES:
+            return False
         with self._open("r") as G:
             return name in G
 
@@ -98,6 +191,8 @@ class SOMACollection(TileDBGroup):
         Returns a `SOMA` element at the given name within the group, or `None` if no such
         member exists.  Overloads the `[...]` operator.
         """
+        if name in _VALUE_INDEX_NAMES:
+            return None
 
         with self._open("r") as G:
             try:
@@ -111,3 +206,233 @@ class SOMACollection(TileDBGroup):
                 )
 
             return SOMA(uri=obj.uri, name=name, parent=self)
+
+    # ----------------------------------------------------------------
+    def map(
+        self,
+        func: Callable[[SOMA], Any],
+        names: Optional[List[str]] = None,
+        max_workers: Optional[int] = None,
+        use_processes: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Calls `func(soma)` for each `SOMA` in the collection, or each one named in `names`, with up
+        to `max_workers` -- by default, the number of CPUs -- running at a time. Returns a dict
+        from SOMA name to result, in collection order. An exception from any call is re-raised.
+
+        :param use_processes: Run on a pool of worker processes rather than threads. Threads suit
+        most queries, since TileDB does its I/O and decompression with the GIL released; processes
+        suit a `func` which does heavy Python-level work on what it reads. With processes, `func`
+        and its result must be picklable -- e.g. `func` must be a module-level function or a
+        `functools.partial` of one -- and each worker opens its `SOMA` with the collection's
+        `SOMAOptions` and TileDB config.
+        """
+        names_to_uris = self._get_member_names_to_uris()
+        if names is None:
+            names = list(names_to_uris.keys())
+        for name in names:
+            if name not in names_to_uris:
+                raise Exception(f'SOMA "{name}" not found in {self.uri}')
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+
+        if use_processes:
+            # Workers are spawned rather than forked, since TileDB contexts in the parent, with
+            # their thread pools, don't survive a fork; and since contexts can't be sent across
+            # processes, each worker makes its own from the config.
+            ctx = tiledb.default_ctx() if self._ctx is None else self._ctx
+            config = {key: value for key, value in ctx.config().items()}
+            executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            with executor:
+                futures = {
+                    name: executor.submit(
+                        _map_one_in_worker,
+                        func,
+                        names_to_uris[name],
+                        name,
+                        self._soma_options,
+                        config,
+                    )
+                    for name in names
+                }
+                return {name: future.result() for name, future in futures.items()}
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                name: executor.submit(
+                    func, SOMA(uri=names_to_uris[name], name=name, parent=self)
+                )
+                for name in names
+            }
+            return {name: future.result() for name, future in futures.items()}
+
+    # ----------------------------------------------------------------
+    def query(
+        self,
+        obs_filter: Optional[str] = None,
+        var_filter: Optional[str] = None,
+        X_layer: Optional[str] = "data",
+        columns: Optional[Dict[str, List[str]]] = None,
+        names: Optional[List[str]] = None,
+        max_workers: Optional[int] = None,
+        use_processes: bool = False,
+        source_column: str = "soma_name",
+    ) -> Optional[ad.AnnData]:
+        """
+        Runs `SOMA.query` on each `SOMA` in the collection, or each one named in `names`, in
+        parallel as for `map`, and concatenates the results into a single `AnnData`, or returns
+        `None` if nothing matched. Each SOMA is required to have the columns named in the filters
+        and in `columns`.
+
+        The `obs` rows get a `source_column` column holding the name of the SOMA they came from;
+        `obs_id` values are kept as they are, even if the same ID is found in more than one SOMA.
+        The `var` rows are the union of those from all the SOMAs, with `X` zero-filled for `var`
+        absent from a given SOMA, and `var` columns kept only where all the SOMAs agree.
+        """
+        if self._verbose:
+            s = util.get_start_stamp()
+            print(f"{self._indent}START  SOMACollection.query {self.uri}")
+
+        func = functools.partial(
+            SOMA.query,
+            obs_filter=obs_filter,
+            var_filter=var_filter,
+            X_layer=X_layer,
+            columns=columns,
+        )
+        results = self.map(func, names, max_workers, use_processes)
+        results = {
+            name: result for name, result in results.items() if result is not None
+        }
+
+        if len(results) == 0:
+            retval = None
+        else:
+            retval = ad.concat(
+                results,
+                join="outer",
+                merge="same",
+                label=source_column,
+                fill_value=0,
+            )
+
+        if self._verbose:
+            print(
+                util.format_elapsed(
+                    s, f"{self._indent}FINISH SOMACollection.query {self.uri}"
+                )
+            )
+
+        return retval
+
+    # ----------------------------------------------------------------
+    def query_obs(
+        self,
+        obs_filter: Optional[str] = None,
+        columns: Optional[List[str]] = None,
+        names: Optional[List[str]] = None,
+        max_workers: Optional[int] = None,
+        use_processes: bool = False,
+        source_column: str = "soma_name",
+    ) -> pa.Table:
+        """
+        Like `query`, but reads only `obs`, returning the matching rows from all the SOMAs as one
+        Arrow table having an `obs_id` column, a `source_column` column, and the named `columns`
+        -- or, if `columns` is `None`, the union of all the SOMAs' `obs` columns, null-filled where
+        absent.
+        """
+        return self._query_annotation(
+            "obs", obs_filter, columns, names, max_workers, use_processes, source_column
+        )
+
+    # ----------------------------------------------------------------
+    def query_var(
+        self,
+        var_filter: Optional[str] = None,
+        columns: Optional[List[str]] = None,
+        names: Optional[List[str]] = None,
+        max_workers: Optional[int] = None,
+        use_processes: bool = False,
+        source_column: str = "soma_name",
+    ) -> pa.Table:
+        """
+        Like `query_obs`, but for `var`.
+        """
+        return self._query_annotation(
+            "var", var_filter, columns, names, max_workers, use_processes, source_column
+        )
+
+    # ----------------------------------------------------------------
+    def _query_annotation(
+        self,
+        which: str,
+        query_string: Optional[str],
+        columns: Optional[List[str]],
+        names: Optional[List[str]],
+        max_workers: Optional[int],
+        use_processes: bool,
+        source_column: str,
+    ) -> pa.Table:
+        """
+        Helper method for `query_obs` and `query_var`.
+        """
+        assert which in ("obs", "var")
+        func = functools.partial(
+            _query_annotation_one,
+            which=which,
+            query_string=query_string,
+            columns=columns,
+        )
+        results = self.map(func, names, max_workers, use_processes)
+
+        dfs = []
+        for name, df in results.items():
+            df.insert(0, source_column, name)
+            dfs.append(df)
+        if len(dfs) == 0:
+            df = pd.DataFrame({which + "_id": [], source_column: []})
+        else:
+            df = pd.concat(dfs)
+            df.index.name = which + "_id"
+            df.reset_index(inplace=True)
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+
+# Group-member names used by the collection itself, which are not SOMAs.
+_VALUE_INDEX_NAMES = ["obs_value_index", "var_value_index"]
+
+
+# ----------------------------------------------------------------
+# These are module-level, rather than closures, so that they can be sent to worker processes.
+
+
+def _map_one_in_worker(
+    func: Callable[[SOMA], Any],
+    uri: str,
+    name: str,
+    soma_options: SOMAOptions,
+    config: Dict[str, str],
+) -> Any:
+    """
+    Runs one call for `SOMACollection.map` in a worker process.
+    """
+    soma = SOMA(
+        uri=uri,
+        name=name,
+        soma_options=soma_options,
+        verbose=False,
+        config=tiledb.Config(config),
+    )
+    return func(soma)
+
+
+def _query_annotation_one(
+    soma: SOMA, which: str, query_string: Optional[str], columns: Optional[List[str]]
+) -> pd.DataFrame:
+    """
+    Runs one `obs` or `var` read for `SOMACollection.query_obs` or `SOMACollection.query_var`.
+    """
+    dataframe = soma.obs if which == "obs" else soma.var
+    return dataframe._filter_select(query_string, columns)
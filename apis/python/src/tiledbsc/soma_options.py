@@ -1,4 +1,4 @@
-from typing import List, Dict
+from typing import Optional, List, Dict
 
 
 class SOMAOptions:
@@ -14,10 +14,25 @@ class SOMAOptions:
     X_capacity: int
     X_tile_order: str
     X_cell_order: str
+    X_dim_layout: str
     string_dim_zstd_level: int
     write_X_chunked: bool
     goal_chunk_nnz: int
+    write_X_queue_depth: int
+    X_read_batch_obs: int
+    X_read_buffer_bytes: Optional[int]
+    joinid_point_read_max_ids: int
     member_uris_are_relative: bool
+    cache_handles: bool
+    cache_ttl_seconds: Optional[float]
+    read_via_libtiledbsc: bool
+    read_memory_budget_bytes: Optional[int]
+    column_stats_max_distinct_values: int
+    dictionary_encode_categoricals: bool
+    annotation_string_dtype: str
+    ingest_max_workers: Optional[int]
+    ingest_memory_budget_bytes: Optional[int]
+    annotation_matrix_layout: str
 
     def __init__(
         self,
@@ -26,17 +41,50 @@ class SOMAOptions:
         X_capacity=100000,
         X_tile_order="row-major",
         X_cell_order="row-major",
+        X_dim_layout="string",  # "string" for obs_id/var_id dims; "joinid" for int64 dims keyed by obs/var joinids
         string_dim_zstd_level=22,  # https://github.com/single-cell-data/TileDB-SingleCell/issues/27
         write_X_chunked=True,
         goal_chunk_nnz=20_000_000,
+        write_X_queue_depth=2,  # Chunks prepared ahead of the one being written; 0 for no overlap
+        X_read_batch_obs=10_000,  # Rows per batch for AssayMatrix.iter_csr
+        X_read_buffer_bytes=None,  # Per-buffer read size for AssayMatrix.iter_csr; None for the TileDB-Py default
+        joinid_point_read_max_ids=1000,  # obs/var IDs up to which their joinids are point-read; past it, one scan of all is cheaper
         member_uris_are_relative=None,  # Allows relocatability for local disk / S3, and correct behavior for TileDB Cloud
+        cache_handles=False,  # Keep one read handle, plus metadata/member snapshots, per object; see HandleCache
+        cache_ttl_seconds=None,  # Age after which cached handles are reopened; None for no expiry
+        read_via_libtiledbsc=False,  # Zero-copy Arrow reads for dim_select, if pytiledbsc is installed
+        read_memory_budget_bytes=None,  # Per-submission buffer cap for those reads; None for the libtiledbsc default
+        column_stats_max_distinct_values=64,  # obs/var columns with up to this many values have them listed in the stats
+        dictionary_encode_categoricals=True,  # Store categorical obs/var columns of strings as codes plus categories
+        annotation_string_dtype="object",  # obs/var string columns read back as "object" (str) or "string[pyarrow]"
+        ingest_max_workers=None,  # SOMA members written at once by from_anndata; None for the CPU count, up to 4
+        ingest_memory_budget_bytes=None,  # Cap on the total size of the members being written at once; None for no cap
+        annotation_matrix_layout="sparse",  # obsm/varm as "sparse" (an attribute per column, by obs_id/var_id) or "dense" (joinid x column)
     ):
         self.obs_extent = obs_extent
         self.var_extent = var_extent
         self.X_capacity = X_capacity
         self.X_tile_order = X_tile_order
         self.X_cell_order = X_cell_order
+        assert X_dim_layout in ("string", "joinid")
+        self.X_dim_layout = X_dim_layout
         self.string_dim_zstd_level = string_dim_zstd_level
         self.write_X_chunked = write_X_chunked
         self.goal_chunk_nnz = goal_chunk_nnz
+        self.write_X_queue_depth = write_X_queue_depth
+        self.X_read_batch_obs = X_read_batch_obs
+        self.X_read_buffer_bytes = X_read_buffer_bytes
+        self.joinid_point_read_max_ids = joinid_point_read_max_ids
         self.member_uris_are_relative = member_uris_are_relative
+        self.cache_handles = cache_handles
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.read_via_libtiledbsc = read_via_libtiledbsc
+        self.read_memory_budget_bytes = read_memory_budget_bytes
+        self.column_stats_max_distinct_values = column_stats_max_distinct_values
+        self.dictionary_encode_categoricals = dictionary_encode_categoricals
+        assert annotation_string_dtype in ("object", "string[pyarrow]")
+        self.annotation_string_dtype = annotation_string_dtype
+        self.ingest_max_workers = ingest_max_workers
+        self.ingest_memory_budget_bytes = ingest_memory_budget_bytes
+        assert annotation_matrix_layout in ("sparse", "dense")
+        self.annotation_matrix_layout = annotation_matrix_layout
@@ -3,7 +3,9 @@ import tiledbsc.util_tiledb
 from .soma_options import SOMAOptions
 from .tiledb_object import TileDBObject
 
-from typing import Optional, List, Dict
+import pyarrow as pa
+
+from typing import Optional, List, Dict, Any, Iterator
 
 
 class TileDBArray(TileDBObject):
@@ -38,13 +40,93 @@ class TileDBArray(TileDBObject):
         This is just a convenience wrapper allowing 'with self._open() as A: ...' rather than
         'with tiledb.open(self.uri) as A: ...'.
         """
-        assert mode in ["w", "r"]
+        assert mode in ["w", "r", "d"]
         # This works in either 'with self._open() as A:' or 'A = self._open(); ...; A.close().  The
         # reason is that with-as invokes our return value's __enter__ on return from this method,
         # and our return value's __exit__ on exit from the body of the with-block. The tiledb
         # array object does both of those things. (And if it didn't, we'd get a runtime AttributeError
         # on with-as, flagging the non-existence of the __enter__ or __exit__.)
-        return tiledb.open(self.uri, mode=mode, ctx=self._ctx)
+        if mode in ["w", "d"]:
+            # Cached read handles won't see what's about to be written or deleted.
+            self._handle_cache.invalidate(self.uri)
+            return tiledb.open(self.uri, mode=mode, ctx=self._ctx)
+        if self._handle_cache.enabled:
+            return self._handle_cache.handle(self.uri, self._open_for_read)
+        return self._open_for_read()
+
+    def _open_for_read(self, ctx: Optional[tiledb.Ctx] = None):
+        """
+        Opens the array for read, at the timestamp set by `reopen`, if any. The `ctx` defaults to
+        our own.
+        """
+        return tiledb.open(
+            self.uri,
+            mode="r",
+            ctx=self._ctx if ctx is None else ctx,
+            timestamp=self._handle_cache.timestamp,
+        )
+
+    def _uses_arrow_reader(self) -> bool:
+        """
+        Tells whether reads should go through libtiledbsc's zero-copy Arrow reader rather than
+        TileDB-Py: that is, if `SOMAOptions(read_via_libtiledbsc=True)` is set, the `pytiledbsc`
+        module is importable, and no `reopen` timestamp is in effect.
+        """
+        return (
+            self._soma_options.read_via_libtiledbsc
+            and tiledbsc.util_tiledb.pytiledbsc is not None
+            and self._handle_cache.timestamp is None
+        )
+
+    def _read_arrow_table(self, columns: List[str], points: Dict[str, Any]) -> pa.Table:
+        """
+        Reads the named dimensions and attributes using libtiledbsc's `ManagedQuery`. The
+        returned `pyarrow.Table` wraps the buffers the query read into, without copying them. The
+        `points` dict maps dimension names to the coordinates to select along them; dimensions not
+        in it are read in full.
+        """
+        mq = self._managed_query(columns, points)
+        return mq.execute().to_arrow().select(columns)
+
+    def _iter_arrow_tables(
+        self, columns: List[str], points: Dict[str, Any]
+    ) -> Iterator[pa.Table]:
+        """
+        Like `_read_arrow_table`, but yields one table per query submission, each from buffers of at
+        most `SOMAOptions.read_memory_budget_bytes`, so that the read is done in bounded memory.
+        """
+        mq = self._managed_query(columns, points)
+        while True:
+            result = mq.next_batch()
+            if result is None:
+                return
+            yield result.to_arrow().select(columns)
+
+    def _managed_query(self, columns: List[str], points: Dict[str, Any]):
+        """
+        Helper for `_read_arrow_table` and `_iter_arrow_tables`.
+        """
+        mq = tiledbsc.util_tiledb.pytiledbsc.ManagedQuery(
+            self.uri, **self._libtiledbsc_kwargs()
+        )
+        mq.select_columns(columns)
+        for dim_name, coords in points.items():
+            mq.select_points(dim_name, list(coords))
+        return mq
+
+    def _libtiledbsc_kwargs(self) -> Dict[str, Any]:
+        """
+        Returns the TileDB config, and the memory budget if set, as keyword arguments for the
+        `pytiledbsc` query constructors.
+        """
+        # Objects constructed without a ctx use TileDB's default one.
+        ctx = tiledb.default_ctx() if self._ctx is None else self._ctx
+        kwargs: Dict[str, Any] = {
+            "config": {key: value for key, value in ctx.config().items()}
+        }
+        if self._soma_options.read_memory_budget_bytes is not None:
+            kwargs["memory_budget"] = self._soma_options.read_memory_budget_bytes
+        return kwargs
 
     def exists(self) -> bool:
         """
@@ -52,7 +134,9 @@ class TileDBArray(TileDBObject):
         object has not yet been populated, e.g. before calling `from_anndata` -- or, if the
         SOMA has been populated but doesn't have this member (e.g. not all SOMAs have a `varp`).
         """
-        return tiledb.array_exists(self.uri)
+        return self._handle_cache.snapshot(
+            self.uri, "exists", lambda: tiledb.array_exists(self.uri)
+        )
 
     def tiledb_array_schema(self):
         """
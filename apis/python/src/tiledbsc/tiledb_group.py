@@ -53,7 +53,11 @@ class TileDBGroup(TileDBObject):
         object has not yet been populated, e.g. before calling `from_anndata` -- or, if the
         SOMA has been populated but doesn't have this member (e.g. not all SOMAs have a `varp`).
         """
-        return tiledb.object_type(self.uri, ctx=self._ctx) == "group"
+        return self._handle_cache.snapshot(
+            self.uri,
+            "exists",
+            lambda: tiledb.object_type(self.uri, ctx=self._ctx) == "group",
+        )
 
     def _create(self):
         """
@@ -107,10 +111,31 @@ class TileDBGroup(TileDBObject):
         It works asa `with self._open() as G:` as well as `G = self._open(); ...; G.close()`.
         """
         assert mode in ("r", "w")
-        if mode == "r" and not self.exists():
+        if mode == "w":
+            # Cached read handles won't see what's about to be written.
+            self._handle_cache.invalidate(self.uri)
+            return tiledb.Group(self.uri, mode="w", ctx=self._ctx)
+        if not self.exists():
             raise Exception(f"Does not exist: {self.uri}")
         # This works in with-open-as contexts because tiledb.Group has __enter__ and __exit__ methods.
-        return tiledb.Group(self.uri, mode=mode, ctx=self._ctx)
+        if self._handle_cache.enabled:
+            return self._handle_cache.handle(self.uri, self._open_for_read)
+        return self._open_for_read()
+
+    def _open_for_read(self):
+        """
+        Opens the group for read, at the timestamp set by `reopen`, if any.
+        """
+        ctx = self._ctx
+        timestamp = self._handle_cache.timestamp
+        if timestamp is not None:
+            # tiledb.Group takes no timestamp argument; time-travel is done by config instead.
+            if ctx is None:
+                ctx = tiledb.default_ctx()
+            config = tiledb.Config(ctx.config().dict())
+            config["sm.group.timestamp_end"] = str(timestamp)
+            ctx = tiledb.Ctx(config)
+        return tiledb.Group(self.uri, mode="r", ctx=ctx)
 
     def _add_object(self, obj: TileDBObject):
         """
@@ -131,16 +156,23 @@ class TileDBGroup(TileDBObject):
         * If `None`, then we select `relative=False` if the URI starts with `tiledb://`, else we
         select `relative=True`. This is the default.
         """
+        self._add_objects([obj])
+
+    def _add_objects(self, objs: List[TileDBObject]):
+        """
+        Like `_add_object`, for several members at once, in a single write to the group.
+        """
         if not self.exists():
             self._create()
-        relative = self._soma_options.member_uris_are_relative
-        child_uri = obj.uri
-        if relative is None:
-            relative = not child_uri.startswith("tiledb://")
-        if relative:
-            child_uri = obj.name
         with self._open("w") as G:
-            G.add(uri=child_uri, relative=relative, name=obj.name)
+            for obj in objs:
+                relative = self._soma_options.member_uris_are_relative
+                child_uri = obj.uri
+                if relative is None:
+                    relative = not child_uri.startswith("tiledb://")
+                if relative:
+                    child_uri = obj.name
+                G.add(uri=child_uri, relative=relative, name=obj.name)
 
     def _remove_object(self, obj: TileDBObject):
         with self._open("w") as G:
@@ -165,6 +197,13 @@ class TileDBGroup(TileDBObject):
         Like `_get_member_names()` and `_get_member_uris`, but returns a dict mapping from
         member name to member URI.
         """
+        return dict(
+            self._handle_cache.snapshot(
+                self.uri, "members", self._read_member_names_to_uris
+            )
+        )
+
+    def _read_member_names_to_uris(self) -> Dict[str, str]:
         with self._open("r") as G:
             return {O.name: O.uri for O in G}
 
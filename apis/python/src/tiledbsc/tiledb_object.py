@@ -1,5 +1,6 @@
 import tiledb
 from .soma_options import SOMAOptions
+from .handle_cache import HandleCache
 
 from typing import Optional, List, Dict
 
@@ -18,6 +19,7 @@ class TileDBObject:
     _soma_options: SOMAOptions
     _verbose: bool
     _ctx: Optional[tiledb.Ctx]
+    _handle_cache: HandleCache
 
     _indent: str  # for display strings
 
@@ -55,12 +57,20 @@ class TileDBObject:
             self._verbose = parent._verbose
             self._ctx = parent._ctx
             self._indent = parent._indent + "  "
+            self._handle_cache = parent._handle_cache
 
         if os.getenv("TILEDBSC_PY_SUPPRESS_VERBOSE") != None:
             self._verbose = False
 
         if self._soma_options is None:
             self._soma_options = SOMAOptions()
+
+        # One cache is shared by a top-level object and everything beneath it.
+        if parent is None:
+            self._handle_cache = HandleCache(
+                enabled=self._soma_options.cache_handles,
+                ttl_seconds=self._soma_options.cache_ttl_seconds,
+            )
         # Null ctx is OK if that's what they wanted (e.g. not doing any TileDB-Cloud ops).
 
     def _object_type(self):
@@ -81,10 +91,31 @@ class TileDBObject:
                 f"Internal error: expected _object_type {self._object_type()} but found {found} at {self.uri}."
             )
 
+    def invalidate_cache(self) -> None:
+        """
+        Drops all cached handles and snapshots -- see `SOMAOptions.cache_handles` -- for this object
+        and the others sharing its cache: for a `SOMA`, all its members. Use this to see writes made
+        by other processes.
+        """
+        self._handle_cache.invalidate()
+
+    def reopen(self, timestamp: Optional[int] = None) -> None:
+        """
+        Re-opens this object, and the others sharing its cache, as of the given TileDB timestamp
+        (milliseconds since the epoch) -- or at the latest state, if `timestamp` is `None`. This
+        applies to subsequent reads whether or not `SOMAOptions.cache_handles` is set.
+        """
+        self._handle_cache.reopen(timestamp)
+
     def metadata(self) -> Dict:
         """
         Returns metadata from the group/array as a dict.
         """
+        return dict(
+            self._handle_cache.snapshot(self.uri, "metadata", self._read_metadata)
+        )
+
+    def _read_metadata(self) -> Dict:
         with self._open("r") as O:
             # The _open method is implemented by TileDBArray and TileDBGroup
             return dict(O.meta)
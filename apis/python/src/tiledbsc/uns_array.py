@@ -201,7 +201,7 @@ class UnsArray(TileDBArray):
         d0 = mat_coo.row
         d1 = mat_coo.col
 
-        with tiledb.open(self.uri, mode="w", ctx=self._ctx) as A:
+        with self._open("w") as A:
             A[d0, d1] = mat_coo.data
 
     # ----------------------------------------------------------------
@@ -217,7 +217,7 @@ class UnsArray(TileDBArray):
             s2 = util.get_start_stamp()
             print(f"{self._indent}START  read {self.uri}")
 
-        with tiledb.open(self.uri, ctx=self._ctx) as A:
+        with self._open() as A:
             df = pd.DataFrame(A[:])
             retval = df.to_numpy()
 
@@ -5,9 +5,13 @@ import anndata as ad
 import numpy
 import scipy
 import pandas as pd
+import pyarrow as pa
 
+import collections
+import concurrent.futures
+import threading
 import time
-from typing import Optional, List, Union
+from typing import Optional, List, Tuple, Union, Callable, Iterable, Iterator, Any
 
 # ----------------------------------------------------------------
 def is_local_path(path: str) -> bool:
@@ -42,83 +46,261 @@ def format_elapsed(start_stamp, message: str):
 
 
 # ----------------------------------------------------------------
-def _find_csr_chunk_size(
+def _get_csr_chunk_bounds(
     mat: scipy.sparse.csr_matrix,
-    permutation: list,
-    start_row_index: int,
+    permutation: numpy.ndarray,
     goal_chunk_nnz: int,
-):
+) -> List[Tuple[int, int]]:
     """
-    Given a CSR matrix and a start row index, returns the number of rows with cumulative NNZ as
+    Given a CSR matrix, returns the full list of `(lo, hi)` row-chunk bounds with cumulative NNZ as
     desired. Context is chunked-COO ingest of larger CSR matrices: if mat is say 8000x9000 but
     sparse, maybe we'll read rows 0:45 as one chunk and convert that to COO and ingest, then maybe
-    rows 46:78 as a second chunk and convert that to COO and ingest, and so on.
+    rows 45:78 as a second chunk and convert that to COO and ingest, and so on.
     :param mat: The input CSR matrix.
     :param permutation: Cursor-indices to access the CSR matrix, so it will be traversed in sort order.
-    :param start_row_index: the row index at which to start a chunk.
-    :param goal_chunk_nnz: Desired number of non-zero array entries for the chunk.
+    :param goal_chunk_nnz: Desired number of non-zero array entries for each chunk.
     """
-    chunk_size = 1
-    sum_nnz = 0
-    for row_index in range(start_row_index, mat.shape[0]):
-        sum_nnz += mat[permutation[row_index]].nnz
-        if sum_nnz > goal_chunk_nnz:
-            break
-        chunk_size += 1
-
-    return chunk_size
+    nnz_per_row = numpy.diff(mat.indptr)[permutation]
+    return _get_chunk_bounds(nnz_per_row, goal_chunk_nnz)
 
 
 # ----------------------------------------------------------------
-# This function is very similar to _find_csr_chunk_size. The code is largely repeated, and this is
+# This function is very similar to _get_csr_chunk_bounds. The code is largely repeated, and this is
 # intentional.  Here we err on the side of increased readability, at the expense of line-count.
-def _find_csc_chunk_size(
+def _get_csc_chunk_bounds(
     mat: scipy.sparse.csc_matrix,
-    permutation: list,
-    start_col_index: int,
+    permutation: numpy.ndarray,
     goal_chunk_nnz: int,
-):
+) -> List[Tuple[int, int]]:
     """
-    Given a CSC matrix and a start column index, returns the number of columns with cumulative nnz as
-    desired. Context is chunked-COO ingest of larger CSC matrices: if mat is say 8000x9000 but
-    sparse, maybe we'll read columns 0:45 as one chunk and convert that to COO and ingest, then maybe
-    columns 46:78 as a second chunk and convert that to COO and ingest, and so on.
+    Given a CSC matrix, returns the full list of `(lo, hi)` column-chunk bounds with cumulative NNZ
+    as desired. Context is chunked-COO ingest of larger CSC matrices: if mat is say 8000x9000 but
+    sparse, maybe we'll read columns 0:45 as one chunk and convert that to COO and ingest, then
+    maybe columns 45:78 as a second chunk and convert that to COO and ingest, and so on.
     :param mat: The input CSC matrix.
     :param permutation: Cursor-indices to access the CSC matrix, so it will be traversed in sort order.
-    :param start_col_index: the column index at which to start a chunk.
-    :param goal_chunk_nnz: Desired number of non-zero array entries for the chunk.
+    :param goal_chunk_nnz: Desired number of non-zero array entries for each chunk.
+    """
+    nnz_per_col = numpy.diff(mat.indptr)[permutation]
+    return _get_chunk_bounds(nnz_per_col, goal_chunk_nnz)
+
+
+# ----------------------------------------------------------------
+def _get_chunk_bounds(
+    nnz_per_slice: numpy.ndarray, goal_chunk_nnz: int
+) -> List[Tuple[int, int]]:
     """
-    chunk_size = 1
-    sum_nnz = 0
-    for col_index in range(start_col_index, mat.shape[1]):
-        sum_nnz += mat[:, permutation[col_index]].nnz
-        if sum_nnz > goal_chunk_nnz:
-            break
-        chunk_size += 1
+    Splits a sequence of rows (or columns) having the given NNZ counts into contiguous `(lo, hi)`
+    chunks, lo inclusive and hi exclusive, each having as many slices as fit within
+    `goal_chunk_nnz` -- but at least one, even if that one slice alone is over the goal.
 
-    return chunk_size
+    Example: with NNZ counts [3, 1, 4, 1, 5, 9, 2, 6] and goal 8, the cumulative NNZ is
+    [3, 4, 8, 9, 14, 23, 25, 31] and the chunks are [(0, 3), (3, 5), (5, 6), (6, 8)].
+    """
+    cumulative_nnz = numpy.cumsum(nnz_per_slice, dtype=numpy.int64)
+    n = len(cumulative_nnz)
+    bounds = []
+    lo = 0
+    nnz_before_lo = 0
+    while lo < n:
+        hi = int(
+            numpy.searchsorted(
+                cumulative_nnz, nnz_before_lo + goal_chunk_nnz, side="right"
+            )
+        )
+        hi = max(hi, lo + 1)
+        bounds.append((lo, hi))
+        nnz_before_lo = cumulative_nnz[hi - 1]
+        lo = hi
+    return bounds
 
 
 # ----------------------------------------------------------------
-def _get_sort_and_permutation(lst: list):
+def _run_ahead(
+    func: Callable, args_iter: Iterable[tuple], queue_depth: int
+) -> Iterator:
     """
-    Sorts a list, returned the sorted list along with a permutation-index list which can be used for
-    cursored access to data which was indexed by the unsorted list. Nominally for chunking of CSR
-    matrices into TileDB which needs sorted string dimension-values for efficient fragmentation.
+    Yields `func(*args)` for each `args` tuple from `args_iter`, in order. With positive
+    `queue_depth`, up to that many results are computed ahead of the consumer on a thread pool --
+    e.g. preparing the next chunks of a chunked ingest while the current chunk is being written to
+    TileDB. With zero `queue_depth`, each result is computed inline when the consumer asks for it.
     """
-    # Example input: x=['E','A','C','D','B']
+    if queue_depth <= 0:
+        for args in args_iter:
+            yield func(*args)
+        return
 
-    # e.g. [('E', 0), ('A', 1), ('C', 2), ('D', 3), ('B', 4)]
-    lst_and_indices = [(e, i) for i, e in enumerate(lst)]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=queue_depth) as executor:
+        futures = collections.deque()
+        for args in args_iter:
+            futures.append(executor.submit(func, *args))
+            if len(futures) > queue_depth:
+                yield futures.popleft().result()
+        while len(futures) > 0:
+            yield futures.popleft().result()
 
-    # e.g. [('A', 1), ('B', 4), ('C', 2), ('D', 3), ('E', 0)]
-    lst_and_indices.sort(key=lambda pair: pair[0])
 
-    # e.g. ['A' 'B' 'C' 'D' 'E']
-    # and  [1, 4, 2, 3, 0]
-    lst_sorted = [e for e, i in lst_and_indices]
-    permutation = [i for e, i in lst_and_indices]
-    return (lst_sorted, permutation)
+# ----------------------------------------------------------------
+def _run_with_memory_budget(
+    tasks: List[Tuple[int, Callable[[], Any]]],
+    max_workers: int,
+    memory_budget_bytes: Optional[int],
+) -> List[Any]:
+    """
+    Runs the tasks -- pairs of an estimated memory cost in bytes, and a function of no arguments --
+    on up to `max_workers` threads, and returns their results in order. A task is started only once
+    its cost, along with those of the tasks already running, fits within `memory_budget_bytes`; a
+    task costing more than the whole budget is run once nothing else is. With a `None` budget, only
+    the worker count limits concurrency. If a task raises, tasks not yet started are cancelled, and
+    the exception is re-raised once the running ones have finished.
+    """
+    if max_workers <= 1 or len(tasks) <= 1:
+        return [func() for _, func in tasks]
+
+    condition = threading.Condition()
+    bytes_in_use = [0]
+
+    def run(cost: int, func: Callable[[], Any]) -> Any:
+        if memory_budget_bytes is not None:
+            with condition:
+                condition.wait_for(
+                    lambda: bytes_in_use[0] == 0
+                    or bytes_in_use[0] + cost <= memory_budget_bytes
+                )
+                bytes_in_use[0] += cost
+        try:
+            return func()
+        finally:
+            if memory_budget_bytes is not None:
+                with condition:
+                    bytes_in_use[0] -= cost
+                    condition.notify_all()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(run, cost, func) for cost, func in tasks]
+        try:
+            return [future.result() for future in futures]
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+
+# ----------------------------------------------------------------
+def _get_nbytes(x) -> int:
+    """
+    Returns the in-memory size of a matrix or dataframe about to be written, for
+    `_run_with_memory_budget`, or 0 if it is of a type not known here.
+    """
+    if isinstance(x, pd.DataFrame):
+        return int(x.memory_usage(index=True).sum())
+    if scipy.sparse.issparse(x):
+        # Values, and their row and column indices.
+        return x.nnz * (x.dtype.itemsize + 16)
+    if isinstance(x, numpy.ndarray):
+        return x.nbytes
+    return 0
+
+
+# ----------------------------------------------------------------
+def _get_sort_and_permutation(labels) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Sorts labels, returning the sorted labels along with a permutation-index array which can be
+    used for cursored access to data which was indexed by the unsorted labels. Nominally for
+    chunking of CSR matrices into TileDB which needs sorted string dimension-values for efficient
+    fragmentation.
+
+    The labels may be a list, `numpy.ndarray`, or `pandas.Index`. They're sorted via a fixed-width
+    NumPy string array, with no per-label Python objects: as bytes when they're ASCII -- the usual
+    case for barcodes and gene names -- else as Unicode. Either way the order is that of TileDB's
+    ASCII dimensions. The sort is stable, so duplicate labels keep their original relative order.
+    The sorted labels are returned as a NumPy array of the same element type as the input.
+    """
+    # Example input: pd.Index(['E','A','C','D','B'])
+    labels = numpy.asarray(labels)
+
+    sort_keys = labels
+    if labels.dtype == object:
+        try:
+            # e.g. array([b'E', b'A', b'C', b'D', b'B'], dtype='|S1')
+            sort_keys = labels.astype("S")
+        except UnicodeEncodeError:
+            sort_keys = labels.astype(str)
+
+    # e.g. array([1, 4, 2, 3, 0])
+    # and  array(['A', 'B', 'C', 'D', 'E'], dtype=object)
+    permutation = numpy.argsort(sort_keys, kind="stable")
+    return (labels[permutation], permutation)
+
+
+# ----------------------------------------------------------------
+def _get_consecutive_runs(sorted_values: numpy.ndarray) -> List[Tuple[int, int]]:
+    """
+    Splits sorted integers into runs of consecutive values, returning `(lo, hi)` index bounds for
+    each, with `lo` inclusive and `hi` exclusive. Nominally for reading and writing dense arrays by
+    joinid, one subarray per run. Example: `[3, 4, 5, 9, 10]` gives `[(0, 3), (3, 5)]`.
+    """
+    n = len(sorted_values)
+    if n == 0:
+        return []
+    breaks = numpy.flatnonzero(numpy.diff(sorted_values) != 1) + 1
+    return list(zip([0] + breaks.tolist(), breaks.tolist() + [n]))
+
+
+# ----------------------------------------------------------------
+def _decode_utf8(values, string_dtype: str = "object"):
+    """
+    Decodes UTF-8 `bytes` -- as TileDB-Py reads back ASCII attributes and dimensions -- to strings
+    in bulk. `values` may be a NumPy object array of `bytes`, or an Arrow binary array: either way,
+    the conversion and UTF-8 validation are done by Arrow, in native code over the offsets and data
+    buffers, rather than by a Python call per element.
+
+    :param string_dtype: `"object"` to return a NumPy object array of `str`; `"string[pyarrow]"` to
+    return a Pandas Arrow-backed string array, which makes no per-element Python objects at all.
+    """
+    if isinstance(values, pa.ChunkedArray):
+        values = values.combine_chunks()
+    elif not isinstance(values, pa.Array):
+        # TileDB-Py gives empty results as fixed-width bytes, which Arrow won't take as binary.
+        if isinstance(values, numpy.ndarray) and values.dtype.kind == "S":
+            values = values.astype(object)
+        values = pa.array(values, type=pa.large_binary())
+    if string_dtype == "string[pyarrow]":
+        return pd.arrays.ArrowStringArray(pa.chunked_array([values.cast(pa.string())]))
+    # Rather than `to_numpy`, since this makes one `str` per distinct value, not one per element.
+    return values.cast(pa.large_string()).to_pandas().to_numpy()
+
+
+# ----------------------------------------------------------------
+def _arrow_table_to_dataframe(
+    table: pa.Table, string_dtype: str = "object"
+) -> pd.DataFrame:
+    """
+    Converts an Arrow table to a Pandas dataframe, decoding its binary columns as UTF-8 on the way,
+    as for `_decode_utf8`, so that no `bytes` objects are made for them.
+    """
+    string_type = (
+        pa.string() if string_dtype == "string[pyarrow]" else pa.large_string()
+    )
+    for i, field in enumerate(table.schema):
+        if pa.types.is_binary(field.type) or pa.types.is_large_binary(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(string_type))
+    if string_dtype == "string[pyarrow]":
+        return table.to_pandas(
+            types_mapper={pa.string(): pd.StringDtype("pyarrow")}.get
+        )
+    return table.to_pandas()
+
+
+# ----------------------------------------------------------------
+def _is_string_categorical(x) -> bool:
+    """
+    Tells whether a Pandas series is categorical with string categories. In `obs` and `var`, these
+    are stored dictionary-encoded: see `AnnotationDataFrame.from_dataframe`.
+    """
+    return pd.api.types.is_categorical_dtype(x.dtype) and pd.api.types.infer_dtype(
+        x.cat.categories
+    ) in ("string", "empty")
 
 
 # ----------------------------------------------------------------
@@ -209,15 +391,17 @@ def X_and_ids_to_sparse_matrix(
     conversion to anndata, we need make a sparse COO/IJV-format array where the indices are
     not strings but ints, matching the obs and var labels.
     The `return_as` parameter must be one of `"csr"` or `"csc"`.
+
+    For X stored with joinid dimensions (see `SOMAOptions.X_dim_layout`), the "labels" are the
+    int64 joinids of the desired rows and columns, and the mapping is an integer join.
     """
 
     assert isinstance(Xdf, pd.DataFrame)
-    assert len(row_labels) > 0 and isinstance(row_labels[0], str)
-    assert len(col_labels) > 0 and isinstance(col_labels[0], str)
+    assert len(row_labels) > 0
+    assert len(col_labels) > 0
     assert return_as in ["csr", "csc"]
 
     # Now we need to convert from TileDB's string indices to CSR integer indices.
-    # Make a dict from string dimension values to integer indices.
     #
     # Example: suppose the sparse matrix looks like:
     #
@@ -235,30 +419,61 @@ def X_and_ids_to_sparse_matrix(
     #
     #   0,0,4 0,3,3 1,0,5 1,2,6 2,3,2 2,1,1 3,0,8 3,1,7
     #
-    # In order to accomplish this, we need to map ['A','B','C','D'] to [0,1,2,3] via {'A':0,
-    # 'B':1, 'C':2, 'D':3} and similarly for the other dimension.
-    row_labels_to_indices = dict(zip(row_labels, [i for i, e in enumerate(row_labels)]))
-    col_labels_to_indices = dict(zip(col_labels, [i for i, e in enumerate(col_labels)]))
-
-    # Make the obs_id/var_id indices addressable as columns.
-    Xdf.reset_index(inplace=True)
+    # In order to accomplish this, we need to map ['A','B','C','D'] to [0,1,2,3] and similarly for
+    # the other dimension. We do this via pandas categoricals: the categories are the labels and
+    # the codes are the integer indices we want. This is done in bulk, without making a Python
+    # object per nonzero, which matters a great deal for large X.
+    obs_indices = _dim_values_to_indices(Xdf, row_dim_name, row_labels)
+    var_indices = _dim_values_to_indices(Xdf, col_dim_name, col_labels)
+    values = Xdf[attr_name].to_numpy()
 
-    obs_indices = [row_labels_to_indices[row_label] for row_label in Xdf[row_dim_name]]
-    var_indices = [col_labels_to_indices[col_label] for col_label in Xdf[col_dim_name]]
-
-    xcol = list(Xdf[attr_name])
-    ocol = list(obs_indices)
-    vcol = list(var_indices)
     # Explicitly write the shape to avoid trimming in case of all-zeroes rows/columns when
     # people do dim-selects.
+    coo = scipy.sparse.coo_matrix(
+        (values, (obs_indices, var_indices)), shape=(len(row_labels), len(col_labels))
+    )
     if return_as == "csr":
-        return scipy.sparse.csr_matrix(
-            (xcol, (ocol, vcol)), shape=(len(row_labels), len(col_labels))
-        )
+        return coo.tocsr()
     else:
-        return scipy.sparse.csc_matrix(
-            (xcol, (ocol, vcol)), shape=(len(row_labels), len(col_labels))
+        return coo.tocsc()
+
+
+# ----------------------------------------------------------------
+def _dim_values_to_indices(
+    df: pd.DataFrame, dim_name: str, all_labels
+) -> numpy.ndarray:
+    """
+    Maps the named column -- or index level, if the dataframe has been indexed by it as
+    `AssayMatrix.dim_select` does -- to integer positions within `all_labels`. For an index level,
+    only the distinct level values are looked up; the per-row result is then a take on the level
+    codes. Either way there is no `reset_index`, which would copy the entire dataframe.
+    """
+    if dim_name in df.columns:
+        return _labels_to_indices(df[dim_name].to_numpy(), all_labels)
+    index = df.index
+    if isinstance(index, pd.MultiIndex):
+        # Levels may retain values with no rows, e.g. after the dataframe has been subsetted.
+        index = index.remove_unused_levels()
+        level_number = index.names.index(dim_name)
+        level_indices = _labels_to_indices(index.levels[level_number], all_labels)
+        return level_indices[index.codes[level_number]]
+    return _labels_to_indices(index.to_numpy(), all_labels)
+
+
+# ----------------------------------------------------------------
+def _labels_to_indices(labels, all_labels) -> numpy.ndarray:
+    """
+    Maps each of `labels` to its integer position within `all_labels`, which must be unique.
+    Returns an `int32` array when that suffices for the number of labels, else `int64`.
+    Raises an exception if any of `labels` is not present in `all_labels`.
+    """
+    codes = pd.Categorical(labels, categories=all_labels).codes
+    if len(codes) > 0 and codes.min() < 0:
+        raise Exception(
+            "Internal error: matrix coordinates are not all present in the dimension labels."
         )
+    dtype = numpy.int32 if len(all_labels) < 2**31 else numpy.int64
+    return codes.astype(dtype, copy=False)
 
 
 # ================================================================
@@ -304,6 +519,10 @@ class ETATracker:
         Does a linear regression on all chunks done so far and estimates time to completion.
         Returns ETA seconds as a number.
         """
+        # Nothing left to do. This also avoids a degenerate fit when the only chunk is the last.
+        if self.chunk_percents[-1] >= 100.0:
+            return 0.0
+
         # Linear regression where x is cumulative seconds and y is percent done.
         x = numpy.array(self.cumulative_seconds)
         y = numpy.array(self.chunk_percents)
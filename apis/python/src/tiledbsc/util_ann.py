@@ -251,19 +251,8 @@ def _decategoricalize(anndata: ad.AnnData):
     Performs an in-place typecast into types that TileDB can persist.
     """
 
-    # If the DataFrame contains only an index, just use it as is.
-    if len(anndata.obs.columns) > 0:
-        new_obs = pd.DataFrame.from_dict(
-            {k: util._to_tiledb_supported_array_type(v) for k, v in anndata.obs.items()}
-        )
-    else:
-        new_obs = anndata.obs
-    if len(anndata.var.columns) > 0:
-        new_var = pd.DataFrame.from_dict(
-            {k: util._to_tiledb_supported_array_type(v) for k, v in anndata.var.items()}
-        )
-    else:
-        new_var = anndata.var
+    new_obs = _decategoricalize_dataframe(anndata.obs)
+    new_var = _decategoricalize_dataframe(anndata.var)
 
     for key in anndata.obsm.keys():
         anndata.obsm[key] = util._to_tiledb_supported_array_type(anndata.obsm[key])
@@ -283,15 +272,7 @@ def _decategoricalize(anndata: ad.AnnData):
         # have obs or obsm or obsp -- so, it turns out to be simpler to just repeat ourselves a
         # little.
 
-        new_raw_var = anndata.raw.var
-        # If the DataFrame contains only an index, just use it as is.
-        if len(anndata.raw.var.columns) > 0:
-            new_raw_var = pd.DataFrame.from_dict(
-                {
-                    k: util._to_tiledb_supported_array_type(v)
-                    for k, v in anndata.raw.var.items()
-                }
-            )
+        new_raw_var = _decategoricalize_dataframe(anndata.raw.var)
 
         for key in anndata.raw.varm.keys():
             anndata.raw.varm[key] = util._to_tiledb_supported_array_type(
@@ -319,3 +300,41 @@ def _decategoricalize(anndata: ad.AnnData):
     )
 
     return anndata
+
+
+# ----------------------------------------------------------------
+def _decategoricalize_dataframe(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns the `obs`, `var`, or `raw.var` dataframe with its columns typecast into types that
+    TileDB can persist. See `_decategoricalize`. Categoricals of strings are left as they are,
+    for `AnnotationDataFrame.from_dataframe` to store dictionary-encoded.
+    """
+    # If the DataFrame contains only an index, just use it as is.
+    if len(df.columns) == 0:
+        return df
+    return pd.DataFrame.from_dict(
+        {
+            k: v
+            if util._is_string_categorical(v)
+            else util._to_tiledb_supported_array_type(v)
+            for k, v in df.items()
+        }
+    )
+
+
+# ----------------------------------------------------------------
+def _without_backed_matrices(anndata: ad.AnnData) -> ad.AnnData:
+    """
+    For an `AnnData` read with `backed="r"`: returns an in-memory `AnnData` with everything except
+    `X` and `raw`, which stay in the file. Those are for the caller to handle -- see
+    `tiledbsc.io.from_h5ad`.
+    """
+    return ad.AnnData(
+        obs=anndata.obs.copy(),
+        var=anndata.var.copy(),
+        obsm=dict(anndata.obsm),
+        varm=dict(anndata.varm),
+        obsp=dict(anndata.obsp),
+        varp=dict(anndata.varp),
+        uns=dict(anndata.uns),
+    )
@@ -1,14 +1,50 @@
 #!/usr/bin/env python
 
+import ast
+import bisect
 import sys, os
+import numpy as np
+import pandas as pd
 import tiledb
-from typing import Optional
+from typing import Optional, List, Tuple, Dict, Any
+
+try:
+    # The libtiledbsc Python bindings are built separately, along with libtiledbsc itself.
+    import pytiledbsc
+except ImportError:
+    pytiledbsc = None
 
 # This is for group/array metadata we write, to help nested-structured traversals (especially those
 # that start at the SOMACollection level) confidently navigate with a minimum of introspection on
 # group contents.
 SOMA_OBJECT_TYPE_METADATA_KEY = "__soma_object_type__"
 
+# These are array metadata we write at ingest time, and keep up to date on subsequent writes, so
+# that `.shape()` and `.nnz()` are metadata reads rather than data scans. `obs` and `var` record
+# their row count; `X`, `obsp`, and `varp` record their number of stored cells.
+SOMA_NUM_ROWS_METADATA_KEY = "__soma_num_rows__"
+SOMA_NNZ_METADATA_KEY = "__soma_nnz__"
+
+# `obs` and `var` record per-column statistics, as JSON, at ingest time; see `_get_column_stats`.
+SOMA_COLUMN_STATS_METADATA_KEY = "__soma_column_stats__"
+
+# `obs` and `var` store categorical columns of strings as their integer codes, -1 for null, and
+# record the categories, as JSON, in this metadata; see `AnnotationDataFrame.from_dataframe`.
+SOMA_CATEGORIES_METADATA_KEY = "__soma_categories__"
+
+# With `SOMAOptions(X_dim_layout="joinid")`, obs and var carry this int64 attribute, mapping each
+# obs_id/var_id to the dense integer coordinate used for it in `X`, `obsp`, and `varp`. Likewise
+# for `obsm` and `varm` with `SOMAOptions(annotation_matrix_layout="dense")`.
+SOMA_JOINID_ATTR_NAME = "soma_joinid"
+
+# With `SOMAOptions(annotation_matrix_layout="dense")`, obsm/varm arrays are dense over obs/var
+# joinid and this second, column dimension.
+ANNOTATION_MATRIX_COLUMN_DIM_NAME = "column"
+
+# The approximate nearest-neighbor index for an obsm/varm member is a group beside it within
+# obsm/varm, named for it with this suffix. See `AnnotationMatrixKNNIndex`.
+KNN_INDEX_NAME_SUFFIX = "__knn_index"
+
 # ================================================================
 def show_single_cell_group(soma_uri: str, ctx: Optional[tiledb.Ctx] = None):
     """
@@ -82,3 +118,446 @@ def show_tiledb_group_array_schemas(uri: str, ctx: Optional[tiledb.Ctx] = None):
                     print(A.schema)
             else:
                 print("Skipping element type", element.type)
+
+
+# ================================================================
+def _query_condition_kwargs(query_string: str) -> Dict[str, Any]:
+    """
+    Returns the keyword argument for `A.query(...)` which pushes the `QueryCondition` string down
+    into TileDB. TileDB-Py has changed this more than once: `attr_cond=QueryCondition(...)`, then
+    `cond=QueryCondition(...)` from 0.17, then `cond="..."` from 0.19, with the older forms
+    rejected outright.
+    """
+    version = tuple(int(e) for e in tiledb.__version__.split(".")[:2])
+    if version >= (0, 19):
+        return {"cond": query_string}
+    if version >= (0, 17):
+        return {"cond": tiledb.QueryCondition(query_string)}
+    return {"attr_cond": tiledb.QueryCondition(query_string)}
+
+
+# ================================================================
+_COMPARISON_OPS = {
+    ast.Lt: "<",
+    ast.LtE: "<=",
+    ast.Gt: ">",
+    ast.GtE: ">=",
+    ast.Eq: "==",
+    ast.NotEq: "!=",
+}
+# For `10 < nCount_RNA` and the like: the same comparison with the operands swapped.
+_SWAPPED_OPS = {"<": ">", "<=": ">=", ">": "<", ">=": "<=", "==": "==", "!=": "!="}
+
+
+def _query_string_to_triples(query_string: str) -> Optional[List[Tuple[str, str, Any]]]:
+    """
+    Converts a TileDB-Py `QueryCondition` string such as `cell_type == "blood" and nCount_RNA > 10`
+    to a list of `(attribute name, operator, value)` triples, to be ANDed, for the libtiledbsc query
+    classes. Returns `None` for conditions which aren't simple comparisons joined by `and`/`&` --
+    e.g. `or`, `in`, or chained comparisons -- which are left to TileDB-Py.
+    """
+    try:
+        tree = ast.parse(query_string.strip(), mode="eval")
+    except SyntaxError:
+        return None
+    triples: List[Tuple[str, str, Any]] = []
+    if not __append_triples(tree.body, triples):
+        return None
+    return triples
+
+
+def __append_triples(node, triples: List[Tuple[str, str, Any]]) -> bool:
+    """
+    Helper for `_query_string_to_triples`. Returns false if the node is not convertible.
+    """
+    if isinstance(node, ast.BoolOp) and isinstance(node.op, ast.And):
+        return all(__append_triples(value, triples) for value in node.values)
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitAnd):
+        return __append_triples(node.left, triples) and __append_triples(
+            node.right, triples
+        )
+    if not isinstance(node, ast.Compare) or len(node.ops) != 1:
+        return False
+    op = _COMPARISON_OPS.get(type(node.ops[0]))
+    if op is None:
+        return False
+
+    left, right = node.left, node.comparators[0]
+    name = __attribute_name(left)
+    if name is not None:
+        value = __literal_value(right)
+    else:
+        name = __attribute_name(right)
+        value = __literal_value(left)
+        op = _SWAPPED_OPS[op]
+    if name is None or value is None:
+        return False
+    triples.append((name, op, value))
+    return True
+
+
+def __attribute_name(node) -> Optional[str]:
+    """
+    Returns the attribute name for `name` or `attr("name")`, else `None`.
+    """
+    if isinstance(node, ast.Name):
+        return node.id
+    if (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Name)
+        and node.func.id == "attr"
+        and len(node.args) == 1
+        and isinstance(node.args[0], ast.Constant)
+        and isinstance(node.args[0].value, str)
+    ):
+        return node.args[0].value
+    return None
+
+
+def __literal_value(node) -> Any:
+    """
+    Returns the value of a string or numeric literal, possibly negated or written as `val(...)`,
+    else `None`.
+    """
+    if (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Name)
+        and node.func.id == "val"
+        and len(node.args) == 1
+    ):
+        node = node.args[0]
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        value = __literal_value(node.operand)
+        if isinstance(value, str) or value is None:
+            return None
+        return -value
+    if isinstance(node, ast.Constant) and not isinstance(node.value, bool):
+        if isinstance(node.value, (str, int, float)):
+            return node.value
+    return None
+
+
+# ================================================================
+def _get_column_stats(
+    dataframe: pd.DataFrame, max_distinct_values: int
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Computes statistics for each column of a dataframe about to be written to `obs` or `var`, for
+    storage as array metadata. For each column these are:
+
+    * `null_count`: the number of null values.
+    * `approx_distinct_count`: the number of distinct non-null values. This is exact for a single
+      write, and an estimate once the stats for more than one write have been merged.
+    * `min` and `max`, for numeric and string columns having any non-null values -- except ordered
+      categoricals, whose order is not that of their values.
+    * `distinct_values`, the list of distinct non-null values, for numeric and string columns
+      having no more than `max_distinct_values` of them.
+    """
+    stats = {}
+    for name in dataframe.columns:
+        series = dataframe[name]
+        non_null = series.dropna()
+        # As a NumPy array since, e.g., for categoricals `unique` returns another categorical.
+        values = np.asarray(non_null.unique())
+        column_stats: Dict[str, Any] = {
+            "null_count": int(len(series) - len(non_null)),
+            "approx_distinct_count": int(len(values)),
+        }
+        if len(values) > 0:
+            kind = pd.api.types.infer_dtype(values, skipna=True)
+            if kind in (
+                "string",
+                "integer",
+                "floating",
+                "mixed-integer-float",
+                "boolean",
+            ):
+                values = [__to_json_scalar(value) for value in values]
+                if not (
+                    pd.api.types.is_categorical_dtype(series.dtype)
+                    and series.cat.ordered
+                ):
+                    column_stats["min"] = min(values)
+                    column_stats["max"] = max(values)
+                if len(values) <= max_distinct_values:
+                    column_stats["distinct_values"] = sorted(values)
+        stats[name] = column_stats
+    return stats
+
+
+def __to_json_scalar(value) -> Any:
+    """
+    Converts a NumPy scalar to the corresponding Python one.
+    """
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _merge_column_stats(
+    old_stats: Dict[str, Dict[str, Any]],
+    new_stats: Dict[str, Dict[str, Any]],
+    max_distinct_values: int,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Combines stored column stats with those for a subsequent write. Since that write may
+    overwrite existing rows, the result describes a superset of the stored values -- which is
+    what the pruning in `_triples_are_unsatisfiable` needs.
+    """
+    stats = {}
+    for name, new in new_stats.items():
+        old = old_stats.get(name)
+        if old is None or old["approx_distinct_count"] == 0:
+            stats[name] = new
+            continue
+        if new["approx_distinct_count"] == 0:
+            stats[name] = dict(old, null_count=old["null_count"] + new["null_count"])
+            continue
+
+        merged: Dict[str, Any] = {
+            "null_count": old["null_count"] + new["null_count"],
+            "approx_distinct_count": max(
+                old["approx_distinct_count"], new["approx_distinct_count"]
+            ),
+        }
+        if "min" in old and "min" in new and __are_comparable(old["min"], new["min"]):
+            merged["min"] = min(old["min"], new["min"])
+            merged["max"] = max(old["max"], new["max"])
+        old_values = old.get("distinct_values")
+        new_values = new.get("distinct_values")
+        if old_values and new_values and __are_comparable(old_values[0], new_values[0]):
+            values = sorted(set(old_values) | set(new_values))
+            merged["approx_distinct_count"] = len(values)
+            if len(values) <= max_distinct_values:
+                merged["distinct_values"] = values
+        stats[name] = merged
+    return stats
+
+
+def __are_comparable(a, b) -> bool:
+    """
+    Tells whether two values are both strings, or both numbers.
+    """
+    return isinstance(a, str) == isinstance(b, str)
+
+
+# ----------------------------------------------------------------
+def _triples_are_unsatisfiable(
+    triples: List[Tuple[str, str, Any]], stats: Dict[str, Dict[str, Any]]
+) -> bool:
+    """
+    Tells whether the column stats show that no row can satisfy all the triples, as from
+    `_query_string_to_triples`: e.g. `nCount_RNA > 1000` where the largest `nCount_RNA` value is
+    500, or `cell_type == "neuron"` where that's not among the distinct values. Returns false
+    whenever the stats don't settle the matter.
+    """
+    for name, op, value in triples:
+        column_stats = stats.get(name)
+        if column_stats is None:
+            continue
+        if column_stats["approx_distinct_count"] == 0 and op != "!=":
+            # All nulls, which satisfy no comparisons.
+            return True
+        distinct_values = column_stats.get("distinct_values")
+        if (
+            op == "=="
+            and distinct_values
+            and __are_comparable(distinct_values[0], value)
+        ):
+            if value not in distinct_values:
+                return True
+        if "min" not in column_stats or not __are_comparable(
+            column_stats["min"], value
+        ):
+            continue
+        lo, hi = column_stats["min"], column_stats["max"]
+        if op == "==":
+            if value < lo or value > hi:
+                return True
+        elif op == "!=":
+            if lo == hi == value and column_stats["null_count"] == 0:
+                return True
+        elif op == "<" and lo >= value:
+            return True
+        elif op == "<=" and lo > value:
+            return True
+        elif op == ">" and hi <= value:
+            return True
+        elif op == ">=" and hi < value:
+            return True
+    return False
+
+
+def _order_triples_by_selectivity(
+    triples: List[Tuple[str, str, Any]], stats: Dict[str, Dict[str, Any]]
+) -> List[Tuple[str, str, Any]]:
+    """
+    Sorts the triples so that those estimated, from the column stats, to match the fewest rows come
+    first. The sort is stable, so triples without stats keep their relative order.
+    """
+    return sorted(triples, key=lambda triple: __estimate_selectivity(triple, stats))
+
+
+def __estimate_selectivity(
+    triple: Tuple[str, str, Any], stats: Dict[str, Dict[str, Any]]
+) -> float:
+    """
+    Estimates the fraction of rows matching the triple: by distinct count for equality, and by
+    the fraction of the min-max range selected for numeric ranges. Returns 0.5 when unknown.
+    """
+    name, op, value = triple
+    column_stats = stats.get(name)
+    if column_stats is None:
+        return 0.5
+    ndistinct = max(column_stats["approx_distinct_count"], 1)
+    if op == "==":
+        return 1.0 / ndistinct
+    if op == "!=":
+        return 1.0 - 1.0 / ndistinct
+    lo = column_stats.get("min")
+    hi = column_stats.get("max")
+    if isinstance(value, str) or isinstance(lo, str) or lo is None or hi <= lo:
+        return 0.5
+    if op in ("<", "<="):
+        fraction = (value - lo) / (hi - lo)
+    else:
+        fraction = (hi - value) / (hi - lo)
+    return min(max(fraction, 0.0), 1.0)
+
+
+def _triples_to_query_string(triples: List[Tuple[str, str, Any]]) -> str:
+    """
+    The inverse of `_query_string_to_triples`.
+    """
+    return " and ".join(f"attr({name!r}) {op} {value!r}" for name, op, value in triples)
+
+
+# ================================================================
+# A code which no row has, for comparisons against values which aren't among the categories: stored
+# codes are -1 for nulls, and non-negative otherwise.
+_ABSENT_CATEGORY_CODE = -2
+
+
+def _encode_categorical_query_string(
+    query_string: str, columns_to_categories: Dict[str, Dict[str, Any]]
+) -> str:
+    """
+    Rewrites a TileDB-Py `QueryCondition` string so that comparisons of dictionary-encoded
+    columns against strings -- `cell_type == "T cell"`, `cell_type in ["B cell", "T cell"]`, and
+    `<` and the like where the categories are ordered or sorted -- become comparisons of the codes
+    which are what is stored. The rest of the condition is left as written.
+
+    :param columns_to_categories: As recorded under `SOMA_CATEGORIES_METADATA_KEY`.
+    """
+    source = query_string.strip()
+    try:
+        tree = ast.parse(source, mode="eval")
+    except SyntaxError:
+        # Left for TileDB-Py to report.
+        return query_string
+    return __encode_categorical_node(tree.body, source, columns_to_categories)
+
+
+def __encode_categorical_node(
+    node, source: str, columns_to_categories: Dict[str, Dict[str, Any]]
+) -> str:
+    """
+    Helper for `_encode_categorical_query_string`.
+    """
+    if isinstance(node, ast.BoolOp):
+        op = " and " if isinstance(node.op, ast.And) else " or "
+        encoded_values = []
+        for value in node.values:
+            encoded = __encode_categorical_node(value, source, columns_to_categories)
+            # Comparisons bind more tightly than `and` and `or`, unless rewritten as a range.
+            if not isinstance(value, ast.Compare) or " and " in encoded:
+                encoded = f"({encoded})"
+            encoded_values.append(encoded)
+        return op.join(encoded_values)
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.BitAnd, ast.BitOr)):
+        op = " & " if isinstance(node.op, ast.BitAnd) else " | "
+        left = __encode_categorical_node(node.left, source, columns_to_categories)
+        right = __encode_categorical_node(node.right, source, columns_to_categories)
+        return f"({left}){op}({right})"
+    if isinstance(node, ast.Compare) and len(node.ops) == 1:
+        encoded = __encode_categorical_comparison(node, columns_to_categories)
+        if encoded is not None:
+            return encoded
+    return ast.get_source_segment(source, node)
+
+
+def __encode_categorical_comparison(
+    node, columns_to_categories: Dict[str, Dict[str, Any]]
+) -> Optional[str]:
+    """
+    Helper for `_encode_categorical_query_string`. Returns `None` if the comparison isn't of a
+    dictionary-encoded column against strings.
+    """
+    left, right = node.left, node.comparators[0]
+    if isinstance(node.ops[0], (ast.In, ast.NotIn)):
+        name = __attribute_name(left)
+        if name not in columns_to_categories:
+            return None
+        if not isinstance(right, (ast.List, ast.Tuple, ast.Set)):
+            return None
+        values = [__literal_value(element) for element in right.elts]
+        if not all(isinstance(value, str) for value in values):
+            return None
+        code_map = __get_category_codes(columns_to_categories[name])
+        codes = sorted({code_map[value] for value in values if value in code_map})
+        target = f"attr({name!r})"
+        if len(codes) == 0:
+            op = "==" if isinstance(node.ops[0], ast.In) else "!="
+            return f"{target} {op} {_ABSENT_CATEGORY_CODE}"
+        if isinstance(node.ops[0], ast.In):
+            return f"{target} in {codes}"
+        # TileDB-Py's QueryCondition doesn't support `not in`.
+        return " and ".join(f"{target} != {code}" for code in codes)
+
+    op = _COMPARISON_OPS.get(type(node.ops[0]))
+    if op is None:
+        return None
+    name = __attribute_name(left)
+    if name is not None:
+        value = __literal_value(right)
+    else:
+        name = __attribute_name(right)
+        value = __literal_value(left)
+        op = _SWAPPED_OPS[op]
+    if name not in columns_to_categories or not isinstance(value, str):
+        return None
+
+    entry = columns_to_categories[name]
+    categories = entry["categories"]
+    code = __get_category_codes(entry).get(value)
+    target = f"attr({name!r})"
+    if op in ("==", "!="):
+        return f"{target} {op} {_ABSENT_CATEGORY_CODE if code is None else code}"
+
+    # Ranges: the codes are the first at or past the value, for `<` and `>=`, else the first past it.
+    if entry["ordered"]:
+        if code is None:
+            raise Exception(
+                f'"{value}" is not among the categories of ordered column "{name}"'
+            )
+        bound = code if op in ("<", ">=") else code + 1
+    elif categories == sorted(categories):
+        if op in ("<", ">="):
+            bound = bisect.bisect_left(categories, value)
+        else:
+            bound = bisect.bisect_right(categories, value)
+    else:
+        raise Exception(
+            f'Range comparisons on column "{name}" need its categories to be ordered or sorted'
+        )
+    if op in ("<", "<="):
+        # Excluding nulls.
+        return f"{target} >= 0 and {target} < {bound}"
+    return f"{target} >= {bound}"
+
+
+def __get_category_codes(entry: Dict[str, Any]) -> Dict[str, int]:
+    """
+    Maps each category to its code.
+    """
+    return {category: code for code, category in enumerate(entry["categories"])}
@@ -0,0 +1,229 @@
+import tiledbsc
+import tiledbsc.io
+
+import anndata
+import numpy as np
+import tiledb
+
+import pytest
+from pathlib import Path
+
+HERE = Path(__file__).parent
+
+
+@pytest.fixture
+def adata():
+    return anndata.read_h5ad(HERE.parent / "anndata/pbmc-small.h5ad")
+
+
+def as_strings(df):
+    return df.sort_index().astype(str)
+
+
+@pytest.mark.parametrize(
+    "soma_options",
+    [
+        tiledbsc.SOMAOptions(),
+        tiledbsc.SOMAOptions(X_dim_layout="joinid", annotation_matrix_layout="dense"),
+    ],
+)
+def test_append_anndata(tmp_path, adata, soma_options):
+    full_soma = tiledbsc.SOMA(
+        (tmp_path / "full").as_posix(), soma_options=soma_options, verbose=False
+    )
+    tiledbsc.io.from_anndata(full_soma, adata.copy())
+
+    soma = tiledbsc.SOMA(
+        (tmp_path / "appended").as_posix(), soma_options=soma_options, verbose=False
+    )
+    tiledbsc.io.from_anndata(soma, adata[:30].copy())
+    soma.append_anndata(adata[30:55].copy())
+    soma.append_anndata(adata[55:].copy(), var_alignment="strict")
+
+    obs_ids = full_soma.obs.ids()
+    var_ids = full_soma.var.ids()
+    assert soma.n_obs == 80
+    assert sorted(soma.obs.ids()) == sorted(obs_ids)
+    assert soma.obs.shape() == soma.obs.shape(verify=True)
+    assert as_strings(soma.obs.df()).equals(as_strings(full_soma.obs.df()))
+    assert sorted(soma.var.ids()) == sorted(var_ids)
+
+    X = soma.X["data"]
+    assert X.nnz() == X.nnz(verify=True) == full_soma.X["data"].nnz()
+    assert (
+        X.csr(obs_ids, var_ids) != full_soma.X["data"].csr(obs_ids, var_ids)
+    ).nnz == 0
+    raw_var_ids = full_soma.raw.var.ids()
+    assert (
+        soma.raw.X["data"].csr(obs_ids, raw_var_ids)
+        != full_soma.raw.X["data"].csr(obs_ids, raw_var_ids)
+    ).nnz == 0
+
+    for name in ["X_pca", "X_tsne"]:
+        assert soma.obsm[name].uses_dense_layout() == (
+            soma_options.annotation_matrix_layout == "dense"
+        )
+        assert np.array_equal(
+            soma.obsm[name].to_numpy(obs_ids), full_soma.obsm[name].to_numpy(obs_ids)
+        )
+    # Each batch's obsp is written for its own cells.
+    batch_obs_ids = list(adata.obs_names[30:55])
+    distances = soma.obsp["distances"].csr(batch_obs_ids, batch_obs_ids)
+    assert (distances != adata[30:55].obsp["distances"]).nnz == 0
+
+
+def test_append_anndata_checks(tmp_path, adata):
+    soma = tiledbsc.SOMA(tmp_path.as_posix(), verbose=False)
+    with pytest.raises(Exception):
+        soma.append_anndata(adata[:30].copy())
+    tiledbsc.io.from_anndata(soma, adata[:30].copy())
+
+    # Repeated obs_ids, within the batch or with the SOMA.
+    with pytest.raises(Exception):
+        soma.append_anndata(adata[25:40].copy())
+    batch = adata[30:40].copy()
+    batch.obs_names = [batch.obs_names[0]] * 10
+    with pytest.raises(Exception):
+        soma.append_anndata(batch)
+
+    # Mismatched obs columns, obsm elements, and var_ids.
+    batch = adata[30:40].copy()
+    del batch.obs["groups"]
+    with pytest.raises(Exception):
+        soma.append_anndata(batch)
+    batch = adata[30:40].copy()
+    batch.obsm["X_pca"] = batch.obsm["X_pca"][:, :5]
+    with pytest.raises(Exception):
+        soma.append_anndata(batch)
+    batch = adata[30:40].copy()
+    del batch.obsm["X_tsne"]
+    with pytest.raises(Exception):
+        soma.append_anndata(batch)
+    with pytest.raises(Exception):
+        soma.append_anndata(adata[30:40, :15].copy(), var_alignment="strict")
+    with pytest.raises(Exception):
+        soma.append_anndata(adata[30:40].copy(), var_alignment="nonesuch")
+
+    # None of which wrote anything.
+    assert soma.n_obs == 30
+    assert soma.obs.shape(verify=True) == (30, 7)
+    assert soma.X["data"].nnz() == soma.X["data"].nnz(verify=True)
+
+
+def test_append_anndata_checks_types(tmp_path, adata):
+    # Integer X and obsm, which TileDB would silently truncate floats to.
+    first = adata[:30].copy()
+    first.X = np.rint(first.X).astype(np.int32)
+    first.obsm["X_tsne"] = np.rint(first.obsm["X_tsne"]).astype(np.int32)
+    soma = tiledbsc.SOMA(tmp_path.as_posix(), verbose=False)
+    tiledbsc.io.from_anndata(soma, first)
+
+    batch = adata[30:40].copy()
+    batch.obsm["X_tsne"] = np.rint(batch.obsm["X_tsne"]).astype(np.int64)
+    with pytest.raises(Exception):
+        soma.append_anndata(batch.copy())
+    batch.X = np.rint(batch.X).astype(np.int64)
+    batch.obsm["X_tsne"] = batch.obsm["X_tsne"] + 0.5
+    with pytest.raises(Exception):
+        soma.append_anndata(batch.copy())
+    assert soma.n_obs == 30
+
+    # Integers of another width are fine.
+    batch.obsm["X_tsne"] = np.rint(batch.obsm["X_tsne"]).astype(np.int64)
+    soma.append_anndata(batch)
+    assert soma.n_obs == 40
+
+
+def test_append_anndata_var_union(tmp_path, adata):
+    soma = tiledbsc.SOMA(tmp_path.as_posix(), verbose=False)
+    tiledbsc.io.from_anndata(soma, adata[:50].copy())
+
+    batch = adata[50:, 2:].copy()
+    batch.var_names = list(batch.var_names[:-2]) + ["NEWGENE1", "NEWGENE2"]
+    with pytest.raises(Exception):
+        soma.append_anndata(batch.copy(), var_alignment="strict")
+    # The new var rows would have no varm rows.
+    without_varm = batch.copy()
+    del without_varm.varm["PCs"]
+    with pytest.raises(Exception):
+        soma.append_anndata(without_varm)
+    soma.append_anndata(batch.copy())
+
+    var_ids = soma.var.ids()
+    assert sorted(var_ids) == sorted(list(adata.var_names) + ["NEWGENE1", "NEWGENE2"])
+    assert soma.var.shape(verify=True) == (22, 5)
+    assert soma.var.df(["NEWGENE1"]).loc["NEWGENE1", "vst.mean"] == (
+        batch.var.loc["NEWGENE1", "vst.mean"]
+    )
+
+    obs_ids = list(batch.obs_names)
+    X = soma.X["data"].csr(obs_ids, list(batch.var_names))
+    assert np.array_equal(X.toarray(), batch.X)
+    # Cells of the first batch have no values for the new genes.
+    assert soma.X["data"].csr(list(adata.obs_names[:50]), ["NEWGENE1"]).nnz == 0
+
+
+@pytest.mark.parametrize(
+    "soma_options",
+    [
+        tiledbsc.SOMAOptions(),
+        tiledbsc.SOMAOptions(X_dim_layout="joinid", annotation_matrix_layout="dense"),
+    ],
+)
+def test_append_anndata_var_union_varm(tmp_path, adata, soma_options):
+    # With a raw.varm element too.
+    raw = adata.raw.to_adata()
+    raw.varm["loadings"] = np.arange(raw.n_vars * 3, dtype=np.float64).reshape(-1, 3)
+    adata.raw = raw
+
+    # The first batch has some of the var rows, and some of the raw.var rows.
+    first = adata[:30, :10].copy()
+    first.raw = raw[:30, :100].copy()
+    soma = tiledbsc.SOMA(tmp_path.as_posix(), soma_options=soma_options, verbose=False)
+    tiledbsc.io.from_anndata(soma, first)
+
+    # Only the batch's varm rows for the new var rows are written.
+    batch = adata[30:].copy()
+    batch.varm["PCs"][:10] = 0
+    soma.append_anndata(batch)
+
+    result = tiledbsc.io.to_anndata(soma)
+    assert result.varm["PCs"].shape == (20, 19)
+    assert result.raw.varm["loadings"].shape == (raw.n_vars, 3)
+    assert np.array_equal(
+        soma.varm["PCs"].to_numpy(list(adata.var_names)), adata.varm["PCs"]
+    )
+    assert np.array_equal(
+        soma.raw.varm["loadings"].to_numpy(list(raw.var_names)),
+        raw.varm["loadings"],
+    )
+
+
+def test_append_anndata_knn_and_consolidate(tmp_path, adata):
+    soma = tiledbsc.SOMA(tmp_path.as_posix(), verbose=False)
+    tiledbsc.io.from_anndata(soma, adata[:40].copy())
+    soma.obsm.build_knn_index("X_pca", nlist=4, quantize=False)
+    index = soma.obsm["X_pca"].knn_index()
+    with index.centroids._open() as A:
+        centroids = A[:]["centroid"]
+
+    soma.append_anndata(adata[40:60].copy())
+    soma.append_anndata(adata[60:].copy(), consolidate=True)
+
+    for array in [soma.obs, soma.X["data"], soma.obsm["X_pca"], soma.raw.X["data"]]:
+        assert len(tiledb.array_fragments(array.uri)) == 1
+    assert soma.n_obs == 80
+    assert soma.X["data"].nnz() == soma.X["data"].nnz(verify=True)
+
+    # The index covers the appended cells, which were added to it without re-clustering.
+    index = soma.obsm["X_pca"].knn_index()
+    with index.centroids._open() as A:
+        assert np.array_equal(A[:]["centroid"], centroids)
+    with index._open() as G:
+        assert index._get_offsets(G).shape == (3, 5)
+        assert index._get_offsets(G)[-1, -1] == 80
+    assert "X_pca__knn_index" not in soma.obsm.keys()
+    matrix = soma.obsm["X_pca"].to_numpy(list(adata.obs_names))
+    ids, distances = soma.obsm["X_pca"].knn(matrix[70], k=1, nprobe=4)
+    assert ids[0] == adata.obs_names[70]
+    assert distances[0] == 0
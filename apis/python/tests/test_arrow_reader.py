@@ -0,0 +1,72 @@
+import tiledbsc
+import tiledbsc.io
+
+import anndata
+import pandas as pd
+
+import pytest
+from pathlib import Path
+
+# The libtiledbsc Python bindings are built separately, along with libtiledbsc itself.
+pytest.importorskip("pytiledbsc")
+
+HERE = Path(__file__).parent
+
+
+@pytest.fixture
+def adata():
+    return anndata.read_h5ad(HERE.parent / "anndata/pbmc-small.h5ad")
+
+
+def test_arrow_reader_dim_select(tmp_path, adata):
+    soma = tiledbsc.SOMA(tmp_path.as_posix(), verbose=False)
+    tiledbsc.io.from_anndata(soma, adata)
+    arrow_soma = tiledbsc.SOMA(
+        tmp_path.as_posix(),
+        soma_options=tiledbsc.SOMAOptions(read_via_libtiledbsc=True),
+        verbose=False,
+    )
+    assert arrow_soma.obs._uses_arrow_reader()
+
+    obs_ids = list(adata.obs.index[:5])
+    var_ids = list(adata.var.index[:7])
+
+    for ids in [None, obs_ids]:
+        expected = soma.obs.dim_select(ids).sort_index()
+        actual = arrow_soma.obs.dim_select(ids).sort_index()
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+        expected = soma.obs.dim_select(ids, ["nCount_RNA"]).sort_index()
+        actual = arrow_soma.obs.dim_select(ids, ["nCount_RNA"]).sort_index()
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+
+    for obs, var in [
+        (None, None),
+        (obs_ids, None),
+        (None, var_ids),
+        (obs_ids, var_ids),
+    ]:
+        expected = soma.X["data"].dim_select(obs, var).sort_index()
+        actual = arrow_soma.X["data"].dim_select(obs, var).sort_index()
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+
+
+def test_arrow_reader_batches(tmp_path, adata):
+    soma = tiledbsc.SOMA(tmp_path.as_posix(), verbose=False)
+    tiledbsc.io.from_anndata(soma, adata)
+    arrow_soma = tiledbsc.SOMA(
+        tmp_path.as_posix(),
+        soma_options=tiledbsc.SOMAOptions(
+            read_via_libtiledbsc=True, read_memory_budget_bytes=1 << 16
+        ),
+        verbose=False,
+    )
+    X = arrow_soma.X["data"]
+    columns = [X.row_dim_name, X.col_dim_name, X.attr_name]
+
+    tables = list(X._iter_arrow_tables(columns, {}))
+    assert len(tables) > 1
+    assert sum(table.num_rows for table in tables) == soma.X["data"].nnz(verify=True)
+    assert X._get_nnz_by_scan() == soma.X["data"].nnz(verify=True)
+
+    # Resubmission: the whole result, bigger than the budget, in one table
+    assert X._read_arrow_table(columns, {}).num_rows == soma.X["data"].nnz(verify=True)
@@ -1,6 +1,7 @@
 import anndata as ad
 import tiledb
-from tiledbsc import SOMA
+from tiledbsc import SOMA, SOMAOptions
+import tiledbsc.util
 import tiledbsc.io as io
 import pandas as pd
 import numpy as np
@@ -82,3 +83,38 @@ def test_readback(tmp_path):
         len(soma.obs.attribute_filter('cell_type=="blööd"', ["cell_type"])["cell_type"])
         == 4
     )
+    assert list(soma.obs.df(obs_ids)["cell_type"]) == cell_types
+
+
+def test_readback_string_dtype(tmp_path):
+    """
+    Validate bulk UTF-8 decode to Arrow-backed string columns.
+    """
+    obs = pd.DataFrame(
+        data={"cell_type": ["blööd", "lung", "α,β,γ"], "n": [1, 2, 3]},
+        index=["a", "b", "c"],
+    )
+    soma = SOMA(
+        tmp_path.as_posix(),
+        soma_options=SOMAOptions(annotation_string_dtype="string[pyarrow]"),
+        verbose=False,
+    )
+    soma.obs.from_dataframe(obs, extent=256)
+
+    df = soma.obs.df()
+    assert df["cell_type"].dtype == pd.StringDtype("pyarrow")
+    assert list(df["cell_type"]) == ["blööd", "lung", "α,β,γ"]
+    assert df["n"].dtype == np.int64
+    df = soma.obs.attribute_filter('cell_type == "α,β,γ"', ["cell_type"])
+    assert list(df.index) == ["c"]
+    assert sorted(soma.obs.ids()) == ["a", "b", "c"]
+
+
+def test_decode_utf8():
+    values = np.asarray(["blööd".encode(), b"", "α".encode()], dtype=object)
+    decoded = tiledbsc.util._decode_utf8(values)
+    assert decoded.dtype == object
+    assert list(decoded) == ["blööd", "", "α"]
+    assert list(tiledbsc.util._decode_utf8(np.asarray([], dtype=object))) == []
+    with pytest.raises(Exception):
+        tiledbsc.util._decode_utf8(np.asarray([b"\xff"], dtype=object))
@@ -0,0 +1,56 @@
+import tiledbsc
+import tiledbsc.io
+
+import anndata
+import numpy as np
+import scipy.sparse
+
+import pytest
+from pathlib import Path
+
+HERE = Path(__file__).parent
+
+
+@pytest.mark.parametrize(
+    "h5ad_name",
+    [
+        "pbmc-small.h5ad",
+        "pbmc-small-x-csr.h5ad",
+        "pbmc-small-x-csc.h5ad",
+        "pbmc-small-x-dense.h5ad",
+    ],
+)
+def test_backed_ingest(tmp_path, h5ad_name):
+    h5ad_path = HERE.parent / "anndata" / h5ad_name
+    # A small goal makes for many chunks.
+    soma_options = tiledbsc.SOMAOptions(goal_chunk_nnz=500)
+
+    soma = tiledbsc.SOMA(
+        (tmp_path / "in-memory").as_posix(), soma_options=soma_options, verbose=False
+    )
+    tiledbsc.io.from_h5ad(soma, h5ad_path)
+    backed_soma = tiledbsc.SOMA(
+        (tmp_path / "backed").as_posix(), soma_options=soma_options, verbose=False
+    )
+    tiledbsc.io.from_h5ad(backed_soma, h5ad_path, backed=True)
+
+    expected = anndata.read_h5ad(h5ad_path)
+    obs_ids = list(expected.obs_names)
+    var_ids = list(expected.var_names)
+    expected_X = scipy.sparse.csr_matrix(expected.X)
+
+    X = backed_soma.X["data"]
+    assert (X.csr(obs_ids, var_ids) != expected_X).nnz == 0
+    assert X.nnz(verify=True) == soma.X["data"].nnz()
+    assert backed_soma.obs.df().equals(soma.obs.df())
+    assert backed_soma.var.df().equals(soma.var.df())
+    assert backed_soma.obsm.keys() == soma.obsm.keys()
+
+    assert backed_soma.raw.exists() == soma.raw.exists()
+    if soma.raw.exists():
+        raw_var_ids = list(expected.raw.var_names)
+        assert (
+            backed_soma.raw.X["data"].csr(obs_ids, raw_var_ids)
+            != scipy.sparse.csr_matrix(expected.raw.X)
+        ).nnz == 0
+        assert backed_soma.raw.var.df().equals(soma.raw.var.df())
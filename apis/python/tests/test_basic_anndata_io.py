@@ -2,6 +2,7 @@ import anndata
 import tiledb
 import tiledbsc
 import tiledbsc.io
+import numpy as np
 
 import pytest
 import tempfile
@@ -184,3 +185,37 @@ def test_export_anndata(adata):
         assert readback.obsp[key].shape == orig.obsp[key].shape
     for key in orig.varp.keys():
         assert readback.varp[key].shape == orig.varp[key].shape
+
+    readback = tiledbsc.io.to_anndata(soma, columns={"obs": ["groups"]})
+    assert list(readback.obs.columns) == ["groups"]
+    assert readback.var.shape == orig.var.shape
+    assert readback.X.shape == orig.X.shape
+
+
+def test_import_anndata_concurrency(tmp_path, adata):
+    """
+    Members written one at a time, or concurrently within a memory budget, come out the same.
+    """
+    somas = []
+    for name, max_workers, budget in [("serial", 1, None), ("concurrent", 4, 20_000)]:
+        soma = tiledbsc.SOMA(
+            (tmp_path / name).as_posix(),
+            soma_options=tiledbsc.SOMAOptions(
+                ingest_max_workers=max_workers, ingest_memory_budget_bytes=budget
+            ),
+            verbose=False,
+        )
+        tiledbsc.io.from_anndata(soma, adata)
+        somas.append(soma)
+
+    serial, concurrent = somas
+    assert sorted(concurrent._get_member_names()) == sorted(serial._get_member_names())
+    for group_name in ["X", "obsm", "varm", "obsp", "varp", "raw", "uns"]:
+        assert sorted(getattr(concurrent, group_name)._get_member_names()) == sorted(
+            getattr(serial, group_name)._get_member_names()
+        )
+    expected = tiledbsc.io.to_anndata(serial)
+    actual = tiledbsc.io.to_anndata(concurrent)
+    assert (actual.X != expected.X).nnz == 0
+    for key in expected.obsm.keys():
+        assert np.array_equal(actual.obsm[key], expected.obsm[key])
@@ -0,0 +1,159 @@
+import tiledbsc
+import tiledbsc.util_tiledb
+
+import numpy as np
+import pandas as pd
+
+import pytest
+
+
+@pytest.fixture
+def obs():
+    return pd.DataFrame(
+        {
+            "cell_type": pd.Categorical(
+                ["T cell", "B cell", None, "T cell", "NK cell", "B cell"]
+            ),
+            "grade": pd.Categorical(
+                ["lo", "hi", "mid", "mid", "lo", "hi"],
+                categories=["lo", "mid", "hi"],
+                ordered=True,
+            ),
+            "n": [1, 2, 3, 4, 5, 6],
+        },
+        index=[f"cell{i}" for i in range(6)],
+    )
+
+
+def test_categoricals_roundtrip(tmp_path, obs):
+    soma = tiledbsc.SOMA(tmp_path.as_posix(), verbose=False)
+    soma.obs.from_dataframe(obs, extent=256)
+
+    # Stored as codes.
+    with soma.obs._open() as A:
+        assert A.schema.attr("cell_type").dtype == np.int32
+    assert soma.obs.categories()["grade"] == {
+        "categories": ["lo", "mid", "hi"],
+        "ordered": True,
+    }
+
+    df = soma.obs.df().loc[obs.index]
+    for column_name in ["cell_type", "grade"]:
+        assert df[column_name].dtype == obs[column_name].dtype
+        assert df[column_name].equals(obs[column_name])
+    assert (
+        soma.obs._filter_select("n > 4", ["grade"])["grade"].dtype == obs["grade"].dtype
+    )
+
+
+def test_categoricals_filter(tmp_path, obs):
+    soma = tiledbsc.SOMA(tmp_path.as_posix(), verbose=False)
+    soma.obs.from_dataframe(obs, extent=256)
+
+    def ids(query_string):
+        df = soma.obs.attribute_filter(query_string, [])
+        return [] if df is None else sorted(df.index)
+
+    def expected_ids(mask):
+        return sorted(obs.index[mask])
+
+    cell_type = obs["cell_type"]
+    grade = obs["grade"]
+    assert ids('cell_type == "T cell"') == expected_ids(cell_type == "T cell")
+    assert ids('"B cell" == cell_type and n > 1') == expected_ids(
+        (cell_type == "B cell") & (obs["n"] > 1)
+    )
+    assert ids('cell_type != "T cell"') == expected_ids(cell_type != "T cell")
+    assert ids('cell_type == "nonesuch"') == []
+    assert ids('cell_type in ["B cell", "NK cell"]') == expected_ids(
+        cell_type.isin(["B cell", "NK cell"])
+    )
+    # Nulls are not in any list of categories.
+    assert ids('cell_type not in ["B cell"]') == expected_ids(
+        ~cell_type.isin(["B cell"])
+    )
+    assert ids('cell_type not in ["B cell", "NK cell", "nonesuch"] and n > 1') == (
+        expected_ids(~cell_type.isin(["B cell", "NK cell"]) & (obs["n"] > 1))
+    )
+    assert ids('cell_type == "T cell" or n == 3') == expected_ids(
+        (cell_type == "T cell") | (obs["n"] == 3)
+    )
+    # Ranges follow category order, or sort order if unordered; nulls never match.
+    assert ids('grade >= "mid"') == expected_ids(grade >= "mid")
+    assert ids('grade < "hi" and n < 5') == expected_ids(
+        (grade < "hi") & (obs["n"] < 5)
+    )
+    assert ids('cell_type < "M"') == expected_ids(cell_type.astype(str) < "M")
+    with pytest.raises(Exception):
+        soma.obs.attribute_filter('grade < "nonesuch"', [])
+
+
+def test_categoricals_append(tmp_path, obs):
+    soma = tiledbsc.SOMA(tmp_path.as_posix(), verbose=False)
+    soma.obs.from_dataframe(obs.iloc[:3], extent=256)
+    more = obs.iloc[3:].copy()
+    more["cell_type"] = pd.Categorical(["Mono", "B cell", "T cell"])
+    soma.obs.from_dataframe(more, extent=256)
+
+    # Existing codes keep their meaning; new categories go after them.
+    categories = soma.obs.categories()["cell_type"]["categories"]
+    assert categories[:2] == list(obs["cell_type"].iloc[:3].cat.categories[:2])
+    assert categories[-1] == "Mono"
+
+    df = soma.obs.df()
+    expected = pd.concat(
+        [obs["cell_type"].iloc[:3].astype(object), more["cell_type"].astype(object)]
+    )
+    assert list(df["cell_type"].loc[expected.index].astype(object).fillna("-")) == list(
+        expected.fillna("-")
+    )
+    assert sorted(soma.obs.attribute_filter('cell_type == "B cell"', []).index) == [
+        "cell1",
+        "cell4",
+    ]
+
+
+def test_categoricals_not_encoded(tmp_path, obs):
+    soma = tiledbsc.SOMA(
+        tmp_path.as_posix(),
+        soma_options=tiledbsc.SOMAOptions(dictionary_encode_categoricals=False),
+        verbose=False,
+    )
+    soma.obs.from_dataframe(obs, extent=256)
+    assert soma.obs.categories() == {}
+    df = soma.obs.df().loc[obs.index]
+    assert list(df["cell_type"]) == list(obs["cell_type"].astype(str))
+    assert sorted(soma.obs.attribute_filter('cell_type == "T cell"', []).index) == [
+        "cell0",
+        "cell3",
+    ]
+
+
+def test_encode_categorical_query_string():
+    encode = tiledbsc.util_tiledb._encode_categorical_query_string
+    columns_to_categories = {
+        "c": {"categories": ["a", "b", "c"], "ordered": False},
+    }
+    assert encode('c == "b"', columns_to_categories) == "attr('c') == 1"
+    assert encode('c != "z"', columns_to_categories) == "attr('c') != -2"
+    assert (
+        encode('c in ["c", "a", "z"]', columns_to_categories) == "attr('c') in [0, 2]"
+    )
+    assert encode('c not in ["z"]', columns_to_categories) == "attr('c') != -2"
+    assert (
+        encode('c not in ["c", "a", "z"]', columns_to_categories)
+        == "attr('c') != 0 and attr('c') != 2"
+    )
+    assert (
+        encode('c not in ["a", "b"] or x > 1', columns_to_categories)
+        == "(attr('c') != 0 and attr('c') != 1) or x > 1"
+    )
+    assert (
+        encode('c <= "b"', columns_to_categories) == "attr('c') >= 0 and attr('c') < 2"
+    )
+    assert (
+        encode('(x > 1) & (c == "a")', columns_to_categories)
+        == "(x > 1) & (attr('c') == 0)"
+    )
+    # Left as written: other columns, and non-string values.
+    assert encode("x == 'a' and c == 1", columns_to_categories) == "x == 'a' and c == 1"
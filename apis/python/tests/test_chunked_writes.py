@@ -95,3 +95,40 @@ def test_chunked_writes(tmp_path):
         assert relerr_ok(xdf_unchunked.iloc[i].value, xdf_dense.iloc[i].value)
         assert relerr_ok(xdf_unchunked.iloc[i].value, xdf_csr.iloc[i].value)
         assert relerr_ok(xdf_unchunked.iloc[i].value, xdf_csc.iloc[i].value)
+
+
+@pytest.mark.parametrize("fmt", ["dense", "csr", "csc", "dataframe"])
+def test_chunked_annotation_matrix_writes(tmp_path, fmt):
+    """
+    Annotation matrices, dense, sparse, or dataframe, are written in row chunks and read back the
+    same, in dim-value order.
+    """
+    import numpy as np
+    import pandas as pd
+    import scipy.sparse
+
+    rng = np.random.default_rng(0)
+    dense = rng.random((37, 5))
+    dense[dense < 0.5] = 0
+    dim_values = np.asarray([f"cell{i:02d}" for i in rng.permutation(37)], dtype=object)
+    matrix = {
+        "dense": dense,
+        "csr": scipy.sparse.csr_matrix(dense),
+        "csc": scipy.sparse.csc_matrix(dense),
+        "dataframe": pd.DataFrame(dense, columns=list("abcde")),
+    }[fmt]
+
+    # 3 rows of 5 columns at a time.
+    soma = tiledbsc.SOMA(
+        tmp_path.as_posix(),
+        soma_options=tiledbsc.SOMAOptions(goal_chunk_nnz=15),
+        verbose=False,
+    )
+    soma._create()
+    soma.obsm.from_matrices_and_dim_values({"X_test": matrix}, dim_values)
+
+    assert len(tiledb.array_fragments(soma.obsm["X_test"].uri)) == 13
+    df = soma.obsm["X_test"].df()
+    assert list(df.index) == sorted(dim_values)
+    order = np.argsort(dim_values)
+    assert np.array_equal(df.to_numpy(), dense[order])
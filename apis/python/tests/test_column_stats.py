@@ -0,0 +1,87 @@
+import tiledbsc
+import tiledbsc.io
+import tiledbsc.util_tiledb
+
+import anndata
+import pandas as pd
+
+import pytest
+from pathlib import Path
+
+HERE = Path(__file__).parent
+
+
+@pytest.fixture
+def adata():
+    return anndata.read_h5ad(HERE.parent / "anndata/pbmc-small.h5ad")
+
+
+def test_column_stats(tmp_path, adata):
+    soma = tiledbsc.SOMA(tmp_path.as_posix(), verbose=False)
+    tiledbsc.io.from_anndata(soma, adata)
+
+    stats = soma.obs.column_stats()
+    nCount_RNA = adata.obs["nCount_RNA"]
+    assert stats["nCount_RNA"]["min"] == nCount_RNA.min()
+    assert stats["nCount_RNA"]["max"] == nCount_RNA.max()
+    assert stats["nCount_RNA"]["null_count"] == 0
+    assert stats["nCount_RNA"]["approx_distinct_count"] == nCount_RNA.nunique()
+    assert stats["groups"]["distinct_values"] == ["g1", "g2"]
+    assert tiledbsc.util_tiledb.SOMA_JOINID_ATTR_NAME not in stats
+
+    # Pruned: no row can match.
+    assert soma.obs.attribute_filter("nCount_RNA > 1e9", ["nFeature_RNA"]) is None
+    assert soma.obs.attribute_filter('groups == "g3"', ["nFeature_RNA"]) is None
+    df = soma.obs._filter_select('groups == "g3" and nCount_RNA > 0', None)
+    assert df.shape == (0, adata.obs.shape[1])
+    assert soma.query(obs_filter="nCount_RNA < 0") is None
+
+    # Not pruned, and reordered; same result either way.
+    query_string = 'nCount_RNA > 0 and groups == "g1"'
+    assert soma.obs._plan_query_string(query_string).startswith("attr('groups')")
+    actual = soma.obs.attribute_filter(query_string, ["nCount_RNA"])
+    expected = adata.obs[(adata.obs["nCount_RNA"] > 0) & (adata.obs["groups"] == "g1")]
+    assert sorted(actual.index) == sorted(expected.index)
+
+
+def test_column_stats_append(tmp_path, adata):
+    soma = tiledbsc.SOMA(tmp_path.as_posix(), verbose=False)
+    obs = adata.obs[["nCount_RNA", "groups"]]
+    soma.obs.from_dataframe(obs.iloc[:40], extent=256)
+    more = obs.iloc[40:].copy()
+    more["groups"] = "g3"
+    soma.obs.from_dataframe(more, extent=256)
+
+    stats = soma.obs.column_stats()
+    assert stats["nCount_RNA"]["min"] == obs["nCount_RNA"].min()
+    assert stats["nCount_RNA"]["max"] == obs["nCount_RNA"].max()
+    assert stats["groups"]["distinct_values"] == sorted(
+        set(obs["groups"].iloc[:40]) | {"g3"}
+    )
+    assert len(soma.obs.attribute_filter('groups == "g3"', [])) == 40
+
+
+def test_triples_are_unsatisfiable():
+    stats = tiledbsc.util_tiledb._get_column_stats(
+        pd.DataFrame(
+            {
+                "n": [1, 5, 10],
+                "s": ["a", "b", None],
+                "e": [None, None, None],
+            }
+        ),
+        max_distinct_values=64,
+    )
+    unsatisfiable = tiledbsc.util_tiledb._triples_are_unsatisfiable
+    assert unsatisfiable([("n", ">", 10)], stats)
+    assert not unsatisfiable([("n", ">=", 10)], stats)
+    assert unsatisfiable([("n", "<", 1)], stats)
+    assert unsatisfiable([("n", "==", 11)], stats)
+    assert unsatisfiable([("n", "==", 3)], stats)
+    assert not unsatisfiable([("n", "==", 5)], stats)
+    assert unsatisfiable([("s", "==", "c")], stats)
+    assert not unsatisfiable([("s", "!=", "a")], stats)
+    assert unsatisfiable([("e", "==", 1)], stats)
+    # No stats, or mismatched types: left to TileDB.
+    assert not unsatisfiable([("x", "==", 1)], stats)
+    assert not unsatisfiable([("s", "==", 1)], stats)
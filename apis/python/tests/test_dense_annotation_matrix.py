@@ -0,0 +1,104 @@
+import tiledbsc
+import tiledbsc.io
+import tiledbsc.util
+
+import anndata
+import numpy as np
+import scipy.sparse
+
+import pytest
+from pathlib import Path
+
+HERE = Path(__file__).parent
+
+
+@pytest.fixture
+def adata():
+    return anndata.read_h5ad(HERE.parent / "anndata/pbmc-small.h5ad")
+
+
+def test_dense_annotation_matrix(tmp_path, adata):
+    sparse_soma = tiledbsc.SOMA((tmp_path / "sparse").as_posix(), verbose=False)
+    tiledbsc.io.from_anndata(sparse_soma, adata)
+
+    # Small chunks, so that the writes span several of them.
+    soma_options = tiledbsc.SOMAOptions(
+        annotation_matrix_layout="dense", goal_chunk_nnz=100
+    )
+    dense_soma = tiledbsc.SOMA(
+        (tmp_path / "dense").as_posix(), soma_options=soma_options, verbose=False
+    )
+    tiledbsc.io.from_anndata(dense_soma, adata)
+
+    X_pca = dense_soma.obsm["X_pca"]
+    assert X_pca.uses_dense_layout()
+    assert not sparse_soma.obsm["X_pca"].uses_dense_layout()
+    assert X_pca.shape() == adata.obsm["X_pca"].shape
+
+    # Row lookups, in the order asked for.
+    rows = [5, 2, 70, 71, 2]
+    ids = list(adata.obs_names[rows])
+    actual = X_pca.to_numpy(ids)
+    assert actual.flags["C_CONTIGUOUS"]
+    assert np.array_equal(actual, adata.obsm["X_pca"][rows])
+    assert np.array_equal(sparse_soma.obsm["X_pca"].to_numpy(ids), actual)
+    assert np.array_equal(X_pca.to_numpy(ids[2:4]), adata.obsm["X_pca"][rows[2:4]])
+
+    # Same readback as the sparse layout.
+    assert X_pca.df().equals(sparse_soma.obsm["X_pca"].df())
+    for soma_name, soma in [("sparse", sparse_soma), ("dense", dense_soma)]:
+        bdata = tiledbsc.io.to_anndata(soma)
+        for key in adata.obsm.keys():
+            assert np.array_equal(
+                bdata.obsm[key], adata[bdata.obs_names].obsm[key]
+            ), soma_name
+        for key in adata.varm.keys():
+            assert np.array_equal(
+                bdata.varm[key], adata[:, bdata.var_names].varm[key]
+            ), soma_name
+
+
+def test_dense_annotation_matrix_sparse_input(tmp_path, adata):
+    soma = tiledbsc.SOMA(
+        tmp_path.as_posix(),
+        soma_options=tiledbsc.SOMAOptions(
+            annotation_matrix_layout="dense", goal_chunk_nnz=30
+        ),
+        verbose=False,
+    )
+    soma._create()
+    soma.obs.from_dataframe(adata.obs, extent=256)
+    dense = adata.obsm["X_pca"].copy()
+    dense[dense < 0] = 0
+    # Written out of order, and half at a time.
+    obs_names = np.asarray(adata.obs_names)
+    soma.obsm.from_matrices_and_dim_values(
+        {"X_sparse": scipy.sparse.csc_matrix(dense[40:])}, obs_names[40:]
+    )
+    soma.obsm._write_matrix(
+        "X_sparse", scipy.sparse.csr_matrix(dense[:40]), obs_names[:40]
+    )
+    assert np.array_equal(soma.obsm["X_sparse"].to_numpy(list(obs_names)), dense)
+
+
+def test_dense_annotation_matrix_needs_joinids(tmp_path, adata):
+    soma = tiledbsc.SOMA(tmp_path.as_posix(), verbose=False)
+    soma._create()
+    soma.obs.from_dataframe(adata.obs, extent=256)
+    # obs was written without joinids.
+    soma = tiledbsc.SOMA(
+        tmp_path.as_posix(),
+        soma_options=tiledbsc.SOMAOptions(annotation_matrix_layout="dense"),
+        verbose=False,
+    )
+    with pytest.raises(Exception):
+        soma.obsm.from_matrices_and_dim_values(
+            {"X_pca": adata.obsm["X_pca"]}, adata.obs_names
+        )
+
+
+def test_get_consecutive_runs():
+    runs = tiledbsc.util._get_consecutive_runs
+    assert runs(np.asarray([3, 4, 5, 9, 10])) == [(0, 3), (3, 5)]
+    assert runs(np.asarray([2, 2])) == [(0, 1), (1, 2)]
+    assert runs(np.asarray([], dtype=np.int64)) == []
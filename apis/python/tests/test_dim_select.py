@@ -157,6 +157,15 @@ def test_dim_select(adata):
     assert df.at["MYL9", "vst.variable"] == 1
     assert soma.var.dim_select(None).shape == (20, 5)
 
+    # Column projection.
+    df = soma.obs.df(
+        ["AAGCGACTTTGACG", "AATGCGTGGACGGA"], attrs=["groups", "nCount_RNA"]
+    )
+    assert list(df.columns) == ["groups", "nCount_RNA"]
+    assert df.at["AATGCGTGGACGGA", "nCount_RNA"] == 389.0
+    assert soma.obs.df(attrs=["nFeature_RNA"]).shape == (80, 1)
+    assert soma.obs.df(attrs=[]).shape == (80, 0)
+
     assert sorted(soma.obsm.keys()) == sorted(["X_tsne", "X_pca"])
 
     df = soma.obsm["X_tsne"].dim_select([b"AAGCGACTTTGACG", b"AATGCGTGGACGGA"])
@@ -0,0 +1,115 @@
+import tiledb
+import tiledbsc
+import tiledbsc.io
+
+import time
+
+import pytest
+from pathlib import Path
+
+HERE = Path(__file__).parent
+
+
+@pytest.fixture
+def h5ad_path():
+    return HERE.parent / "anndata/pbmc-small.h5ad"
+
+
+@pytest.fixture
+def open_counter(monkeypatch):
+    """
+    Counts read-opens of arrays and groups.
+    """
+    counts = {"array": 0, "group": 0}
+
+    real_open = tiledb.open
+    real_group = tiledb.Group
+
+    def counting_open(*args, **kwargs):
+        if kwargs.get("mode", "r") == "r":
+            counts["array"] += 1
+        return real_open(*args, **kwargs)
+
+    def counting_group(*args, **kwargs):
+        if kwargs.get("mode", "r") == "r":
+            counts["group"] += 1
+        return real_group(*args, **kwargs)
+
+    monkeypatch.setattr(tiledb, "open", counting_open)
+    monkeypatch.setattr(tiledb, "Group", counting_group)
+    return counts
+
+
+def test_handle_cache_reuses_handles(tmp_path, h5ad_path, open_counter):
+    soma_options = tiledbsc.SOMAOptions(cache_handles=True)
+    soma = tiledbsc.SOMA(tmp_path.as_posix(), soma_options=soma_options, verbose=False)
+    tiledbsc.io.from_h5ad(soma, h5ad_path)
+
+    X = soma.X["data"]
+    open_counter["array"] = 0
+    for _ in range(5):
+        X.dim_names()
+        X.attr_names()
+        X.metadata()
+        soma.obs.keys()
+    assert open_counter["array"] == 2  # X and obs
+
+    open_counter["group"] = 0
+    for _ in range(5):
+        soma.obsm.keys()
+        assert "X_pca" in soma.obsm.keys()
+        soma.obsm["X_pca"]
+    assert open_counter["group"] == 1
+
+
+def test_handle_cache_invalidation(tmp_path, h5ad_path, open_counter):
+    soma_options = tiledbsc.SOMAOptions(cache_handles=True)
+    soma = tiledbsc.SOMA(tmp_path.as_posix(), soma_options=soma_options, verbose=False)
+    tiledbsc.io.from_h5ad(soma, h5ad_path)
+
+    # Writes through this package invalidate the cache.
+    assert "foo" not in soma.obs.metadata()
+    soma.obs.set_metadata("foo", "bar")
+    assert soma.obs.metadata()["foo"] == "bar"
+
+    # Writes by others are seen after invalidation.
+    with tiledb.open(soma.obs.uri, mode="w") as A:
+        A.meta["foo"] = "baz"
+    assert soma.obs.metadata()["foo"] == "bar"
+    soma.invalidate_cache()
+    assert soma.obs.metadata()["foo"] == "baz"
+
+
+def test_handle_cache_ttl(tmp_path, h5ad_path, open_counter):
+    soma_options = tiledbsc.SOMAOptions(cache_handles=True, cache_ttl_seconds=0)
+    soma = tiledbsc.SOMA(tmp_path.as_posix(), soma_options=soma_options, verbose=False)
+    tiledbsc.io.from_h5ad(soma, h5ad_path)
+
+    open_counter["array"] = 0
+    for _ in range(3):
+        time.sleep(0.01)
+        soma.obs.keys()
+    assert open_counter["array"] == 3
+
+
+def test_reopen_at_timestamp(tmp_path, h5ad_path):
+    soma = tiledbsc.SOMA(tmp_path.as_posix(), verbose=False)
+    tiledbsc.io.from_h5ad(soma, h5ad_path)
+    soco = tiledbsc.SOMACollection((tmp_path / "soco").as_posix(), verbose=False)
+    soco._create()
+
+    time.sleep(0.01)
+    timestamp = int(time.time() * 1000)
+    time.sleep(0.01)
+    soma.obs.set_metadata("foo", "bar")
+    soco.add(soma)
+
+    soma.reopen(timestamp)
+    soco.reopen(timestamp)
+    assert "foo" not in soma.obs.metadata()
+    assert len(soco._get_member_names()) == 0
+
+    soma.reopen()
+    soco.reopen()
+    assert soma.obs.metadata()["foo"] == "bar"
+    assert len(soco._get_member_names()) == 1
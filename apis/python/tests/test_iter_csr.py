@@ -0,0 +1,58 @@
+import tiledbsc
+import tiledbsc.io
+
+import numpy as np
+import scipy.sparse
+
+import pytest
+from pathlib import Path
+
+HERE = Path(__file__).parent
+
+
+@pytest.fixture
+def soma(tmp_path):
+    # Small buffers force TileDB-Py to return each batch in several incomplete-query pieces.
+    soma_options = tiledbsc.SOMAOptions(X_read_batch_obs=7, X_read_buffer_bytes=1024)
+    soma = tiledbsc.SOMA(tmp_path.as_posix(), soma_options=soma_options, verbose=False)
+    tiledbsc.io.from_h5ad(soma, HERE.parent / "anndata/pbmc-small.h5ad")
+    return soma
+
+
+def test_iter_csr_all(soma):
+    X = soma.X["data"]
+    obs_ids = soma.obs.ids()
+    var_ids = soma.var.ids()
+    expected = X.csr()
+
+    batches = list(X.iter_csr())
+    assert len(batches) == int(np.ceil(len(obs_ids) / 7))
+    for batch_obs_ids, batch_csr in batches:
+        assert isinstance(batch_csr, scipy.sparse.csr_matrix)
+        assert batch_csr.shape == (len(batch_obs_ids), len(var_ids))
+
+    assert list(np.concatenate([b[0] for b in batches])) == obs_ids
+    actual = scipy.sparse.vstack([b[1] for b in batches])
+    assert (actual != expected).nnz == 0
+
+
+def test_iter_csr_subset(soma):
+    X = soma.X["data"]
+    obs_ids = ["TTTAGCTGTACTCT", "AAATTCGAATCACG", "CATTACACCAACTG"]
+    var_ids = ["PPBP", "AKR1C3", "CA2"]
+    expected = X.csr(obs_ids, var_ids)
+
+    batches = list(X.iter_csr(batch_obs=2, obs_ids=obs_ids, var_ids=var_ids))
+    assert [list(b[0]) for b in batches] == [obs_ids[0:2], obs_ids[2:3]]
+    actual = scipy.sparse.vstack([b[1] for b in batches])
+    assert actual.shape == (3, 3)
+    assert (actual != expected).nnz == 0
+
+
+def test_to_csr_matrix_label_order(soma):
+    X = soma.X["data"]
+    obs_ids = soma.obs.ids()
+    var_ids = soma.var.ids()
+    mat = X.to_csr_matrix(obs_ids, var_ids)
+    reordered = X.to_csr_matrix(obs_ids[::-1], var_ids[::-1])
+    assert (reordered != mat[::-1, ::-1]).nnz == 0
@@ -0,0 +1,126 @@
+import tiledbsc
+import tiledbsc.io
+
+import numpy as np
+import pandas as pd
+import anndata
+
+import pytest
+from pathlib import Path
+
+HERE = Path(__file__).parent
+
+
+@pytest.fixture
+def h5ad_path():
+    return HERE.parent / "anndata/pbmc-small.h5ad"
+
+
+def test_joinid_layout(tmp_path, h5ad_path):
+    string_soma = tiledbsc.SOMA((tmp_path / "string").as_posix(), verbose=False)
+    tiledbsc.io.from_h5ad(string_soma, h5ad_path)
+
+    soma_options = tiledbsc.SOMAOptions(X_dim_layout="joinid", X_read_batch_obs=7)
+    joinid_soma = tiledbsc.SOMA(
+        (tmp_path / "joinid").as_posix(), soma_options=soma_options, verbose=False
+    )
+    tiledbsc.io.from_h5ad(joinid_soma, h5ad_path)
+
+    X = joinid_soma.X["data"]
+    assert X._uses_joinid_dims()
+    assert X.dim_names_to_types()["obs_id"] == np.int64
+    assert not string_soma.X["data"]._uses_joinid_dims()
+
+    # Joinids are dense, one per label, and the mapping arrays round-trip.
+    obs_ids, obs_joinids = joinid_soma.obs.ids_and_joinids()
+    assert sorted(obs_joinids) == list(range(len(obs_ids)))
+    assert list(joinid_soma.obs.ids_to_joinids(obs_ids)) == list(obs_joinids)
+    # Likewise when looked up by a scan of all of them, rather than by points.
+    scanning_soma = tiledbsc.SOMA(
+        joinid_soma.uri,
+        soma_options=tiledbsc.SOMAOptions(joinid_point_read_max_ids=0),
+        verbose=False,
+    )
+    assert list(scanning_soma.obs.ids_to_joinids(obs_ids)) == list(obs_joinids)
+    with pytest.raises(Exception, match="unknown obs_id"):
+        scanning_soma.obs.ids_to_joinids(["nonesuch"])
+    assert "soma_joinid" not in joinid_soma.obs.keys()
+    assert joinid_soma.obs.shape() == string_soma.obs.shape()
+    assert joinid_soma.obs.df().equals(string_soma.obs.df())
+
+    # Reads by label give the same results as for the string layout. Unsubsetted reads are in
+    # storage order, which is joinid order here, so pass the labels explicitly.
+    all_obs = string_soma.obs.ids()
+    all_var = string_soma.var.ids()
+    assert (
+        X.csr(all_obs, all_var) != string_soma.X["data"].csr(all_obs, all_var)
+    ).nnz == 0
+    obs_subset = sorted(obs_ids)[3:11]
+    var_subset = joinid_soma.var.ids()[5:9]
+    assert (
+        X.csc(obs_subset, var_subset)
+        != string_soma.X["data"].csc(obs_subset, var_subset)
+    ).nnz == 0
+    assert (
+        X.dim_select(obs_subset, None)
+        .sort_index()
+        .equals(string_soma.X["data"].dim_select(obs_subset, None).sort_index())
+    )
+
+    actual = tiledbsc.io.to_anndata(joinid_soma)
+    expected = tiledbsc.io.to_anndata(string_soma)
+    assert list(actual.obs_names) == list(expected.obs_names)
+    assert (actual.X != expected.X).nnz == 0
+    for key in expected.obsp.keys():
+        assert (actual.obsp[key] != expected.obsp[key]).nnz == 0
+
+
+def test_joinid_layout_stable_on_rewrite(tmp_path, h5ad_path):
+    soma_options = tiledbsc.SOMAOptions(X_dim_layout="joinid")
+    soma = tiledbsc.SOMA(tmp_path.as_posix(), soma_options=soma_options, verbose=False)
+    tiledbsc.io.from_h5ad(soma, h5ad_path)
+    before = dict(zip(*soma.obs.ids_and_joinids()))
+
+    # Re-writing obs keeps existing joinids, so X coordinates stay valid; new IDs get new ones.
+    obs = anndata.read_h5ad(h5ad_path).obs
+    extra = obs.iloc[:2].copy()
+    extra.index = ["new_cell_1", "new_cell_2"]
+    soma.obs.from_dataframe(pd.concat([obs.iloc[::-1], extra]), "obs_id")
+    after = dict(zip(*soma.obs.ids_and_joinids()))
+    assert {k: after[k] for k in before} == before
+    assert sorted([after["new_cell_1"], after["new_cell_2"]]) == [
+        len(before),
+        len(before) + 1,
+    ]
+
+
+def test_joinid_layout_unknown_ids(tmp_path, h5ad_path):
+    somas = []
+    for X_dim_layout in ["string", "joinid"]:
+        soma = tiledbsc.SOMA(
+            (tmp_path / X_dim_layout).as_posix(),
+            soma_options=tiledbsc.SOMAOptions(X_dim_layout=X_dim_layout),
+            verbose=False,
+        )
+        tiledbsc.io.from_h5ad(soma, h5ad_path)
+        somas.append(soma)
+
+    # IDs not in obs/var read as empty rows and columns, whichever the layout.
+    obs_ids = ["nonesuch", somas[0].obs.ids()[0], "nonesuch_2"]
+    var_ids = [somas[0].var.ids()[3], "nonesuch"]
+    results = []
+    for soma in somas:
+        X = soma.X["data"]
+        csr = X.csr(obs_ids, var_ids)
+        assert csr.shape == (3, 2)
+        assert X.csr(var_ids=["nonesuch"]).shape == (80, 1)
+        assert X.csr(var_ids=["nonesuch"]).nnz == 0
+        assert X.dim_select(["nonesuch"], None).shape == (0, 1)
+        assert [batch.shape for _, batch in X.iter_csr(obs_ids=obs_ids)] == [(3, 20)]
+        results.append(csr.toarray())
+    assert np.array_equal(results[0], results[1])
+    assert results[0][[0, 2]].sum() == 0
+    assert results[0][:, 1].sum() == 0
+
+    with pytest.raises(Exception, match="unknown obs_id"):
+        somas[1].obs.ids_to_joinids(["nonesuch"])
@@ -0,0 +1,91 @@
+import tiledbsc
+import tiledbsc.io
+
+import anndata
+import numpy as np
+
+import pytest
+from pathlib import Path
+
+HERE = Path(__file__).parent
+
+
+@pytest.fixture
+def soma(tmp_path):
+    adata = anndata.read_h5ad(HERE.parent / "anndata/pbmc-small.h5ad")
+    soma = tiledbsc.SOMA(tmp_path.as_posix(), verbose=False)
+    tiledbsc.io.from_anndata(soma, adata)
+    return soma
+
+
+def exact_distances(matrix, vector, k):
+    return np.sort(np.sqrt(((matrix - vector) ** 2).sum(axis=1)))[:k]
+
+
+def test_knn_index(soma):
+    X_pca = soma.obsm["X_pca"]
+    with pytest.raises(Exception):
+        X_pca.knn(np.zeros(19), k=5)
+
+    soma.obsm.build_knn_index("X_pca", nlist=4)
+    matrix = X_pca.to_numpy().astype(np.float32)
+    vectors = matrix[[0, 17, 42]] + 0.01
+
+    # Scanning every list and re-ranking is exact.
+    ids, distances = X_pca.knn(vectors, k=5, nprobe=4, rerank=True)
+    assert ids.shape == (3, 5)
+    for i, vector in enumerate(vectors):
+        assert np.allclose(distances[i], exact_distances(matrix, vector, 5), atol=1e-4)
+        rows = X_pca.to_numpy(list(ids[i]))
+        assert np.allclose(np.sqrt(((rows - vector) ** 2).sum(axis=1)), distances[i])
+
+    # Without re-ranking, distances are from the quantized rows.
+    _, approximate_distances = X_pca.knn(vectors, k=5, nprobe=4)
+    assert np.allclose(approximate_distances, distances, atol=0.5)
+
+    # A single vector gives 1D results; fewer rows than k are padded.
+    ids, distances = X_pca.knn(vectors[0], k=100, nprobe=1)
+    assert ids.shape == (100,)
+    assert ids[-1] is None and distances[-1] == np.inf
+    assert np.all(np.diff(distances[ids != None]) >= 0)
+
+
+def test_knn_index_membership(soma):
+    soma.obsm.build_knn_index("X_pca", nlist=2, quantize=False)
+    # Rebuilt in place.
+    soma.obsm.build_knn_index("X_pca", nlist=3)
+    assert sorted(soma.obsm.keys()) == ["X_pca", "X_tsne"]
+    assert [matrix.name for matrix in soma.obsm] == soma.obsm.keys()
+    assert "X_pca__knn_index" not in soma.obsm
+    assert soma.obsm["X_pca__knn_index"] is None
+    assert sorted(soma.obsm.to_dict_of_csr().keys()) == ["X_pca", "X_tsne"]
+    assert soma.obsm["X_pca"].knn_index().exists()
+    with pytest.raises(Exception):
+        soma.obsm.build_knn_index("nonesuch")
+
+
+def test_knn_index_add(soma, tmp_path):
+    X_pca = soma.obsm["X_pca"]
+    matrix = X_pca.to_numpy().astype(np.float32)
+    ids = np.asarray(X_pca.dim_select(None).index, dtype=object)
+
+    index = tiledbsc.AnnotationMatrixKNNIndex(
+        uri=(tmp_path / "index").as_posix(), name="index", parent=soma.obsm
+    )
+    index.build(ids[:50], matrix[:50], nlist=4, quantize=False)
+    assert index.build_parameters() == {
+        "nlist": 4,
+        "niter": 20,
+        "quantize": False,
+        "seed": 0,
+    }
+    index.add(ids[50:65], matrix[50:65])
+    index.add(ids[65:], matrix[65:])
+
+    # Scanning every list finds the added rows too.
+    vectors = matrix[[0, 55, 70]] + 0.01
+    found_ids, distances = index.search(vectors, k=5, nprobe=4)
+    for i, vector in enumerate(vectors):
+        assert np.allclose(distances[i], exact_distances(matrix, vector, 5), atol=1e-4)
+    # Some rows are repeated, so the nearest is checked by value.
+    assert np.allclose(X_pca.to_numpy([found_ids[2, 0]])[0], matrix[70])
@@ -0,0 +1,52 @@
+import tiledbsc
+import tiledbsc.io
+import tiledbsc.util_tiledb
+
+import anndata
+import pandas as pd
+
+import pytest
+from pathlib import Path
+
+HERE = Path(__file__).parent
+
+
+def test_query_string_to_triples():
+    to_triples = tiledbsc.util_tiledb._query_string_to_triples
+    assert to_triples('cell_type == "blood"') == [("cell_type", "==", "blood")]
+    assert to_triples('nCount_RNA > 10 and attr("vst.mean") <= -1.5') == [
+        ("nCount_RNA", ">", 10),
+        ("vst.mean", "<=", -1.5),
+    ]
+    assert to_triples('(10 < x) & (y != "a")') == [("x", ">", 10), ("y", "!=", "a")]
+    # Left to TileDB-Py
+    assert to_triples("a == 1 or b == 2") is None
+    assert to_triples("a in [1, 2]") is None
+    assert to_triples("1 < a < 3") is None
+    assert to_triples("a == b") is None
+
+
+@pytest.mark.parametrize("X_dim_layout", ["string", "joinid"])
+def test_row_filter_select_native(tmp_path, X_dim_layout):
+    pytest.importorskip("pytiledbsc")
+    adata = anndata.read_h5ad(HERE.parent / "anndata/pbmc-small.h5ad")
+    soma = tiledbsc.SOMA(
+        tmp_path.as_posix(),
+        soma_options=tiledbsc.SOMAOptions(X_dim_layout=X_dim_layout),
+        verbose=False,
+    )
+    tiledbsc.io.from_anndata(soma, adata)
+    native_soma = tiledbsc.SOMA(
+        tmp_path.as_posix(),
+        soma_options=tiledbsc.SOMAOptions(
+            X_dim_layout=X_dim_layout, read_via_libtiledbsc=True
+        ),
+        verbose=False,
+    )
+
+    query_string = "nCount_RNA > 100 and nFeature_RNA < 60"
+    expected = soma.X["data"].row_filter_select(query_string).sort_index()
+    actual = native_soma.X["data"].row_filter_select(query_string).sort_index()
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+
+    assert native_soma.X["data"].row_filter_select("nCount_RNA < 0") is None
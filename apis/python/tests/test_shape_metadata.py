@@ -0,0 +1,80 @@
+import tiledbsc
+import tiledbsc.io
+import tiledbsc.util_tiledb
+
+import anndata
+import numpy as np
+import pandas as pd
+
+import pytest
+from pathlib import Path
+
+HERE = Path(__file__).parent
+
+
+@pytest.fixture
+def adata():
+    return anndata.read_h5ad(HERE.parent / "anndata/pbmc-small.h5ad")
+
+
+@pytest.fixture
+def soma(tmp_path, adata):
+    soma = tiledbsc.SOMA(tmp_path.as_posix(), verbose=False)
+    tiledbsc.io.from_anndata(soma, adata)
+    return soma
+
+
+def test_shape_metadata_written(soma, adata):
+    num_rows_key = tiledbsc.util_tiledb.SOMA_NUM_ROWS_METADATA_KEY
+    nnz_key = tiledbsc.util_tiledb.SOMA_NNZ_METADATA_KEY
+    assert soma.obs.get_metadata(num_rows_key) == adata.n_obs
+    assert soma.var.get_metadata(num_rows_key) == adata.n_vars
+    assert soma.X["data"].get_metadata(nnz_key) == np.count_nonzero(adata.X)
+    assert soma.obsp["distances"].get_metadata(nnz_key) == adata.obsp["distances"].nnz
+
+    assert soma.n_obs == adata.n_obs
+    assert soma.n_var == adata.n_vars
+    assert soma.X["data"].shape() == adata.X.shape
+    assert soma.X["data"].shape(verify=True) == adata.X.shape
+    assert soma.X["data"].nnz() == np.count_nonzero(adata.X)
+    assert soma.X["data"].nnz(verify=True) == np.count_nonzero(adata.X)
+
+
+def test_shape_metadata_verify(soma, adata):
+    soma.obs.set_metadata(tiledbsc.util_tiledb.SOMA_NUM_ROWS_METADATA_KEY, 12345)
+    assert soma.obs.shape()[0] == 12345
+    with pytest.raises(Exception):
+        soma.obs.shape(verify=True)
+
+    soma.X["data"].set_metadata(tiledbsc.util_tiledb.SOMA_NNZ_METADATA_KEY, 12345)
+    assert soma.X["data"].nnz() == 12345
+    with pytest.raises(Exception):
+        soma.X["data"].nnz(verify=True)
+
+
+def test_shape_metadata_fallback(soma, adata):
+    # Arrays written before the metadata was fall back to scanning.
+    with soma.obs._open("w") as A:
+        del A.meta[tiledbsc.util_tiledb.SOMA_NUM_ROWS_METADATA_KEY]
+    with soma.X["data"]._open("w") as A:
+        del A.meta[tiledbsc.util_tiledb.SOMA_NNZ_METADATA_KEY]
+    assert soma.obs.shape()[0] == adata.n_obs
+    assert soma.X["data"].nnz() == np.count_nonzero(adata.X)
+
+
+def test_shape_metadata_append(soma, adata):
+    # Re-writing some existing rows along with new ones counts each row once.
+    extra = adata.obs.iloc[:3].copy()
+    extra.index = ["new_cell_1", "new_cell_2", "new_cell_3"]
+    soma.obs.from_dataframe(pd.concat([adata.obs.iloc[:10], extra]), "obs_id")
+    assert soma.obs.shape()[0] == adata.n_obs + 3
+    assert soma.obs.shape(verify=True)[0] == adata.n_obs + 3
+
+    # X cells accumulate, since the array allows duplicates.
+    X = soma.X["data"]
+    X.from_matrix_and_dim_values(
+        adata.X[:2], np.asarray(adata.obs_names[:2]), np.asarray(adata.var_names)
+    )
+    expected_nnz = np.count_nonzero(adata.X) + np.count_nonzero(adata.X[:2])
+    assert X.nnz() == expected_nnz
+    assert X.nnz(verify=True) == expected_nnz
@@ -0,0 +1,70 @@
+import tiledbsc
+import tiledbsc.io
+
+import anndata
+import numpy as np
+
+import pytest
+from pathlib import Path
+
+HERE = Path(__file__).parent
+
+
+@pytest.fixture
+def soco(tmp_path):
+    adata = anndata.read_h5ad(HERE.parent / "anndata/pbmc-small.h5ad")
+    soco = tiledbsc.SOMACollection(tmp_path.as_posix(), verbose=False)
+    soco._create()
+    # The second SOMA has only some of the var, so that the var union is exercised.
+    for name, member in [("soma1", adata), ("soma2", adata[:40, :15].copy())]:
+        soma = tiledbsc.SOMA((tmp_path / name).as_posix(), name=name, verbose=False)
+        tiledbsc.io.from_anndata(soma, member)
+        soco.add(soma)
+    return soco
+
+
+def test_soco_map(soco):
+    assert soco.map(lambda soma: soma.n_obs, max_workers=2) == {
+        "soma1": 80,
+        "soma2": 40,
+    }
+    assert soco.map(lambda soma: soma.n_var, names=["soma2"]) == {"soma2": 15}
+    with pytest.raises(Exception):
+        soco.map(lambda soma: soma.n_obs, names=["nonesuch"])
+
+
+def test_soco_query(soco):
+    adata = soco.query(obs_filter="nCount_RNA > 100", columns={"obs": ["nFeature_RNA"]})
+    per_soma = {soma.name: soma.query(obs_filter="nCount_RNA > 100") for soma in soco}
+    n1 = per_soma["soma1"].n_obs
+    n2 = per_soma["soma2"].n_obs
+    assert adata.shape == (n1 + n2, per_soma["soma1"].n_vars)
+    assert sorted(adata.obs.columns) == ["nFeature_RNA", "soma_name"]
+    assert sorted(adata.obs["soma_name"]) == ["soma1"] * n1 + ["soma2"] * n2
+
+    # Rows from the second SOMA are zero outside its var.
+    soma2_var = per_soma["soma2"].var.index
+    X2 = adata[adata.obs["soma_name"] == "soma2"]
+    assert np.allclose(X2[:, soma2_var].X.toarray(), per_soma["soma2"].X.toarray())
+    other_var = [v for v in adata.var.index if v not in set(soma2_var)]
+    assert X2[:, other_var].X.nnz == 0
+
+    assert soco.query(obs_filter="nCount_RNA < 0") is None
+
+
+@pytest.mark.parametrize("use_processes", [False, True])
+def test_soco_query_obs(soco, use_processes):
+    table = soco.query_obs(
+        "nFeature_RNA > 60", columns=["nCount_RNA"], use_processes=use_processes
+    )
+    assert table.column_names == ["obs_id", "soma_name", "nCount_RNA"]
+    df = table.to_pandas()
+    for soma in soco:
+        expected = soma.obs.df()
+        expected = expected[expected["nFeature_RNA"] > 60]
+        actual = df[df["soma_name"] == soma.name]
+        assert list(actual["obs_id"]) == list(expected.index)
+        assert np.allclose(actual["nCount_RNA"], expected["nCount_RNA"])
+
+    table = soco.query_var(names=["soma2"])
+    assert table.num_rows == 15
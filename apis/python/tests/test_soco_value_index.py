@@ -0,0 +1,58 @@
+import tiledbsc
+import tiledbsc.io
+
+import anndata
+
+import pytest
+from pathlib import Path
+
+HERE = Path(__file__).parent
+
+
+def test_soco_value_index(tmp_path):
+    adata1 = anndata.read_h5ad(HERE.parent / "anndata/pbmc-small.h5ad")
+    adata2 = adata1[:40, :15].copy()
+    adata2.obs["groups"] = ["g3"] * 10 + ["g1"] * 30
+
+    soco = tiledbsc.SOMACollection(tmp_path.as_posix(), verbose=False)
+    somas = {}
+    for name, adata in [("soma1", adata1), ("soma2", adata2)]:
+        soma = tiledbsc.SOMA((tmp_path / name).as_posix(), name=name, verbose=False)
+        tiledbsc.io.from_anndata(soma, adata)
+        soco.add(soma)
+        somas[name] = soma
+
+    # The indices are group members, but not SOMAs.
+    assert sorted(soma.name for soma in soco) == ["soma1", "soma2"]
+    assert "obs_value_index" not in soco
+    assert soco["obs_value_index"] is None
+
+    df = soco.obs_value_index.lookup("groups")
+    expected_g1 = (adata1.obs["groups"] == "g1").sum()
+    assert list(df.itertuples(index=False, name=None)) == [
+        ("g1", "soma1", expected_g1),
+        ("g1", "soma2", 30),
+        ("g2", "soma1", 80 - expected_g1),
+        ("g3", "soma2", 10),
+    ]
+    assert list(soco.obs_value_index.lookup("groups", ["g3"])["soma_name"]) == ["soma2"]
+
+    last_gene = adata1.var.index[-1]
+    df = soco.var_value_index.lookup("var_id", [adata1.var.index[0], last_gene])
+    assert list(df[df["value"] == last_gene]["soma_name"]) == ["soma1"]
+    assert len(df) == 3
+
+    assert sorted(soco.somas_having({"groups": ["g1"]})) == ["soma1", "soma2"]
+    assert soco.somas_having({"groups": ["g3"]}) == ["soma2"]
+    assert soco.somas_having({"groups": ["g1"]}, {"var_id": [last_gene]}) == ["soma1"]
+    assert soco.somas_having({"groups": ["nonesuch"]}) == []
+
+    soco.remove(somas["soma2"])
+    assert soco.somas_having({"groups": ["g1", "g3"]}) == ["soma1"]
+    assert len(soco.var_value_index.lookup("var_id")) == adata1.n_vars
+
+    # Re-indexing replaces, rather than duplicates, the SOMAs' entries.
+    soco.add(somas["soma2"])
+    soco.rebuild_value_indices()
+    assert list(soco.obs_value_index.lookup("groups", ["g3"])["count"]) == [10]
+    assert len(soco.obs_value_index.lookup("groups")) == 4
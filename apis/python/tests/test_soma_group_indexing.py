@@ -4,6 +4,7 @@ import tiledbsc
 import tiledbsc.io
 
 import numpy as np
+import pandas as pd
 
 import pytest
 import tempfile
@@ -160,7 +161,7 @@ def test_soma_group_indexing(h5ad_file):
         np.dtype("int32"),
         np.dtype("int32"),
         np.dtype("int32"),
-        np.dtype("O"),
+        pd.CategoricalDtype(["g1", "g2"]),
         np.dtype("int32"),
     ]
 
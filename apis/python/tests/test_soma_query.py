@@ -0,0 +1,66 @@
+import tiledbsc
+import tiledbsc.io
+
+import anndata
+import numpy as np
+import scipy.sparse
+
+import pytest
+from pathlib import Path
+
+HERE = Path(__file__).parent
+
+
+@pytest.fixture
+def adata():
+    return anndata.read_h5ad(HERE.parent / "anndata/pbmc-small.h5ad")
+
+
+def _assert_matches(actual, adata, obs_mask, var_mask):
+    expected = adata[obs_mask, var_mask]
+    expected = expected[actual.obs.index, actual.var.index]
+    assert sorted(actual.obs.index) == sorted(expected.obs.index)
+    assert sorted(actual.var.index) == sorted(expected.var.index)
+    expected_X = expected.X
+    if scipy.sparse.issparse(expected_X):
+        expected_X = expected_X.toarray()
+    assert np.allclose(actual.X.toarray(), expected_X)
+
+
+@pytest.mark.parametrize("X_dim_layout", ["string", "joinid"])
+def test_query(tmp_path, adata, X_dim_layout):
+    soma = tiledbsc.SOMA(
+        tmp_path.as_posix(),
+        soma_options=tiledbsc.SOMAOptions(X_dim_layout=X_dim_layout),
+        verbose=False,
+    )
+    tiledbsc.io.from_anndata(soma, adata)
+
+    obs_mask = (adata.obs["nCount_RNA"] > 100).to_numpy()
+    var_mask = (adata.var["vst.mean"] > 1).to_numpy()
+
+    actual = soma.query(
+        obs_filter="nCount_RNA > 100",
+        var_filter='attr("vst.mean") > 1',
+        columns={"obs": ["nFeature_RNA"]},
+    )
+    assert actual.shape == (obs_mask.sum(), var_mask.sum())
+    assert list(actual.obs.columns) == ["nFeature_RNA"]
+    assert "vst.variable" in actual.var.columns
+    _assert_matches(actual, adata, obs_mask, var_mask)
+
+    # Unfiltered var, in batches
+    batches = list(
+        soma.query(obs_filter="nCount_RNA > 100", return_batches=True, batch_obs=7)
+    )
+    assert [batch.n_obs for batch in batches[:-1]] == [7] * (len(batches) - 1)
+    assert sum(batch.n_obs for batch in batches) == obs_mask.sum()
+    for batch in batches:
+        _assert_matches(batch, adata, obs_mask, slice(None))
+
+    actual = soma.query(var_filter='attr("vst.mean") > 1', X_layer=None)
+    assert actual.X is None
+    assert actual.shape == (adata.n_obs, var_mask.sum())
+
+    assert soma.query(obs_filter="nCount_RNA < 0") is None
+    assert list(soma.query(obs_filter="nCount_RNA < 0", return_batches=True)) == []
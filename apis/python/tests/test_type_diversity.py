@@ -355,7 +355,7 @@ def test_from_anndata_category_nans(tmp_path, col_name, cat_dtype, expect_raise)
 
     Presumed correct behavior depends on the underlying type of the category type,
     and follows the standard Pandas `astype()` coercion rules:
-    * string: encode as 'nan'
+    * string: dictionary-encode, reading back as a nan
     * float: encode as IEEE NaN
     * others: raise
     """
@@ -390,13 +390,13 @@ def test_from_anndata_category_nans(tmp_path, col_name, cat_dtype, expect_raise)
             assert set(arr.schema.attr(i).name for i in range(arr.schema.nattr)) == set(
                 adata.obs.keys()
             )
-            obs_df = arr.df[:].sort_index()
-            assert adata.n_obs == len(obs_df)
-            assert np.array_equal(
-                obs_df[col_name].astype(cat_dtype),
-                adata.obs[col_name].astype(cat_dtype),
-                equal_nan=True if np.dtype(cat_dtype).kind == "f" else False,
-            )
+        obs_df = SOMA(tmp_path.as_posix()).obs.df().sort_index()
+        assert adata.n_obs == len(obs_df)
+        assert np.array_equal(
+            obs_df[col_name].astype(cat_dtype),
+            adata.obs[col_name].astype(cat_dtype),
+            equal_nan=True if np.dtype(cat_dtype).kind == "f" else False,
+        )
 
 
 HERE = Path(__file__).parent
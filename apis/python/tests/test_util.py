@@ -0,0 +1,147 @@
+import tiledbsc.util as util
+
+import functools
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import scipy.sparse
+
+import pytest
+
+
+def test_X_and_ids_to_sparse_matrix():
+    #     S T U V
+    #   A 4 . . 3
+    #   B 5 . 6 .
+    #   C . 1 . 2
+    #   D 8 7 . .
+    Xdf = pd.DataFrame(
+        {
+            "obs_id": ["A", "A", "B", "B", "C", "C", "D", "D"],
+            "var_id": ["S", "V", "S", "U", "V", "T", "S", "T"],
+            "value": [4, 3, 5, 6, 2, 1, 8, 7],
+        }
+    )
+    Xdf.set_index(["obs_id", "var_id"], inplace=True)
+    expected = np.asarray(
+        [
+            [4, 0, 0, 3],
+            [5, 0, 6, 0],
+            [0, 1, 0, 2],
+            [8, 7, 0, 0],
+        ]
+    )
+
+    for return_as in ["csr", "csc"]:
+        mat = util.X_and_ids_to_sparse_matrix(
+            Xdf,
+            "obs_id",
+            "var_id",
+            "value",
+            ["A", "B", "C", "D"],
+            ["S", "T", "U", "V"],
+            return_as,
+        )
+        assert mat.format == return_as
+        assert np.array_equal(mat.toarray(), expected)
+
+    # Row and column labels need not be sorted, and may include labels with no data.
+    mat = util.X_and_ids_to_sparse_matrix(
+        Xdf,
+        "obs_id",
+        "var_id",
+        "value",
+        ["D", "C", "B", "A", "E"],
+        ["V", "U", "T", "S"],
+    )
+    assert mat.shape == (5, 4)
+    assert np.array_equal(mat.toarray()[:4], expected[::-1, ::-1])
+    assert mat[4].nnz == 0
+
+    with pytest.raises(Exception):
+        util.X_and_ids_to_sparse_matrix(
+            Xdf, "obs_id", "var_id", "value", ["A", "B"], ["S", "T", "U", "V"]
+        )
+
+
+@pytest.mark.parametrize("queue_depth", [0, 1, 3])
+def test_run_ahead(queue_depth):
+    args = [(i, i + 1) for i in range(10)]
+    results = list(util._run_ahead(lambda a, b: a * b, args, queue_depth))
+    assert results == [i * (i + 1) for i in range(10)]
+    assert list(util._run_ahead(lambda a, b: a * b, [], queue_depth)) == []
+
+
+def test_run_with_memory_budget():
+    lock = threading.Lock()
+    running = [0, 0]  # Bytes in use, and the most seen.
+
+    def task(i, cost):
+        with lock:
+            running[0] += cost
+            running[1] = max(running[1], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= cost
+        return i
+
+    costs = [30, 50, 20, 40, 10, 100]
+    tasks = [(cost, functools.partial(task, i, cost)) for i, cost in enumerate(costs)]
+    assert util._run_with_memory_budget(tasks[:5], 4, 60) == list(range(5))
+    assert running[1] <= 60
+    # Tasks over the budget run alone.
+    assert util._run_with_memory_budget(tasks, 4, 60) == list(range(len(costs)))
+    assert running[1] == 100
+
+    def fail():
+        raise ValueError("oops")
+
+    with pytest.raises(ValueError):
+        util._run_with_memory_budget([(0, fail)] + tasks, 2, None)
+    assert util._run_with_memory_budget(tasks, 1, None) == list(range(len(costs)))
+
+
+def test_get_chunk_bounds():
+    nnz = np.asarray([3, 1, 4, 1, 5, 9, 2, 6])
+    assert util._get_chunk_bounds(nnz, 8) == [(0, 3), (3, 5), (5, 6), (6, 8)]
+    assert util._get_chunk_bounds(nnz, 1000) == [(0, 8)]
+    assert util._get_chunk_bounds(nnz, 0) == [(i, i + 1) for i in range(8)]
+    assert util._get_chunk_bounds(np.zeros(0, dtype=np.int64), 8) == []
+
+
+def test_get_csr_and_csc_chunk_bounds():
+    dense = np.asarray(
+        [
+            [1, 1, 1, 0],
+            [0, 0, 0, 0],
+            [1, 0, 1, 0],
+            [1, 1, 1, 1],
+        ]
+    )
+    permutation = np.asarray([3, 1, 0, 2])
+    csr = scipy.sparse.csr_matrix(dense)
+    csc = scipy.sparse.csc_matrix(dense)
+    # Row nnz in permutation order: 4, 0, 3, 2
+    assert util._get_csr_chunk_bounds(csr, permutation, 4) == [(0, 2), (2, 3), (3, 4)]
+    # Column nnz in permutation order: 1, 2, 3, 3
+    assert util._get_csc_chunk_bounds(csc, permutation, 4) == [(0, 2), (2, 3), (3, 4)]
+
+
+def test_get_sort_and_permutation():
+    labels = pd.Index(["E", "A", "C", "D", "B", "A"])
+    sorted_labels, permutation = util._get_sort_and_permutation(labels)
+    assert list(sorted_labels) == ["A", "A", "B", "C", "D", "E"]
+    assert list(permutation) == [1, 5, 4, 2, 3, 0]
+    assert isinstance(sorted_labels[0], str)
+
+    # Non-ASCII labels sort by code point, which is also UTF-8 byte order.
+    labels = ["β", "α", "z", "a"]
+    sorted_labels, permutation = util._get_sort_and_permutation(labels)
+    assert list(sorted_labels) == ["a", "z", "α", "β"]
+    assert list(permutation) == [3, 2, 1, 0]
+    sorted_labels, permutation = util._get_sort_and_permutation(
+        np.asarray(labels, dtype=object)
+    )
+    assert list(sorted_labels) == ["a", "z", "α", "β"]
@@ -94,6 +94,12 @@ class TILEDBSC_EXPORT BufferSet {
     void resize(
         size_t new_data_nelem, std::optional<size_t> new_ncells = std::nullopt);
 
+    /**
+     * Append the cells of another buffer set, of the same name and type,
+     * after the cells of this one
+     */
+    void append(BufferSet& other);
+
     /**
      * Returns true if the buffer set represents a variable-length field
      */
@@ -4,12 +4,13 @@
 #include "tiledbsc_export.h"
 
 #include <memory>
+#include <string>
+#include <utility>
 #include <vector>
 
 #include <tiledb/tiledb>
 
 #include <tiledbsc/buffer_set.h>
-#include <tiledbsc/generic_typed_vector.h>
 #include <tiledbsc/managed_query.h>
 
 using namespace tiledbsc;
@@ -29,6 +30,12 @@ namespace tiledbsc {
  * 2) use result of (1) to query dest array
  * 3) return result of (2)
  *
+ * The reference pair names a dimension of the reference array, on which
+ * points may be selected, and the attribute -- or dimension -- whose
+ * values are used as points on the target dimension. For a SOMA, the
+ * reference is obs, the target is X, and the values are the obs_ids (or
+ * joinids) of the obs rows selected by a query condition.
+ *
  */
 
 class TILEDBSC_EXPORT IJQuery {
@@ -37,21 +44,44 @@ class TILEDBSC_EXPORT IJQuery {
         const shared_ptr<tiledb::Array> reference,
         pair<string, string> ref_pair,
         const shared_ptr<tiledb::Array> target,
-        string dest_name);
+        string dest_name,
+        size_t memory_budget = TILEDBSC_DEFAULT_MEMORY_BUDGET);
 
     ~IJQuery();
 
-    unique_ptr<QueryResult> select_from_points(generic_typed_vector v);
+    /**
+     * Select the reference cells at the given points on the reference
+     * dimension, and return the target cells they map to.
+     */
+    template <typename T>
+    unique_ptr<QueryResult> select_from_points(std::vector<T> points) {
+        ManagedQuery ref_query(
+            array_ref_, TILEDBSC_DEFAULT_ALLOC, memory_budget_);
+        ref_query.select_points(ref_dim_, points);
+        return select_from_reference(ref_query);
+    }
+
+    /**
+     * Select the reference cells satisfying the query condition, and
+     * return the target cells they map to.
+     */
+    unique_ptr<QueryResult> select_from_condition(
+        const tiledb::QueryCondition& condition);
 
    private:
     void check_compatible();
 
+    unique_ptr<QueryResult> select_from_reference(ManagedQuery& ref_query);
+
+    unique_ptr<QueryResult> empty_target_result();
+
    private:
     const shared_ptr<tiledb::Array> array_ref_;
     const string ref_dim_;
     const string ref_attr_;
     const shared_ptr<tiledb::Array> array_tgt_;
     std::string tgt_dim_;
+    size_t memory_budget_;
 };
 
 };  // namespace tiledbsc
@@ -2,6 +2,10 @@
 #define TILEDBSC_MANAGED_QUERY_H
 
 #include <memory>
+#include <optional>
+#include <set>
+#include <string>
+#include <type_traits>
 #include <vector>
 
 #include <tiledbsc/query_result.h>
@@ -17,6 +21,11 @@ using namespace std;
 // TODO config - 4 MB
 constexpr size_t TILEDBSC_DEFAULT_ALLOC = 524288;
 
+// Cap, in bytes, on the total size of the buffers for one submission.
+// Buffers start at the initial allocation and double on each incomplete
+// submission until reaching this.
+constexpr size_t TILEDBSC_DEFAULT_MEMORY_BUDGET = 1ul << 30;
+
 // Forward declaration
 class MQAux;
 
@@ -25,43 +34,90 @@ class MQAux;
  * Class encapsulating a TileDB Query with all buffers and batching
  * handled internally.
  *
+ * Results may be read all at once with `execute`, or one submission at a
+ * time with `next_batch`. Either way, when TileDB reports the query as
+ * incomplete -- the buffers filled up before all results were read -- it
+ * is resubmitted, with the buffers grown geometrically up to the memory
+ * budget.
+ *
  */
 class TILEDBSC_EXPORT ManagedQuery {
    public:
     ManagedQuery(
         const std::shared_ptr<tiledb::Array> array,
-        size_t initial_alloc = TILEDBSC_DEFAULT_ALLOC);
+        size_t initial_alloc = TILEDBSC_DEFAULT_ALLOC,
+        size_t memory_budget = TILEDBSC_DEFAULT_MEMORY_BUDGET);
 
     ~ManagedQuery();
 
+    /**
+     * Run the query to completion, returning all results. The memory
+     * budget bounds the buffers for each submission, not the size of the
+     * returned result.
+     */
     std::unique_ptr<QueryResult> execute();
 
-    /** TODO subset on attributes **/
+    /**
+     * Submit the query once more, returning the results of that
+     * submission: at most one memory budget's worth. Returns nullptr once
+     * the query is complete. The first call always returns a result,
+     * possibly empty.
+     */
+    std::unique_ptr<QueryResult> next_batch();
+
+    /**
+     * Returns true once all results have been returned
+     */
+    bool is_complete();
+
+    /**
+     * Restrict the result to the given attributes. Dimensions are
+     * returned unless also restricted with select_dimensions.
+     * May be combined with select_dimensions.
+     */
     void select_attributes(std::vector<std::string> attrs);
 
-    /** TODO subset on dimensions **/
-    void select_dimensions(std::vector<std::string> attrs);
+    /**
+     * Restrict the result to the given dimensions. Attributes are
+     * returned unless also restricted with select_attributes.
+     * May be combined with select_attributes.
+     */
+    void select_dimensions(std::vector<std::string> dims);
 
     /**
      * Select a set of points to query on a given dimension
      */
-    template <typename T>
-    void select_points(uint32_t dim_idx, std::vector<T> points) {
+    template <typename T, typename D>
+    void select_points(D dim, std::vector<T> points) {
         for (auto r = points.begin(); r != points.end(); r++) {
-            query_->add_range<T>(dim_idx, *r, *r);
+            add_range<T>(dim, *r, *r);
         }
     }
 
     /**
      * Select a set of (start,end) ranges to query on a given dimension
      */
-    template <typename T>
-    void select_ranges(uint32_t dim_idx, std::vector<std::array<T, 2>> ranges) {
+    template <typename T, typename D>
+    void select_ranges(D dim, std::vector<std::array<T, 2>> ranges) {
         for (auto r = ranges.begin(); r != ranges.end(); r++) {
-            query_->add_range<T>(dim_idx, *r[0], *r[1]);
+            add_range<T>(dim, (*r)[0], (*r)[1]);
         }
     }
 
+    /**
+     * Restrict the result to cells satisfying the condition on attributes
+     */
+    void set_condition(const tiledb::QueryCondition& condition) {
+        query_->set_condition(condition);
+    }
+
+    /**
+     * Returns the schema of the array being queried
+     */
+    tiledb::ArraySchema schema() {
+        return array_->schema();
+    }
+
     /**
      * Calculate initial cell count for var-length or nullable bufferset
      * Defaults to min(10, initial_alloc/5)
@@ -73,23 +129,51 @@ class TILEDBSC_EXPORT ManagedQuery {
     static std::shared_ptr<tiledb::Array> check_array(
         std::shared_ptr<tiledb::Array>);
 
+    /**
+     * Add a range on a dimension given by index or name. String
+     * dimensions take the non-template overload in the TileDB API.
+     */
+    template <typename T, typename D>
+    void add_range(D dim, const T& start, const T& end) {
+        if constexpr (std::is_same_v<T, std::string>) {
+            query_->add_range(dim, start, end);
+        } else {
+            query_->add_range<T>(dim, start, end);
+        }
+    }
+
     void allocate_buffers();
     void set_buffers();
     void resize_result_buffers();
     void validate_query();
-    void complete_query();
+    void submit();
+    bool grow_buffers();
+    bool has_results();
+    size_t nbytes_per_elem();
+    size_t buffers_nbytes();
 
     /* fields */
     ResultBuffers buffers_;
 
     std::shared_ptr<tiledb::Array> array_;
 
-    /* initial allocation target for data buffer *in bytes* */
+    /* initial allocation target for data buffer *in elements* */
     size_t initial_alloc_;
 
+    /* allocation target for the next submission, in elements */
+    size_t alloc_;
+
+    /* cap on total bytes in buffers_ for one submission */
+    size_t memory_budget_;
+
+    /* status of the last submission, if any */
+    std::optional<tiledb::Query::Status> status_ = std::nullopt;
+
     /***/
-    // if set, use only attribute or dim with these names
-    std::optional<std::set<std::string>> use_attrs_dims_ = std::nullopt;
+    // if set, use only attributes with these names
+    std::optional<std::set<std::string>> use_attrs_ = std::nullopt;
+    // if set, use only dimensions with these names
+    std::optional<std::set<std::string>> use_dims_ = std::nullopt;
 
     std::unique_ptr<tiledb::Query> query_;
 
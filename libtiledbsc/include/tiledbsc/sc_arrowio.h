@@ -88,8 +88,16 @@ struct TILEDBSC_EXPORT ArrowPair {
  */
 class TILEDBSC_EXPORT ArrowAdapter {
    public:
-    /* Constructs an ArrowAdapter wrapping the given QueryResult */
-    ArrowAdapter(tiledbsc::QueryResult& qr);
+    /**
+     * Constructs an ArrowAdapter wrapping the given QueryResult.
+     *
+     * Exported arrays point into the QueryResult's buffers without
+     * copying. If given, `owner` is held by every exported array until
+     * its release callback runs, so it should keep the QueryResult alive:
+     * typically it is the shared_ptr holding the QueryResult itself.
+     */
+    ArrowAdapter(
+        tiledbsc::QueryResult& qr, std::shared_ptr<void> owner = nullptr);
     ~ArrowAdapter();
 
     /**
@@ -110,15 +118,20 @@ class TILEDBSC_EXPORT ArrowAdapter {
      * @param BufferSet The BufferSet to export.
      * @param arrow_array Pointer to pre-allocated ArrowArray struct
      * @param arrow_schema Pointer to pre-allocated ArrowSchema struct
+     * @param owner Optional object held until the ArrowArray is released
      * @throws tiledb::TileDBError with error-specific message.
      */
     static void export_buffer(
         BufferSet& buffer_set,
         ArrowArray* arrow_array,
-        ArrowSchema* arrow_schema);
+        ArrowSchema* arrow_schema,
+        std::shared_ptr<void> owner = nullptr);
 
     /**
-     * Exports *all* results in QueryResults to ArrowArray/ArrowSchema
+     * Exports *all* results in QueryResults to ArrowArray/ArrowSchema,
+     * as a struct array with one child per buffer. This is the C Data
+     * Interface representation of a record batch, importable with e.g.
+     * `pyarrow.RecordBatch._import_from_c`.
      *
      * @param arrow_array Pointer to pre-allocated ArrowArray struct
      * @param arrow_schema Pointer to pre-allocated ArrowSchema struct
@@ -152,6 +152,37 @@ void BufferSet::resize(size_t data_nelem, std::optional<size_t> ncells) {
     }
 }
 
+void BufferSet::append(BufferSet& other) {
+    if (other.name_ != name_ || other.datatype_ != datatype_ ||
+        other.isvar() != isvar() || other.isnullable() != isnullable()) {
+        throw TileDBSCError(
+            "[BufferSet] Cannot append mismatched buffer set '" + other.name_ +
+            "' to '" + name_ + "'");
+    }
+
+    if (isvar()) {
+        // Arrow offsets: the last offset of this buffer set is where the
+        // other's data will start, and is also the other's first offset
+        // rebased.
+        auto& offsets = offsets_.value();
+        uint64_t base = data_.size();
+        auto& other_offsets = other.offsets_.value();
+        offsets.reserve(offsets.size() + other_offsets.size() - 1);
+        for (size_t i = 1; i < other_offsets.size(); i++) {
+            offsets.push_back(base + other_offsets[i]);
+        }
+    }
+
+    if (isnullable()) {
+        auto& validity = validity_.value();
+        auto& other_validity = other.validity_.value();
+        validity.insert(
+            validity.end(), other_validity.begin(), other_validity.end());
+    }
+
+    data_.insert(data_.end(), other.data_.begin(), other.data_.end());
+}
+
 BufferSet BufferSet::from_attribute(
     const tiledb::Attribute& attr, size_t data_nelem) {
     size_t elem_nbytes = tiledb::impl::type_size(attr.type());
@@ -1,3 +1,4 @@
+#include <algorithm>
 #include <stdexcept>  // required for TileDB, bug
 
 #include <tiledb/tiledb>
@@ -16,18 +17,84 @@ using namespace tiledbsc;
 // - strings
 // - scalars
 
+namespace {
+
+template <typename T>
+void select_sorted_unique_points(
+    ManagedQuery& mq, const std::string& dim, std::vector<T> points) {
+    // References may repeat values, e.g. with allows_duplicates
+    std::sort(points.begin(), points.end());
+    points.erase(std::unique(points.begin(), points.end()), points.end());
+    mq.select_points(dim, points);
+}
+
+template <typename T>
+void select_scalar_points(
+    ManagedQuery& mq, const std::string& dim, BufferSet& values) {
+    auto begin = reinterpret_cast<T*>(values.data_.data());
+    select_sorted_unique_points(
+        mq, dim, std::vector<T>(begin, begin + values.num_cells()));
+}
+
+/* Use the cell values in the buffer set as points on the dimension */
+void select_points_from_buffer(
+    ManagedQuery& mq, const std::string& dim, BufferSet& values) {
+    switch (values.datatype()) {
+        case TILEDB_STRING_ASCII:
+        case TILEDB_STRING_UTF8:
+        case TILEDB_CHAR: {
+            auto offsets = values.offsets();
+            auto data = (const char*)values.data_.data();
+            std::vector<std::string> points;
+            points.reserve(values.num_cells());
+            for (size_t i = 0; i < values.num_cells(); i++) {
+                points.emplace_back(
+                    data + offsets[i], offsets[i + 1] - offsets[i]);
+            }
+            select_sorted_unique_points(mq, dim, std::move(points));
+            break;
+        }
+        case TILEDB_INT64:
+            select_scalar_points<int64_t>(mq, dim, values);
+            break;
+        case TILEDB_UINT64:
+            select_scalar_points<uint64_t>(mq, dim, values);
+            break;
+        case TILEDB_INT32:
+            select_scalar_points<int32_t>(mq, dim, values);
+            break;
+        case TILEDB_UINT32:
+            select_scalar_points<uint32_t>(mq, dim, values);
+            break;
+        case TILEDB_FLOAT64:
+            select_scalar_points<double>(mq, dim, values);
+            break;
+        case TILEDB_FLOAT32:
+            select_scalar_points<float>(mq, dim, values);
+            break;
+        default:
+            throw TileDBSCError(
+                "[IJQuery] Unsupported type for reference values '" +
+                values.name() + "'");
+    }
+}
+
+};  // namespace
+
 namespace tiledbsc {
 
 IJQuery::IJQuery(
     const shared_ptr<tiledb::Array> reference,
     pair<string, string> ref_pair,
     const shared_ptr<tiledb::Array> target,
-    string dest_name)
+    string dest_name,
+    size_t memory_budget)
     : array_ref_(reference)
     , ref_dim_(ref_pair.first)
     , ref_attr_(ref_pair.second)
     , array_tgt_(target)
-    , tgt_dim_(dest_name) {
+    , tgt_dim_(dest_name)
+    , memory_budget_(memory_budget) {
     check_compatible();
 }
 
@@ -40,20 +107,62 @@ void IJQuery::check_compatible() {
         throw TileDBSCError(
             "Reference array does not have dimension " + ref_dim_);
     }
-    if (!schema1.has_attribute(ref_attr_)) {
+    if (!schema1.has_attribute(ref_attr_) &&
+        !schema1.domain().has_dimension(ref_attr_)) {
         throw TileDBSCError(
-            "Reference array does not have attribute " + ref_attr_);
+            "Reference array does not have attribute or dimension " +
+            ref_attr_);
     }
 
     auto schema2 = array_tgt_->schema();
     if (!schema2.domain().has_dimension(tgt_dim_)) {
-        throw TileDBSCError("Target array does not have attribute " + tgt_dim_);
+        throw TileDBSCError("Target array does not have dimension " + tgt_dim_);
     }
 }
 
-unique_ptr<QueryResult> IJQuery::select_from_points(generic_typed_vector v) {
-    (void)v;
-    return make_unique<QueryResult>(ResultBuffers());
-};
+unique_ptr<QueryResult> IJQuery::select_from_condition(
+    const tiledb::QueryCondition& condition) {
+    ManagedQuery ref_query(array_ref_, TILEDBSC_DEFAULT_ALLOC, memory_budget_);
+    ref_query.set_condition(condition);
+    return select_from_reference(ref_query);
+}
+
+unique_ptr<QueryResult> IJQuery::select_from_reference(
+    ManagedQuery& ref_query) {
+    // Stage 1: read only the values to join on
+    if (array_ref_->schema().has_attribute(ref_attr_)) {
+        ref_query.select_dimensions({});
+        ref_query.select_attributes({ref_attr_});
+    } else {
+        ref_query.select_dimensions({ref_attr_});
+        ref_query.select_attributes({});
+    }
+    auto ref_result = ref_query.execute();
+    auto& values = ref_result->get(ref_attr_);
+
+    // An empty selection must not turn into an unconstrained target read
+    if (values.num_cells() == 0) {
+        return empty_target_result();
+    }
+
+    // Stage 2: those values are the points to read on the target dimension
+    ManagedQuery tgt_query(array_tgt_, TILEDBSC_DEFAULT_ALLOC, memory_budget_);
+    select_points_from_buffer(tgt_query, tgt_dim_, values);
+    ref_result.reset();
+
+    return tgt_query.execute();
+}
+
+unique_ptr<QueryResult> IJQuery::empty_target_result() {
+    auto schema = array_tgt_->schema();
+    ResultBuffers buffers;
+    for (const auto& dim : schema.domain().dimensions()) {
+        buffers.emplace(dim.name(), BufferSet::from_dimension(dim, 0));
+    }
+    for (const auto& [name, attr] : schema.attributes()) {
+        buffers.emplace(name, BufferSet::from_attribute(attr, 0));
+    }
+    return make_unique<QueryResult>(std::move(buffers));
+}
 
 };  // namespace tiledbsc
@@ -1,3 +1,5 @@
+#include <algorithm>
+#include <string>
 #include <stdexcept>  // TODO remove
 #include <tiledb/tiledb>
 
@@ -25,12 +27,18 @@ class MQAux {
     }
     ~MQAux() = default;
 
-    /* return true if this attribute or dimension should be skipped
+    /* return true if this attribute should be skipped
        based on result restriction */
-    bool skip_attrs_dims(const std::string& name) {
-        return q.get()
-            .use_attrs_dims_.value_or(std::set<std::string>())
-            .count(name);
+    bool skip_attr(const std::string& name) {
+        auto& use = q.get().use_attrs_;
+        return use.has_value() && use.value().count(name) == 0;
+    }
+
+    /* return true if this dimension should be skipped
+       based on result restriction */
+    bool skip_dim(const std::string& name) {
+        auto& use = q.get().use_dims_;
+        return use.has_value() && use.value().count(name) == 0;
     }
 };
 
@@ -39,9 +47,13 @@ class MQAux {
 /* ********************************* */
 
 ManagedQuery::ManagedQuery(
-    const std::shared_ptr<tiledb::Array> array, size_t initial_alloc)
+    const std::shared_ptr<tiledb::Array> array,
+    size_t initial_alloc,
+    size_t memory_budget)
     : array_(check_array(array)) {
     initial_alloc_ = initial_alloc;
+    alloc_ = initial_alloc;
+    memory_budget_ = memory_budget;
     query_ = std::make_unique<tiledb::Query>(array->schema().context(), *array);
 
     if (array->schema().array_type() == TILEDB_SPARSE) {
@@ -50,6 +62,13 @@ ManagedQuery::ManagedQuery(
         query_->set_layout(TILEDB_ROW_MAJOR);
     }
 
+    // BufferSet, and the Arrow export, expect n+1 byte offsets for n cells
+    tiledb::Config config;
+    config["sm.var_offsets.extra_element"] = "true";
+    config["sm.var_offsets.mode"] = "bytes";
+    config["sm.var_offsets.bitsize"] = "64";
+    query_->set_config(config);
+
     impl_ = std::make_unique<MQAux>(*this);
 }
 
@@ -65,6 +84,28 @@ shared_ptr<tiledb::Array> ManagedQuery::check_array(
     return array;
 }
 
+void ManagedQuery::select_attributes(std::vector<std::string> attrs) {
+    auto schema = array_->schema();
+    for (auto& name : attrs) {
+        if (!schema.has_attribute(name)) {
+            throw TileDBSCError(
+                "[ManagedQuery] No such attribute '" + name + "'");
+        }
+    }
+    use_attrs_ = std::set<std::string>(attrs.begin(), attrs.end());
+}
+
+void ManagedQuery::select_dimensions(std::vector<std::string> dims) {
+    auto domain = array_->schema().domain();
+    for (auto& name : dims) {
+        if (!domain.has_dimension(name)) {
+            throw TileDBSCError(
+                "[ManagedQuery] No such dimension '" + name + "'");
+        }
+    }
+    use_dims_ = std::set<std::string>(dims.begin(), dims.end());
+}
+
 void ManagedQuery::allocate_buffers() {
     auto schema = array_->schema();
 
@@ -72,17 +113,17 @@ void ManagedQuery::allocate_buffers() {
     for (const auto& dim : domain.dimensions()) {
         auto name = dim.name();
 
-        if (impl_->skip_attrs_dims(name))
+        if (impl_->skip_dim(name))
             continue;
 
-        buffers_.emplace(name, BufferSet::from_dimension(dim, initial_alloc_));
+        buffers_.emplace(name, BufferSet::from_dimension(dim, alloc_));
     }
 
     for (const auto& [name, attr] : schema.attributes()) {
-        if (impl_->skip_attrs_dims(name))
+        if (impl_->skip_attr(name))
             continue;
 
-        buffers_.emplace(name, BufferSet::from_attribute(attr, initial_alloc_));
+        buffers_.emplace(name, BufferSet::from_attribute(attr, alloc_));
     }
 }
 
@@ -97,12 +138,12 @@ void ManagedQuery::set_buffers() {
             name, (void*)bg.data_.data(), bg.data_.size() / bg.elem_nbytes());
 
         if (bg.isvar()) {
-            auto buf = bg.offsets_.value();
+            auto& buf = bg.offsets_.value();
             query_->set_offsets_buffer(name, (uint64_t*)buf.data(), buf.size());
         }
 
         if (bg.isnullable()) {
-            auto validity = bg.validity_.value();
+            auto& validity = bg.validity_.value();
             query_->set_validity_buffer(
                 name, (uint8_t*)validity.data(), validity.size());
         }
@@ -113,10 +154,11 @@ void ManagedQuery::validate_query() {
 }
 
 void ManagedQuery::resize_result_buffers() {
-    if (query_->query_status() != tiledb::Query::Status::COMPLETE) {
+    if (query_->query_status() != tiledb::Query::Status::COMPLETE &&
+        query_->query_status() != tiledb::Query::Status::INCOMPLETE) {
         throw tiledb::TileDBError(
             "internal error: attempted to resize result buffers but query not "
-            "complete");
+            "submitted");
     }
 
     for (auto& [name, sizes] : query_->result_buffer_elements_nullable()) {
@@ -127,33 +169,155 @@ void ManagedQuery::resize_result_buffers() {
         bg.data_.resize(data_nbytes);
 
         if (bg.isvar()) {
+            // n+1 offsets for n cells; none at all for no cells
+            if (offsets_nelem == 0) {
+                offsets_nelem = 1;
+                bg.offsets_.value()[0] = 0;
+            }
             bg.offsets_.value().resize(offsets_nelem);
         }
 
         if (bg.isnullable()) {
-            bg.offsets_.value().resize(validity_nelem);
+            bg.validity_.value().resize(validity_nelem);
         }
     }
 }
 
-void ManagedQuery::complete_query() {
-    query_->submit();
+size_t ManagedQuery::nbytes_per_elem() {
+    // Matches what allocate_buffers allocates for each element
+    size_t nbytes = 0;
+    auto schema = array_->schema();
 
-    // TODO run to completion with realloc
+    for (const auto& dim : schema.domain().dimensions()) {
+        if (impl_->skip_dim(dim.name()))
+            continue;
+        nbytes += tiledb::impl::type_size(dim.type());
+        if (dim.cell_val_num() == TILEDB_VAR_NUM ||
+            dim.type() == TILEDB_STRING_ASCII ||
+            dim.type() == TILEDB_STRING_UTF8)
+            nbytes += sizeof(uint64_t);
+    }
 
-    resize_result_buffers();
+    for (const auto& [name, attr] : schema.attributes()) {
+        if (impl_->skip_attr(name))
+            continue;
+        nbytes += tiledb::impl::type_size(attr.type());
+        if (attr.cell_val_num() == TILEDB_VAR_NUM)
+            nbytes += sizeof(uint64_t);
+        if (attr.nullable())
+            nbytes += sizeof(uint8_t);
+    }
+
+    return std::max(nbytes, (size_t)1);
 }
 
-std::unique_ptr<QueryResult> ManagedQuery::execute() {
-    validate_query();
+size_t ManagedQuery::buffers_nbytes() {
+    size_t nbytes = 0;
+    for (auto& [name, bg] : buffers_) {
+        (void)name;
+        nbytes += bg.data_.size();
+        if (bg.isvar())
+            nbytes += bg.offsets_.value().size() * sizeof(uint64_t);
+        if (bg.isnullable())
+            nbytes += bg.validity_.value().size();
+    }
+    return nbytes;
+}
 
-    allocate_buffers();
+bool ManagedQuery::grow_buffers() {
+    // Called before the buffers are resized to the results, so this is
+    // their allocated size.
+    if (2 * buffers_nbytes() > memory_budget_)
+        return false;
+    alloc_ *= 2;
+    return true;
+}
 
+bool ManagedQuery::has_results() {
+    for (auto& [name, sizes] : query_->result_buffer_elements_nullable()) {
+        (void)name;
+        auto [offsets_nelem, data_nelem, validity_nelem] = sizes;
+        if (data_nelem > 0 || offsets_nelem > 1)
+            return true;
+    }
+    return false;
+}
+
+void ManagedQuery::submit() {
+    // Buffers are set on each submission: after a resubmission TileDB
+    // has overwritten their sizes with those of the results.
     set_buffers();
 
-    complete_query();
+    query_->submit();
+
+    status_ = query_->query_status();
+    if (status_ != tiledb::Query::Status::COMPLETE &&
+        status_ != tiledb::Query::Status::INCOMPLETE) {
+        throw TileDBSCError("[ManagedQuery] Query failed");
+    }
+}
+
+bool ManagedQuery::is_complete() {
+    return status_ == tiledb::Query::Status::COMPLETE;
+}
+
+std::unique_ptr<QueryResult> ManagedQuery::next_batch() {
+    if (is_complete())
+        return nullptr;
+
+    if (!status_) {
+        validate_query();
+        // The initial allocation is also bounded by the budget
+        alloc_ = std::max(
+            (size_t)1, std::min(alloc_, memory_budget_ / nbytes_per_elem()));
+    }
+
+    while (true) {
+        if (buffers_.empty())
+            allocate_buffers();
+
+        submit();
 
-    return make_unique<QueryResult>(std::move(buffers_));
+        if (is_complete())
+            break;
+
+        // Incomplete: later submissions get bigger buffers, as far as the
+        // budget allows.
+        bool grew = grow_buffers();
+
+        if (has_results())
+            break;
+
+        // No results at all: the buffers are too small for even one cell,
+        // so resubmitting only helps with bigger ones.
+        if (!grew) {
+            throw TileDBSCError(
+                "[ManagedQuery] Query made no progress: a single result does "
+                "not fit in the memory budget of " +
+                std::to_string(memory_budget_) + " bytes");
+        }
+        // Nothing was read into the old buffers; reallocate at the new size.
+        buffers_.clear();
+    }
+
+    resize_result_buffers();
+    auto result = make_unique<QueryResult>(std::move(buffers_));
+    buffers_.clear();
+    return result;
+}
+
+std::unique_ptr<QueryResult> ManagedQuery::execute() {
+    std::unique_ptr<QueryResult> result = nullptr;
+    while (auto batch = next_batch()) {
+        if (!result) {
+            result = std::move(batch);
+            continue;
+        }
+        for (auto& [name, bg] : batch->buffers()) {
+            result->get(name).append(bg);
+        }
+    }
+    return result;
 }
 
 };  // namespace tiledbsc
@@ -42,7 +42,7 @@ tiledbsc::arrow::ArrowPair QueryResult::to_arrow(
     if (name) {
         adapter.export_array(name.value().c_str(), res.array, res.schema);
     } else {
-        adapter.export_table(&res.array, &res.schema);
+        adapter.export_table(res.array, res.schema);
     }
 
     res.disown();
@@ -39,12 +39,14 @@
 #include <memory>
 #include <optional>
 #include <string>
+#include <vector>
 
 #include <stdexcept>  // required for TileDB, bug
 
 #include <tiledb/tiledb>
 
 #include <tiledbsc/carrow.h>
+#include <tiledbsc/common.h>
 #include <tiledbsc/query_result.h>
 #include <tiledbsc/sc_arrowio.h>
 #include <tiledbsc/util.h>
@@ -366,11 +368,13 @@ struct CPPArrowSchema {
         schema_->release = ([](ArrowSchema* schema_p) {
             assert(schema_p->release != nullptr);
 
-            // Release children
+            // Release children, skipping any moved out by the consumer
             for (int64_t i = 0; i < schema_p->n_children; i++) {
                 ArrowSchema* child_schema = schema_p->children[i];
-                child_schema->release(child_schema);
-                assert(child_schema->release == nullptr);
+                if (child_schema->release != nullptr) {
+                    child_schema->release(child_schema);
+                    assert(child_schema->release == nullptr);
+                }
             }
             // Release dictionary struct
             struct ArrowSchema* dict = schema_p->dictionary;
@@ -389,7 +393,7 @@ struct CPPArrowSchema {
         schema_->private_data = this;
 
         if (n_children_ > 0) {
-            schema_->children = static_cast<ArrowSchema**>(children.data());
+            schema_->children = static_cast<ArrowSchema**>(children_.data());
         }
 
         if (dictionary) {
@@ -406,6 +410,9 @@ struct CPPArrowSchema {
     ~CPPArrowSchema() {
         if (schema_ != nullptr)
             std::free(schema_);
+        // The child structs themselves are owned by the parent
+        for (auto child : children_)
+            std::free(child);
     };
 
     /*
@@ -446,20 +453,26 @@ struct CPPArrowSchema {
 
 struct CPPArrowArray {
     /*
-     * Initialize a CPPArrowSchema object
+     * Initialize a CPPArrowArray object
      *
      * The lifetime of this object is controlled by the
-     * release callback set in the ArrowSchema.
+     * release callback set in the ArrowArray.
      *
-     * Note that an ArrowSchema is *movable*, provided
+     * Note that an ArrowArray is *movable*, provided
      * the release callback of the source is set to null.
+     *
+     * If given, `owner` is kept alive until the release callback
+     * runs: it should own the memory which `buffers` point into.
      */
     CPPArrowArray(
         int64_t elem_num,
         int64_t null_num,
         int64_t offset,
-        std::vector<std::shared_ptr<CPPArrowArray>> children,
-        std::vector<void*> buffers) {
+        std::vector<ArrowArray*> children,
+        std::vector<void*> buffers,
+        std::shared_ptr<void> owner = nullptr)
+        : children_(children)
+        , owner_(owner) {
         array_ = static_cast<ArrowArray*>(std::malloc(sizeof(ArrowArray)));
         if (array_ == nullptr)
             throw tiledb::TileDBError("Failed to allocate ArrowArray");
@@ -477,11 +490,13 @@ struct CPPArrowArray {
         array_->release = ([](ArrowArray* array_p) {
             assert(array_p->release != nullptr);
 
-            // Release children
+            // Release children, skipping any moved out by the consumer
             for (int64_t i = 0; i < array_p->n_children; i++) {
                 ArrowArray* child_array = array_p->children[i];
-                child_array->release(child_array);
-                assert(child_array->release == nullptr);
+                if (child_array->release != nullptr) {
+                    child_array->release(child_array);
+                    assert(child_array->release == nullptr);
+                }
             }
 
             // Release dictionary
@@ -500,6 +515,10 @@ struct CPPArrowArray {
 
         buffers_ = buffers;
         array_->buffers = const_cast<const void**>(buffers_.data());
+
+        if (children_.size() > 0) {
+            array_->children = static_cast<ArrowArray**>(children_.data());
+        }
     }
 
     /*
@@ -513,6 +532,9 @@ struct CPPArrowArray {
             // did not export
             std::free(array_);
         }
+        // The child structs themselves are owned by the parent
+        for (auto child : children_)
+            std::free(child);
     }
 
     void export_ptr(ArrowArray* out_array) {
@@ -535,6 +557,8 @@ struct CPPArrowArray {
    private:
     ArrowArray* array_;
     std::vector<void*> buffers_;
+    std::vector<ArrowArray*> children_;
+    std::shared_ptr<void> owner_;
 };
 
 /* ****************************** */
@@ -543,7 +567,8 @@ struct CPPArrowArray {
 
 class ArrowExporter {
    public:
-    ArrowExporter(tiledbsc::QueryResult&);
+    ArrowExporter(
+        tiledbsc::QueryResult&, std::shared_ptr<void> owner = nullptr);
 
     void export_buffer(
         BufferSet& buffer_set, ArrowArray* array, ArrowSchema* schema);
@@ -556,11 +581,14 @@ class ArrowExporter {
 
    private:
     tiledbsc::QueryResult& query_result_;
+    std::shared_ptr<void> owner_;
 };
 
 // ArrowExporter implementation
-ArrowExporter::ArrowExporter(tiledbsc::QueryResult& query_result)
-    : query_result_(query_result) {
+ArrowExporter::ArrowExporter(
+    tiledbsc::QueryResult& query_result, std::shared_ptr<void> owner)
+    : query_result_(query_result)
+    , owner_(owner) {
 }
 
 BufferInfo ArrowExporter::buffer_info(const std::string& name) {
@@ -625,8 +653,21 @@ int64_t flags_for_buffer(BufferInfo buffer_info) {
     return flags;
 }
 
+/**
+ * Memory for an exported array which the BufferSet doesn't hold: the Arrow
+ * validity bitmap. It is packed from a copy of the TileDB validity bytemap,
+ * leaving the buffer set as it was, so that it can be exported again.
+ */
+struct ExportedValidity {
+    std::shared_ptr<void> owner;
+    std::vector<byte> bitmap;
+};
+
 void ArrowAdapter::export_buffer(
-    BufferSet& buffer_set, ArrowArray* array, ArrowSchema* schema) {
+    BufferSet& buffer_set,
+    ArrowArray* array,
+    ArrowSchema* schema,
+    std::shared_ptr<void> owner) {
     auto name = buffer_set.name();
     auto bufferinfo = ArrowExporter::buffer_info(buffer_set);
     size_t null_num = 0;
@@ -651,8 +692,15 @@ void ArrowAdapter::export_buffer(
         buffers.insert(buffers.begin() + 1, bufferinfo.offsets.data());
     }
     if (bufferinfo.is_nullable) {
-        null_num = util::bytemap_to_bitmap_inplace(bufferinfo.validity);
-        buffers[0] = bufferinfo.validity.data();
+        auto validity = std::make_shared<ExportedValidity>();
+        validity->owner = owner;
+        validity->bitmap.assign(
+            bufferinfo.validity.begin(), bufferinfo.validity.end());
+        null_num = util::bytemap_to_bitmap_inplace(
+            std::span<byte>(validity->bitmap));
+        buffers[0] = validity->bitmap.data();
+        // The exported array keeps the bitmap alive, along with the buffers
+        owner = validity;
     }
 
     cpp_schema->export_ptr(schema);
@@ -664,19 +712,85 @@ void ArrowAdapter::export_buffer(
         null_num,  // null_num
         0,         // offset
         {},        // children
-        buffers);
+        buffers,
+        owner);
     cpp_arrow_array->export_ptr(array);
 }
 
 void ArrowExporter::export_array(
     const std::string& name, ArrowArray* array, ArrowSchema* schema) {
     BufferSet& bfs = query_result_.get(name);
-    return ArrowAdapter::export_buffer(bfs, array, schema);
+    return ArrowAdapter::export_buffer(bfs, array, schema, owner_);
 }
 
 void ArrowExporter::export_table(ArrowArray* array, ArrowSchema* schema) {
-    (void)array;
-    (void)schema;
+    if (schema == nullptr || array == nullptr) {
+        throw tiledb::TileDBError(
+            "ArrowExporter: received invalid pointer to output array or "
+            "schema.");
+    }
+
+    // Each buffer is exported as one child of a struct array, which is
+    // how the Arrow C Data Interface represents a record batch.
+    // The child structs are owned, and freed, by the parent.
+    std::vector<ArrowSchema*> child_schemas;
+    std::vector<ArrowArray*> child_arrays;
+    auto release_children = [&]() {
+        for (auto child_schema : child_schemas) {
+            if (child_schema->release != nullptr)
+                child_schema->release(child_schema);
+            std::free(child_schema);
+        }
+        for (auto child_array : child_arrays) {
+            if (child_array->release != nullptr)
+                child_array->release(child_array);
+            std::free(child_array);
+        }
+    };
+
+    int64_t length = 0;
+    for (auto& name : query_result_.names()) {
+        auto child_schema =
+            static_cast<ArrowSchema*>(std::malloc(sizeof(ArrowSchema)));
+        auto child_array =
+            static_cast<ArrowArray*>(std::malloc(sizeof(ArrowArray)));
+        if (child_schema == nullptr || child_array == nullptr) {
+            std::free(child_schema);
+            std::free(child_array);
+            release_children();
+            throw tiledb::TileDBError(
+                "Failed to allocate ArrowSchema and ArrowArray structs");
+        }
+        // Not yet exported: marks them as skippable by release_children
+        child_schema->release = nullptr;
+        child_array->release = nullptr;
+        child_schemas.push_back(child_schema);
+        child_arrays.push_back(child_array);
+
+        export_array(name, child_array, child_schema);
+
+        if (child_arrays.size() == 1) {
+            length = child_array->length;
+        } else if (child_array->length != length) {
+            release_children();
+            throw TileDBSCError(
+                "[ArrowIO] Cannot export table with columns of differing "
+                "lengths ('" +
+                name + "')");
+        }
+    }
+
+    CPPArrowSchema* cpp_schema =
+        new CPPArrowSchema("", "+s", std::nullopt, 0, child_schemas, {});
+    cpp_schema->export_ptr(schema);
+
+    auto cpp_arrow_array = new CPPArrowArray(
+        length,  // elem_num
+        0,       // null_num
+        0,       // offset
+        child_arrays,
+        {nullptr});  // no validity buffer
+    cpp_arrow_array->export_ptr(array);
 }
 
 /* End TileDB Arrow IO internal implementation */
@@ -685,7 +799,8 @@ void ArrowExporter::export_table(ArrowArray* array, ArrowSchema* schema) {
 /* ************************************************************************ */
 /* Begin TileDB Arrow IO public API implementation */
 
-ArrowAdapter::ArrowAdapter(QueryResult& query_result)
+ArrowAdapter::ArrowAdapter(
+    QueryResult& query_result, std::shared_ptr<void> owner)
     : exporter_(nullptr) {
     // importer_ = new ArrowImporter(query);
     // if (!importer_) {
@@ -693,7 +808,7 @@ ArrowAdapter::ArrowAdapter(QueryResult& query_result)
     //      "[TileDB-Arrow] Failed to allocate ArrowImporter!");
     //}
 
-    exporter_ = new ArrowExporter(query_result);
+    exporter_ = new ArrowExporter(query_result, owner);
     if (!exporter_) {
         throw tiledb::TileDBError(
             "[TileDB-Arrow] Failed to allocate ArrowImporter!");
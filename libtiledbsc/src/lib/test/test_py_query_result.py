@@ -114,3 +114,10 @@ def test_query_result_to_arrow_table():
         arw_nl_strings.array(), arw_nl_strings.schema()
     )
     assert np.array_equal(strings_nulled, ret_nl_strings)
+
+    # Exporting again gives the same results: the validity is left as it was.
+    for _ in range(2):
+        arw_table = res.to_arrow()
+        ret_table = pa.RecordBatch._import_from_c(arw_table.array(), arw_table.schema())
+        assert_array_equal(ret_table["nullable_ints"], int_data_nulled)
+        assert np.array_equal(strings_nulled, ret_table["nullable_strings"])
@@ -102,3 +102,24 @@ TEST_CASE("BufferSet::from_data") {
         REQUIRE(b2.validity().size() == 11);
     }
 }
+
+TEST_CASE("BufferSet::append") {
+    std::vector<std::string> strings1{"ab", "", "cde"};
+    std::vector<std::string> strings2{"f", "gh"};
+    auto&& [data1, offsets1] = util::to_varlen_buffers(strings1);
+    auto&& [data2, offsets2] = util::to_varlen_buffers(strings2);
+
+    auto b1 = BufferSet::from_data(
+        "s", TILEDB_STRING_ASCII, 1, data1, offsets1);
+    auto b2 = BufferSet::from_data(
+        "s", TILEDB_STRING_ASCII, 1, data2, offsets2);
+    b1.append(b2);
+
+    REQUIRE(b1.num_cells() == 5);
+    REQUIRE(std::string_view((char*)b1.data_.data(), 8) == "abcdefgh");
+    REQUIRE(
+        b1.offsets_.value() == std::vector<uint64_t>({0, 2, 2, 5, 6, 8}));
+
+    auto b3 = BufferSet::alloc("t", TILEDB_INT32, 3, 4, false, false);
+    REQUIRE_THROWS(b1.append(b3));
+};
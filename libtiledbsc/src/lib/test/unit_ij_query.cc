@@ -1,3 +1,4 @@
+#include <algorithm>
 #include <memory>
 #include <stdexcept>
 #include <vector>
@@ -14,6 +15,19 @@ using namespace tiledbsc;
 const std::string src_path = TILEDBSC_SOURCE_ROOT;
 const std::string data_path = src_path + "/data";
 
+namespace {
+
+/* Values of the target array's attribute, in sorted order */
+std::vector<int32_t> target_data(QueryResult& result) {
+    auto& buf = result.get("data");
+    auto begin = reinterpret_cast<int32_t*>(buf.data_.data());
+    std::vector<int32_t> data(begin, begin + buf.num_cells());
+    std::sort(data.begin(), data.end());
+    return data;
+}
+
+};  // end anonymous namespace
+
 TEST_CASE("Basic IJQuery functionality") {
     Context ctx;
 
@@ -25,5 +39,32 @@ TEST_CASE("Basic IJQuery functionality") {
 
     IJQuery q(array1, {"z_name", "z_idx"}, array2, "z_idx");
 
-    // auto result = q.select_from_points<int32_t>({1,3,5,6});
+    // "the" is stored twice, at z_idx 0 and 6
+    auto result = q.select_from_points<std::string>({"the", "fox", "dog"});
+    REQUIRE(target_data(*result) == std::vector<int32_t>({30, 33, 36, 39}));
+
+    auto empty = q.select_from_points<std::string>({"cat"});
+    REQUIRE(empty->get("data").num_cells() == 0);
+    REQUIRE(empty->get("z_idx").num_cells() == 0);
+};
+
+TEST_CASE("IJQuery from query condition") {
+    Context ctx;
+
+    std::string ref_uri = data_path + "/simple/ij_test1/ref";
+    std::string tgt_uri = data_path + "/simple/ij_test1/tgt";
+
+    auto array1 = std::make_shared<Array>(ctx, ref_uri, TILEDB_READ);
+    auto array2 = std::make_shared<Array>(ctx, tgt_uri, TILEDB_READ);
+
+    IJQuery q(array1, {"z_name", "z_idx"}, array2, "z_idx");
+
+    uint32_t value = 8;
+    QueryCondition qc(ctx);
+    qc.init("z_idx", &value, sizeof(value), TILEDB_GE);
+    auto result = q.select_from_condition(qc);
+    REQUIRE(target_data(*result) == std::vector<int32_t>({38, 39}));
+
+    REQUIRE_THROWS(IJQuery(array1, {"z_name", "nonesuch"}, array2, "z_idx"));
+    REQUIRE_THROWS(IJQuery(array1, {"z_name", "z_idx"}, array2, "nonesuch"));
 };
@@ -78,3 +78,87 @@ TEST_CASE("ManagedQuery string attribute test") {
     REQUIRE(result->names() == std::vector<std::string>({"", "__dim_0"}));
     REQUIRE(result->nbuffers() == 2);
 };
+
+TEST_CASE("ManagedQuery attribute and dimension selection") {
+    // path to data within the *source* tree
+    auto data_path = src_path + "/data/";
+    auto array_path = data_path + "/simple/dim-uint64_attr-str_26cells/";
+
+    auto ctx = make_ctx();
+
+    auto array = std::make_shared<tiledb::Array>(ctx, array_path, TILEDB_READ);
+
+    auto mq = tiledbsc::ManagedQuery(array);
+    REQUIRE_THROWS(mq.select_attributes({"foobar"}));
+    REQUIRE_THROWS(mq.select_dimensions({"foobar"}));
+
+    mq.select_dimensions({});
+    mq.select_ranges(0, std::vector<std::array<uint64_t, 2>>{{1, 3}});
+    auto result = mq.execute();
+
+    REQUIRE(result->names() == std::vector<std::string>({""}));
+    auto& buf = result->get("");
+    REQUIRE(buf.num_cells() == 3);
+    REQUIRE(std::string_view((char*)buf.data_.data(), 9) == "bbcccdddd");
+};
+
+TEST_CASE("ManagedQuery resubmits incomplete queries") {
+    // path to data within the *source* tree
+    auto data_path = src_path + "/data/";
+    auto array_path = data_path + "/simple/dim-uint64_attr-str_26cells/";
+
+    auto ctx = make_ctx();
+
+    auto array = std::make_shared<tiledb::Array>(ctx, array_path, TILEDB_READ);
+
+    // Buffers far too small for the 351 bytes of string data
+    auto mq = tiledbsc::ManagedQuery(array, 4);
+    mq.select_ranges(0, std::vector<std::array<uint64_t, 2>>{{0, 25}});
+    auto result = mq.execute();
+
+    REQUIRE(mq.is_complete());
+    auto& buf = result->get("");
+    REQUIRE(buf.num_cells() == 26);
+    REQUIRE(buf.data_.size() == 351);
+    REQUIRE(std::string_view((char*)buf.data_.data(), 6) == "abbccc");
+    REQUIRE(buf.offsets()[26] == 351);
+
+    auto& dim = result->get("__dim_0");
+    REQUIRE(dim.num_cells() == 26);
+    REQUIRE(reinterpret_cast<uint64_t*>(dim.data_.data())[25] == 25);
+};
+
+TEST_CASE("ManagedQuery batches") {
+    // path to data within the *source* tree
+    auto data_path = src_path + "/data/";
+    auto array_path = data_path + "/simple/dim-uint64_attr-str_26cells/";
+
+    auto ctx = make_ctx();
+
+    auto array = std::make_shared<tiledb::Array>(ctx, array_path, TILEDB_READ);
+
+    // A budget which stops the buffers growing after the first doubling
+    auto mq = tiledbsc::ManagedQuery(array, 32, 1200);
+    mq.select_ranges(0, std::vector<std::array<uint64_t, 2>>{{0, 25}});
+
+    size_t nbatches = 0;
+    size_t ncells = 0;
+    std::string data;
+    while (auto batch = mq.next_batch()) {
+        nbatches++;
+        auto& buf = batch->get("");
+        ncells += buf.num_cells();
+        data.append((char*)buf.data_.data(), buf.data_.size());
+    }
+
+    REQUIRE(mq.is_complete());
+    REQUIRE(nbatches > 1);
+    REQUIRE(ncells == 26);
+    REQUIRE(data.size() == 351);
+    REQUIRE(mq.next_batch() == nullptr);
+
+    // Not even one cell fits
+    auto mq_small = tiledbsc::ManagedQuery(array, 1, 1);
+    mq_small.select_ranges(0, std::vector<std::array<uint64_t, 2>>{{25, 25}});
+    REQUIRE_THROWS(mq_small.execute());
+};
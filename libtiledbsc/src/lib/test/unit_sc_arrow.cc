@@ -1,3 +1,4 @@
+#include <algorithm>
 #include <any>
 #include <memory>
 #include <stdexcept>
@@ -100,3 +101,116 @@ TEST_CASE("SCArrow nullable strings export", "[arrow][export]") {
     // REQUIRE(ap.schema->flags == 0);
     REQUIRE(ap.schema->n_children == 0);
 };
+
+TEST_CASE("SCArrow table export", "[arrow][export]") {
+    std::vector<string> data_orig{"", "abcd", "ef", "ghijk"};
+
+    auto&& [data_buf, offsets_buf] = util::to_varlen_buffers(data_orig);
+
+    ResultBuffers buffers;
+    buffers.emplace(
+        "ints",
+        BufferSet::alloc("ints", TILEDB_INT32, 4, 4, false, false));
+    buffers.emplace(
+        "strings",
+        BufferSet::from_data(
+            "strings", TILEDB_STRING_ASCII, 1, data_buf, offsets_buf));
+    QueryResult qr(std::move(buffers));
+
+    ArrowPair ap;
+    ArrowAdapter adapter(qr);
+    adapter.export_table(ap.array, ap.schema);
+
+    REQUIRE(ap.array->length == 4);
+    REQUIRE(ap.array->null_count == 0);
+    REQUIRE(ap.array->n_buffers == 1);
+    REQUIRE(ap.array->n_children == 2);
+    REQUIRE(ap.array->children != nullptr);
+    REQUIRE(ap.array->children[0]->length == 4);
+    REQUIRE(ap.array->children[1]->n_buffers == 3);
+
+    REQUIRE(std::string_view(ap.schema->format) == "+s");
+    REQUIRE(ap.schema->n_children == 2);
+    REQUIRE(std::string_view(ap.schema->children[0]->name) == "ints");
+    REQUIRE(std::string_view(ap.schema->children[0]->format) == "i");
+    REQUIRE(std::string_view(ap.schema->children[1]->name) == "strings");
+    REQUIRE(std::string_view(ap.schema->children[1]->format) == "U");
+
+    ap.array->release(ap.array);
+    ap.schema->release(ap.schema);
+    REQUIRE(ap.array->release == nullptr);
+    REQUIRE(ap.schema->release == nullptr);
+};
+
+TEST_CASE("SCArrow table export of mismatched lengths", "[arrow][export]") {
+    ResultBuffers buffers;
+    buffers.emplace(
+        "a", BufferSet::alloc("a", TILEDB_INT32, 4, 4, false, false));
+    buffers.emplace(
+        "b", BufferSet::alloc("b", TILEDB_INT32, 5, 4, false, false));
+    QueryResult qr(std::move(buffers));
+
+    ArrowPair ap;
+    ArrowAdapter adapter(qr);
+    REQUIRE_THROWS(adapter.export_table(ap.array, ap.schema));
+};
+
+TEST_CASE("SCArrow repeated export of nullable columns", "[arrow][export]") {
+    std::vector<string> data_orig{
+        "", "abcd", "ef", "ghijk", "lmno", "p", "", "q", "rstu", "vwxyz", ""};
+    auto&& [data_buf, offsets_buf] = util::to_varlen_buffers(data_orig);
+
+    std::vector<byte> validity_buf{
+        byte{0}, byte{0}, byte{0}, byte{1}, byte{1}, byte{0},
+        byte{0}, byte{1}, byte{0}, byte{0}, byte{1}};
+    std::vector<int32_t> int_data{0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10};
+
+    ResultBuffers buffers;
+    buffers.emplace(
+        "ints",
+        BufferSet::from_data(
+            "ints",
+            TILEDB_INT32,
+            4,
+            std::as_writable_bytes(std::span<int32_t>(int_data)),
+            std::nullopt,
+            validity_buf));
+    buffers.emplace(
+        "strings",
+        BufferSet::from_data(
+            "strings",
+            TILEDB_STRING_ASCII,
+            1,
+            data_buf,
+            offsets_buf,
+            validity_buf));
+    QueryResult qr(std::move(buffers));
+
+    // Each export packs its own bitmap, leaving the bytemap as it was
+    for (int i = 0; i < 2; i++) {
+        ArrowPair ap;
+        ArrowAdapter adapter(qr);
+        adapter.export_table(ap.array, ap.schema);
+
+        REQUIRE(ap.array->n_children == 2);
+        for (int64_t j = 0; j < ap.array->n_children; j++) {
+            auto child = ap.array->children[j];
+            REQUIRE(child->null_count == 7);
+            auto bitmap = static_cast<const uint8_t*>(child->buffers[0]);
+            // 0b10011000, 0b100
+            REQUIRE(bitmap[0] == 0x98);
+            REQUIRE(bitmap[1] == 0x04);
+        }
+        for (auto& name : {"ints", "strings"}) {
+            auto validity = qr.get(name).validity();
+            REQUIRE(std::equal(
+                validity.begin(),
+                validity.end(),
+                validity_buf.begin(),
+                validity_buf.end()));
+        }
+
+        ap.array->release(ap.array);
+        ap.schema->release(ap.schema);
+    }
+};
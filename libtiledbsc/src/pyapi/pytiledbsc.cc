@@ -1,4 +1,9 @@
+#include <array>
+#include <map>
+#include <memory>
+#include <optional>
 #include <string>
+#include <tuple>
 #include <vector>
 
 #include <pybind11/numpy.h>
@@ -6,10 +11,339 @@
 #include <pybind11/pytypes.h>
 #include <pybind11/stl.h>
 
+#include <tiledbsc/ij_query.h>
 #include <tiledbsc/managed_query.h>
+#include <tiledbsc/query_result.h>
+#include <tiledbsc/sc_arrowio.h>
 #include <tiledbsc/tiledbsc.h>
 
-namespace {}
+namespace {
+
+using namespace tiledbsc;
+
+namespace py = pybind11;
+
+/**
+ * A ManagedQuery together with the context and array it reads from, which
+ * must outlive it: tiledb::Array holds its context by reference.
+ */
+class PyManagedQuery {
+   public:
+    PyManagedQuery(
+        const std::string& uri,
+        std::map<std::string, std::string> config,
+        size_t initial_alloc,
+        size_t memory_budget) {
+        tiledb::Config cfg;
+        for (auto& [key, value] : config) {
+            cfg[key] = value;
+        }
+        ctx_ = std::make_shared<tiledb::Context>(cfg);
+        array_ = std::make_shared<tiledb::Array>(*ctx_, uri, TILEDB_READ);
+        mq_ = std::make_unique<ManagedQuery>(
+            array_, initial_alloc, memory_budget);
+    }
+
+    void select_columns(std::vector<std::string> names) {
+        auto schema = mq_->schema();
+        std::vector<std::string> dims, attrs;
+        for (auto& name : names) {
+            if (schema.domain().has_dimension(name)) {
+                dims.push_back(name);
+            } else {
+                attrs.push_back(name);
+            }
+        }
+        mq_->select_dimensions(dims);
+        mq_->select_attributes(attrs);
+    }
+
+    void select_points(const std::string& dim, py::sequence points) {
+        switch (dim_type(dim)) {
+            case TILEDB_STRING_ASCII:
+            case TILEDB_STRING_UTF8:
+                mq_->select_points(
+                    dim, points.cast<std::vector<std::string>>());
+                break;
+            case TILEDB_INT64:
+                mq_->select_points(dim, points.cast<std::vector<int64_t>>());
+                break;
+            case TILEDB_UINT64:
+                mq_->select_points(dim, points.cast<std::vector<uint64_t>>());
+                break;
+            case TILEDB_INT32:
+                mq_->select_points(dim, points.cast<std::vector<int32_t>>());
+                break;
+            case TILEDB_UINT32:
+                mq_->select_points(dim, points.cast<std::vector<uint32_t>>());
+                break;
+            case TILEDB_FLOAT64:
+                mq_->select_points(dim, points.cast<std::vector<double>>());
+                break;
+            case TILEDB_FLOAT32:
+                mq_->select_points(dim, points.cast<std::vector<float>>());
+                break;
+            default:
+                throw TileDBSCError(
+                    "[pytiledbsc] Unsupported type for dimension '" + dim +
+                    "'");
+        }
+    }
+
+    void select_ranges(const std::string& dim, py::sequence ranges) {
+        switch (dim_type(dim)) {
+            case TILEDB_STRING_ASCII:
+            case TILEDB_STRING_UTF8:
+                mq_->select_ranges(
+                    dim,
+                    ranges.cast<std::vector<std::array<std::string, 2>>>());
+                break;
+            case TILEDB_INT64:
+                mq_->select_ranges(
+                    dim, ranges.cast<std::vector<std::array<int64_t, 2>>>());
+                break;
+            case TILEDB_UINT64:
+                mq_->select_ranges(
+                    dim, ranges.cast<std::vector<std::array<uint64_t, 2>>>());
+                break;
+            case TILEDB_INT32:
+                mq_->select_ranges(
+                    dim, ranges.cast<std::vector<std::array<int32_t, 2>>>());
+                break;
+            case TILEDB_UINT32:
+                mq_->select_ranges(
+                    dim, ranges.cast<std::vector<std::array<uint32_t, 2>>>());
+                break;
+            case TILEDB_FLOAT64:
+                mq_->select_ranges(
+                    dim, ranges.cast<std::vector<std::array<double, 2>>>());
+                break;
+            case TILEDB_FLOAT32:
+                mq_->select_ranges(
+                    dim, ranges.cast<std::vector<std::array<float, 2>>>());
+                break;
+            default:
+                throw TileDBSCError(
+                    "[pytiledbsc] Unsupported type for dimension '" + dim +
+                    "'");
+        }
+    }
+
+    std::shared_ptr<QueryResult> execute() {
+        std::unique_ptr<QueryResult> result;
+        {
+            py::gil_scoped_release release;
+            result = mq_->execute();
+        }
+        return std::shared_ptr<QueryResult>(std::move(result));
+    }
+
+    std::optional<std::shared_ptr<QueryResult>> next_batch() {
+        std::unique_ptr<QueryResult> result;
+        {
+            py::gil_scoped_release release;
+            result = mq_->next_batch();
+        }
+        if (!result)
+            return std::nullopt;
+        return std::shared_ptr<QueryResult>(std::move(result));
+    }
+
+    bool is_complete() {
+        return mq_->is_complete();
+    }
+
+   private:
+    tiledb_datatype_t dim_type(const std::string& dim) {
+        auto domain = mq_->schema().domain();
+        if (!domain.has_dimension(dim)) {
+            throw TileDBSCError("[pytiledbsc] No such dimension '" + dim + "'");
+        }
+        return domain.dimension(dim).type();
+    }
+
+    std::shared_ptr<tiledb::Context> ctx_;
+    std::shared_ptr<tiledb::Array> array_;
+    std::unique_ptr<ManagedQuery> mq_;
+};
+
+template <typename T>
+tiledb::QueryCondition make_typed_condition(
+    const tiledb::Context& ctx,
+    const std::string& name,
+    py::object value,
+    tiledb_query_condition_op_t op) {
+    T typed_value = value.cast<T>();
+    tiledb::QueryCondition condition(ctx);
+    condition.init(name, &typed_value, sizeof(T), op);
+    return condition;
+}
+
+/**
+ * Builds the AND of a list of (attribute name, operator, value) triples,
+ * such as ("cell_type", "==", "blood"), as a TileDB query condition. The
+ * value is converted to the type of the attribute.
+ */
+tiledb::QueryCondition make_condition(
+    const tiledb::Context& ctx,
+    const tiledb::ArraySchema& schema,
+    std::vector<std::tuple<std::string, std::string, py::object>> triples) {
+    static const std::map<std::string, tiledb_query_condition_op_t> ops{
+        {"<", TILEDB_LT},
+        {"<=", TILEDB_LE},
+        {">", TILEDB_GT},
+        {">=", TILEDB_GE},
+        {"==", TILEDB_EQ},
+        {"!=", TILEDB_NE},
+    };
+
+    if (triples.empty()) {
+        throw TileDBSCError("[pytiledbsc] Empty query condition");
+    }
+
+    std::optional<tiledb::QueryCondition> result;
+    for (auto& [name, op_name, value] : triples) {
+        if (!schema.has_attribute(name)) {
+            throw TileDBSCError(
+                "[pytiledbsc] No such attribute '" + name + "'");
+        }
+        auto op = ops.find(op_name);
+        if (op == ops.end()) {
+            throw TileDBSCError(
+                "[pytiledbsc] Unsupported operator '" + op_name + "'");
+        }
+
+        tiledb::QueryCondition condition(ctx);
+        switch (schema.attribute(name).type()) {
+            case TILEDB_STRING_ASCII:
+            case TILEDB_STRING_UTF8:
+            case TILEDB_CHAR: {
+                auto str = value.cast<std::string>();
+                condition.init(name, str.data(), str.size(), op->second);
+                break;
+            }
+            case TILEDB_INT64:
+                condition = make_typed_condition<int64_t>(
+                    ctx, name, value, op->second);
+                break;
+            case TILEDB_UINT64:
+                condition = make_typed_condition<uint64_t>(
+                    ctx, name, value, op->second);
+                break;
+            case TILEDB_INT32:
+                condition = make_typed_condition<int32_t>(
+                    ctx, name, value, op->second);
+                break;
+            case TILEDB_UINT32:
+                condition = make_typed_condition<uint32_t>(
+                    ctx, name, value, op->second);
+                break;
+            case TILEDB_INT16:
+                condition = make_typed_condition<int16_t>(
+                    ctx, name, value, op->second);
+                break;
+            case TILEDB_UINT16:
+                condition = make_typed_condition<uint16_t>(
+                    ctx, name, value, op->second);
+                break;
+            case TILEDB_INT8:
+                condition = make_typed_condition<int8_t>(
+                    ctx, name, value, op->second);
+                break;
+            case TILEDB_UINT8:
+                condition = make_typed_condition<uint8_t>(
+                    ctx, name, value, op->second);
+                break;
+            case TILEDB_FLOAT64:
+                condition = make_typed_condition<double>(
+                    ctx, name, value, op->second);
+                break;
+            case TILEDB_FLOAT32:
+                condition = make_typed_condition<float>(
+                    ctx, name, value, op->second);
+                break;
+            default:
+                throw TileDBSCError(
+                    "[pytiledbsc] Unsupported type for attribute '" + name +
+                    "'");
+        }
+
+        if (result) {
+            result = result.value().combine(condition, TILEDB_AND);
+        } else {
+            result = condition;
+        }
+    }
+    return result.value();
+}
+
+/**
+ * An IJQuery together with the context and arrays it reads from.
+ */
+class PyIJQuery {
+   public:
+    PyIJQuery(
+        const std::string& ref_uri,
+        const std::string& ref_dim,
+        const std::string& ref_attr,
+        const std::string& tgt_uri,
+        const std::string& tgt_dim,
+        std::map<std::string, std::string> config,
+        size_t memory_budget) {
+        tiledb::Config cfg;
+        for (auto& [key, value] : config) {
+            cfg[key] = value;
+        }
+        ctx_ = std::make_shared<tiledb::Context>(cfg);
+        ref_ = std::make_shared<tiledb::Array>(*ctx_, ref_uri, TILEDB_READ);
+        tgt_ = std::make_shared<tiledb::Array>(*ctx_, tgt_uri, TILEDB_READ);
+        ijq_ = std::make_unique<IJQuery>(
+            ref_,
+            std::make_pair(ref_dim, ref_attr),
+            tgt_,
+            tgt_dim,
+            memory_budget);
+    }
+
+    std::shared_ptr<QueryResult> select_from_condition(
+        std::vector<std::tuple<std::string, std::string, py::object>>
+            triples) {
+        auto condition = make_condition(*ctx_, ref_->schema(), triples);
+        std::unique_ptr<QueryResult> result;
+        {
+            py::gil_scoped_release release;
+            result = ijq_->select_from_condition(condition);
+        }
+        return std::shared_ptr<QueryResult>(std::move(result));
+    }
+
+   private:
+    std::shared_ptr<tiledb::Context> ctx_;
+    std::shared_ptr<tiledb::Array> ref_;
+    std::shared_ptr<tiledb::Array> tgt_;
+    std::unique_ptr<IJQuery> ijq_;
+};
+
+/**
+ * Exports all buffers of the result as a pyarrow.Table, without copying.
+ * The Arrow buffers point into the QueryResult, which the exported arrays
+ * keep alive until pyarrow releases them.
+ */
+py::object to_arrow_table(std::shared_ptr<QueryResult> result) {
+    auto pa = py::module_::import("pyarrow");
+
+    arrow::ArrowPair pair;
+    arrow::ArrowAdapter adapter(*result, result);
+    adapter.export_table(pair.array, pair.schema);
+
+    // Import moves the structs' contents; pair frees the structs themselves
+    auto batch = pa.attr("RecordBatch")
+                     .attr("_import_from_c")(
+                         (ptrdiff_t)pair.array, (ptrdiff_t)pair.schema);
+    return pa.attr("Table").attr("from_batches")(py::make_tuple(batch));
+}
+
+};  // namespace
 
 namespace tiledbsc {
 
@@ -18,8 +352,68 @@ using namespace std;
 namespace py = pybind11;
 
 PYBIND11_MODULE(pytiledbsc, m) {
-    py::class_<QueryResult>(m, "QueryResult");
-    //.def(py::init<>());
+    m.doc() = "Python bindings for libtiledbsc";
+
+    m.attr("DEFAULT_ALLOC") = TILEDBSC_DEFAULT_ALLOC;
+    m.attr("DEFAULT_MEMORY_BUDGET") = TILEDBSC_DEFAULT_MEMORY_BUDGET;
+
+    py::register_exception<TileDBSCError>(m, "TileDBSCError");
+
+    py::class_<QueryResult, std::shared_ptr<QueryResult>>(m, "QueryResult")
+        .def("names", &QueryResult::names)
+        .def("nbuffers", &QueryResult::nbuffers)
+        .def("to_arrow", &to_arrow_table);
+
+    py::class_<PyManagedQuery>(m, "ManagedQuery")
+        .def(
+            py::init<
+                const std::string&,
+                std::map<std::string, std::string>,
+                size_t,
+                size_t>(),
+            py::arg("uri"),
+            py::arg("config") = std::map<std::string, std::string>(),
+            py::arg("initial_alloc") = TILEDBSC_DEFAULT_ALLOC,
+            py::arg("memory_budget") = TILEDBSC_DEFAULT_MEMORY_BUDGET)
+        .def(
+            "select_columns",
+            &PyManagedQuery::select_columns,
+            py::arg("names"))
+        .def(
+            "select_points",
+            &PyManagedQuery::select_points,
+            py::arg("dim"),
+            py::arg("points"))
+        .def(
+            "select_ranges",
+            &PyManagedQuery::select_ranges,
+            py::arg("dim"),
+            py::arg("ranges"))
+        .def("execute", &PyManagedQuery::execute)
+        .def("next_batch", &PyManagedQuery::next_batch)
+        .def("is_complete", &PyManagedQuery::is_complete);
+
+    py::class_<PyIJQuery>(m, "IJQuery")
+        .def(
+            py::init<
+                const std::string&,
+                const std::string&,
+                const std::string&,
+                const std::string&,
+                const std::string&,
+                std::map<std::string, std::string>,
+                size_t>(),
+            py::arg("ref_uri"),
+            py::arg("ref_dim"),
+            py::arg("ref_attr"),
+            py::arg("tgt_uri"),
+            py::arg("tgt_dim"),
+            py::arg("config") = std::map<std::string, std::string>(),
+            py::arg("memory_budget") = TILEDBSC_DEFAULT_MEMORY_BUDGET)
+        .def(
+            "select_from_condition",
+            &PyIJQuery::select_from_condition,
+            py::arg("conditions"));
 }
 
 };  // namespace tiledbsc